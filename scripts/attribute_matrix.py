@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# /// script
+# requires-python = ">=3.12"
+# dependencies = ["pandas", "pyarrow", "numpy"]
+# ///
+"""Memory-mapped FIFA attribute matrix for lineup lookups without pandas.
+
+The snapshot table (fifa_asof.py, one row per player snapshot sorted by
+(fifa_id, snapshot_date)) is exported once into `data/cache/attribute_matrix/`:
+
+- attributes.npy  float32 (snapshots, attributes), NaN where FIFA has no value
+- keys.npy        int64 packed (fifa_id << 20 | days) keys, sorted; row i of
+                  the matrix belongs to keys[i], so fifa_id -> row is a
+                  searchsorted
+- ids.npy         int64 fifa_id of every row (keys >> 20), for the as-of hit
+                  test
+- positions.npy   uint8 position group code per snapshot (index into
+                  positions.POS_GROUPS, from the first matching FIFA position)
+- manifest.json   columns, groups, shape and the FIFA parquet signature
+
+The arrays are opened with np.load(mmap_mode='r'), so opening costs nothing
+and the OS pages in only the rows a lookup touches. A lineup (any number of
+players, optionally with match dates) is one searchsorted plus one
+fancy-index gather. Without dates the latest snapshot of each player is used.
+The artifact is rebuilt automatically when `fifa_players.parquet` changes.
+
+Usage: uv run scripts/attribute_matrix.py   # (re)build and print its size
+"""
+from pathlib import Path
+import json
+import os
+import shutil
+import time
+import numpy as np
+import pyarrow as pa
+
+from fifa_asof import DAY_BITS, FIFA_PARQ, SnapshotIndex, asof_offsets, to_days
+from fifa_name_index import source_signature
+from positions import POS_GROUPS, fifa_position_groups
+
+ROOT = Path('data')
+MATRIX_DIR = ROOT / 'cache' / 'attribute_matrix'
+
+MATRIX_VERSION = 2
+MATRIX_COLUMNS = ['overall', 'age', 'pace', 'shooting', 'passing', 'dribbling', 'defending', 'physic']
+LATEST_DAY = (1 << DAY_BITS) - 1
+
+
+def build_matrix(out: Path = MATRIX_DIR, src: Path = FIFA_PARQ) -> dict:
+    table = SnapshotIndex(src=src).table
+    columns = [c for c in MATRIX_COLUMNS if c in table.column_names]
+    attributes = np.full((table.num_rows, len(columns)), np.nan, dtype=np.float32)
+    for j, c in enumerate(columns):
+        attributes[:, j] = table.column(c).cast(pa.float32()).to_numpy(zero_copy_only=False)
+    if 'player_positions' in table.column_names:
+        positions = fifa_position_groups(table.column('player_positions').to_pandas()).cat.codes.to_numpy(dtype=np.uint8)
+    else:
+        positions = np.full(table.num_rows, POS_GROUPS.index('UNK'), dtype=np.uint8)
+    keys = table.column('key').to_numpy()
+    manifest = {
+        'version': MATRIX_VERSION,
+        'source': source_signature(src),
+        'columns': columns,
+        'position_groups': POS_GROUPS,
+        'rows': int(table.num_rows),
+        'players': int(len(np.unique(keys >> DAY_BITS))),
+    }
+    tmp = out.with_name(out.name + '.tmp')
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    np.save(tmp / 'attributes.npy', np.ascontiguousarray(attributes))
+    np.save(tmp / 'keys.npy', keys)
+    np.save(tmp / 'ids.npy', keys >> DAY_BITS)
+    np.save(tmp / 'positions.npy', positions)
+    (tmp / 'manifest.json').write_text(json.dumps(manifest, indent=2), encoding='utf-8')
+    shutil.rmtree(out, ignore_errors=True)
+    os.replace(tmp, out)
+    return manifest
+
+
+def is_current(path: Path = MATRIX_DIR, src: Path = FIFA_PARQ) -> bool:
+    manifest_p = path / 'manifest.json'
+    if not manifest_p.exists() or not src.exists():
+        return False
+    manifest = json.loads(manifest_p.read_text(encoding='utf-8'))
+    return manifest.get('version') == MATRIX_VERSION and manifest.get('source') == source_signature(src)
+
+
+class AttributeMatrix:
+    """Read-only memmap view of the attribute matrix with bulk (fifa_id[, date]) lookups."""
+
+    def __init__(self, path: Path = MATRIX_DIR, src: Path = FIFA_PARQ):
+        if not is_current(path, src):
+            print('Attribute matrix missing or stale; building', path)
+            build_matrix(path, src)
+        self.manifest = json.loads((path / 'manifest.json').read_text(encoding='utf-8'))
+        self.columns = self.manifest['columns']
+        self.attributes = np.load(path / 'attributes.npy', mmap_mode='r')
+        self.keys = np.load(path / 'keys.npy', mmap_mode='r')
+        self.positions = np.load(path / 'positions.npy', mmap_mode='r')
+        self.ids = np.load(path / 'ids.npy', mmap_mode='r')
+
+    def offsets(self, fifa_ids, dates=None, before_first: str = None) -> np.ndarray:
+        """Row per player: the snapshot current at each date, or the latest one without dates; -1 if none."""
+        days = np.full(len(fifa_ids), LATEST_DAY, dtype=np.int64) if dates is None else to_days(dates)
+        return asof_offsets(self.keys, self.ids, fifa_ids, days, before_first)
+
+    def take(self, rows: np.ndarray, columns=None) -> np.ndarray:
+        """float32 attributes of matrix `rows` (from offsets), NaN rows where rows is -1."""
+        cols = [self.columns.index(c) for c in columns] if columns is not None else slice(None)
+        out = self.attributes[np.maximum(rows, 0)][:, cols] if len(self.keys) else np.full((len(rows), len(self.columns)), np.nan, dtype=np.float32)[:, cols]
+        out[rows < 0] = np.nan
+        return out
+
+    def position_codes_at(self, rows: np.ndarray) -> np.ndarray:
+        """uint8 index into positions.POS_GROUPS of matrix `rows` ('UNK' where rows is -1)."""
+        codes = np.asarray(self.positions[np.maximum(rows, 0)]) if len(self.keys) else np.empty(len(rows), dtype=np.uint8)
+        return np.where(rows >= 0, codes, POS_GROUPS.index('UNK')).astype(np.uint8)
+
+    def gather(self, fifa_ids, dates=None, columns=None, before_first: str = None) -> np.ndarray:
+        """float32 (players, columns) attributes in input order, NaN rows for unknown players."""
+        return self.take(self.offsets(fifa_ids, dates, before_first), columns)
+
+    def position_codes(self, fifa_ids, dates=None, before_first: str = None) -> np.ndarray:
+        """uint8 index into positions.POS_GROUPS per player ('UNK' for unknown players)."""
+        return self.position_codes_at(self.offsets(fifa_ids, dates, before_first))
+
+
+def main():
+    t0 = time.perf_counter()
+    manifest = build_matrix()
+    elapsed = time.perf_counter() - t0
+    size = sum(p.stat().st_size for p in MATRIX_DIR.iterdir())
+    print(f"{MATRIX_DIR}: {manifest['rows']} snapshots of {manifest['players']} players x {len(manifest['columns'])} attributes "
+          f"({size / 1e6:.1f} MB) built in {elapsed:.1f}s")
+    matrix = AttributeMatrix()
+    lineup = np.asarray(matrix.ids[np.linspace(0, len(matrix.ids) - 1, 22).astype(int)]) if len(matrix.ids) else np.empty(0, dtype=np.int64)
+    t0 = time.perf_counter()
+    matrix.gather(lineup)
+    print(f'22-player lineup lookup: {(time.perf_counter() - t0) * 1e6:.0f} us')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+"""Storage of the top-k fuzzy candidate table `data/mappings/candidates.parquet`.
+
+Long format, one row per (player_id_sb, rank) with every scorer value (see
+fuzzy_batch.py, which produces it). Kept apart from the fuzzy engine so that
+passes which only re-rank stored candidates do not need rapidfuzz.
+"""
+from pathlib import Path
+import os
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+CANDIDATES_P = Path('data') / 'mappings' / 'candidates.parquet'
+CANDIDATE_SCHEMA = pa.schema([
+    ('player_id_sb', pa.int64()),
+    ('rank', pa.int16()),
+    ('fifa_id', pa.int64()),
+    ('candidate_name', pa.string()),
+    ('candidate_normalized', pa.string()),
+    ('token_sort_ratio', pa.float32()),
+    ('token_set_ratio', pa.float32()),
+    ('score', pa.float32()),
+    ('method', pa.string()),
+])
+
+
+def upsert_candidates(existing: pd.DataFrame, frame: pd.DataFrame, scored_ids) -> pd.DataFrame:
+    """Return `existing` with the rows of every id in `scored_ids` replaced by `frame`."""
+    if existing is None or existing.empty:
+        return frame.reset_index(drop=True)
+    existing = existing[~existing['player_id_sb'].isin(list(scored_ids))]
+    return pd.concat([existing, frame], ignore_index=True)
+
+
+def write_candidates(frame: pd.DataFrame, scored_ids, path: Path = CANDIDATES_P, replace: bool = False):
+    """Upsert candidates: rows of every id in `scored_ids` are replaced by `frame`."""
+    if path.exists() and not replace:
+        frame = upsert_candidates(pd.read_parquet(path), frame, scored_ids)
+    table = pa.Table.from_pandas(frame[CANDIDATE_SCHEMA.names], schema=CANDIDATE_SCHEMA, preserve_index=False)
+    tmp = path.with_suffix('.parquet.tmp')
+    pq.write_table(table, tmp)
+    os.replace(tmp, path)
+    print(f'Wrote {len(frame)} candidate rows to {path}')
+
+
+def load_candidates(path: Path = CANDIDATES_P, columns=None) -> pd.DataFrame:
+    if not path.exists():
+        return CANDIDATE_SCHEMA.empty_table().to_pandas()[columns or CANDIDATE_SCHEMA.names]
+    return pd.read_parquet(path, columns=columns)
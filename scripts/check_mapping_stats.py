@@ -7,9 +7,12 @@
 import pandas as pd
 from pathlib import Path
 
+from coverage_report import coverage_report
+from mapping_store import load_accepted, load_review
+
 # Load data
-player_map = pd.read_csv("data/mappings/player_map.csv")
-player_map_review = pd.read_csv("data/mappings/player_map_review.csv")
+player_map = load_accepted()
+player_map_review = load_review()
 starting_players = pd.read_parquet("data/cache/matches_starting_players.parquet")
 
 print("\n=== Player Mapping Coverage ===")
@@ -26,3 +29,8 @@ if len(player_map) > 0:
 if len(player_map_review) > 0:
     print(f"\nSample review-needed mappings:")
     print(player_map_review.head(10)[["player_name_sb", "candidate_fifa_id", "candidate_name", "score", "status"]])
+
+matches = pd.read_parquet("data/cache/matches.parquet", columns=["match_id", "competition_id", "season_name"])
+report = coverage_report(starting_players, matches, player_map)
+print(f"\nCoverage per season (see scripts/coverage_report.py for the full report):")
+print(report.loc[report["level"] == "season", ["season_name", "appearance_pct", "full_matches", "matches", "match_pct"]].to_string(index=False, float_format=lambda v: f"{v:.1f}"))
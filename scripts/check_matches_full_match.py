@@ -5,6 +5,8 @@
 # ///
 import pandas as pd
 
+from mapping_store import load_accepted
+
 sp = pd.read_parquet('data/cache/matches_starting_players.parquet')
 print('Rows:', len(sp))
 print('Columns:', list(sp.columns))
@@ -13,23 +15,20 @@ print('Columns:', list(sp.columns))
 match_ids = sp['match_id'].dropna().astype(int).unique()
 print('Total matches:', len(match_ids))
 
-# If fifa_id present, use it; otherwise map using player_map.csv
+# If fifa_id present, use it; otherwise map using the accepted mapping table
 if 'fifa_id' in sp.columns:
-    full_matches = sp.groupby('match_id')['fifa_id'].apply(lambda s: s.notna().all())
+    full_matches = sp['fifa_id'].notna().groupby(sp['match_id']).all()
     count_full = full_matches.sum()
     print('Matches with all starting players having non-null fifa_id:', int(count_full))
 else:
-    pm = pd.read_csv('data/mappings/player_map.csv', dtype={'player_id_sb': int})
-    pm_map = dict(zip(pm['player_id_sb'].astype(int), pm['fifa_id']))
-    sp2 = sp.copy()
-    sp2['fifa_id'] = sp2['player_id_sb'].map(pm_map)
-    # consider fifa_id as non-null if value present and not nan
-    full_matches = sp2.groupby('match_id')['fifa_id'].apply(lambda s: s.notna().all())
+    pm = load_accepted(columns=['player_id_sb', 'fifa_id'])
+    mapped = sp['player_id_sb'].isin(pm.loc[pm['fifa_id'].notna(), 'player_id_sb'])
+    full_matches = mapped.groupby(sp['match_id']).all()
     count_full = full_matches.sum()
-    print('Matches with all starting players mapped via player_map.csv:', int(count_full))
+    print('Matches with all starting players mapped via player_map.parquet:', int(count_full))
     # also compute per-team completeness
-    teams_full = sp2.groupby(['match_id','team_id'])['fifa_id'].apply(lambda s: s.notna().all()).reset_index(name='all_matched')
-    both_teams = teams_full.groupby('match_id')['all_matched'].all().sum()
+    teams_full = mapped.groupby([sp['match_id'], sp['team_id']]).all()
+    both_teams = teams_full.groupby(level='match_id').all().sum()
     print('Matches where BOTH teams have all players matched:', int(both_teams))
     print('Percentage of matches fully matched:', float(both_teams) / len(match_ids) * 100)
 
@@ -0,0 +1,65 @@
+"""Country-name normalization shared by StatsBomb `player_country` and FIFA `nationality`.
+
+StatsBomb and FIFA spell several countries differently ("South Korea" vs
+"Korea Republic", "Ivory Coast" vs "Côte d'Ivoire", "USA" vs "United
+States"). Both sides are mapped to one canonical key: the name is normalized
+like player names (see name_normalize.py) and then looked up in
+COUNTRY_ALIASES. Keys are computed once per distinct value, so whole columns
+are converted with a single factorize.
+"""
+import pandas as pd
+
+from name_normalize import normalize_name
+
+# normalized variant -> canonical key (the normalized FIFA spelling)
+COUNTRY_ALIASES = {
+    'south korea': 'korea republic',
+    'korea (south)': 'korea republic',
+    'republic of korea': 'korea republic',
+    'korea south': 'korea republic',
+    'north korea': 'korea dpr',
+    'korea (north)': 'korea dpr',
+    'ivory coast': 'cote divoire',
+    'usa': 'united states',
+    'united states of america': 'united states',
+    'us': 'united states',
+    'china': 'china pr',
+    'peoples republic of china': 'china pr',
+    'iran': 'ir iran',
+    'congo dr': 'dr congo',
+    'democratic republic of the congo': 'dr congo',
+    'congo (dr)': 'dr congo',
+    'republic of the congo': 'congo',
+    'ireland': 'republic of ireland',
+    'turkey': 'turkiye',
+    'czechia': 'czech republic',
+    'cape verde': 'cape verde islands',
+    'cabo verde': 'cape verde islands',
+    'north macedonia': 'fyr macedonia',
+    'macedonia': 'fyr macedonia',
+    'bosnia-herzegovina': 'bosnia and herzegovina',
+    'bosnia & herzegovina': 'bosnia and herzegovina',
+    'trinidad & tobago': 'trinidad and tobago',
+    'antigua & barbuda': 'antigua and barbuda',
+    'st kitts and nevis': 'saint kitts and nevis',
+    'st lucia': 'saint lucia',
+    'gambia': 'the gambia',
+    'eswatini': 'swaziland',
+    'taiwan': 'chinese taipei',
+    'russian federation': 'russia',
+    'kyrgyz republic': 'kyrgyzstan',
+}
+
+
+def country_key(name) -> str:
+    """Canonical key for a country name ('' when missing)."""
+    n = normalize_name(name)
+    return COUNTRY_ALIASES.get(n, n)
+
+
+def country_keys(values: pd.Series) -> pd.Series:
+    """Canonical key for every value of a column, evaluated once per distinct value."""
+    codes, uniques = pd.factorize(values.astype(object), use_na_sentinel=True)
+    keys = pd.Categorical([country_key(u) for u in uniques] + [''])
+    # sentinel -1 (missing) picks the trailing ''
+    return pd.Series(keys.take(codes), index=values.index)
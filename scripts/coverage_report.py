@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# /// script
+# requires-python = ">=3.12"
+# dependencies = ["pandas", "pyarrow", "numpy"]
+# ///
+"""Mapping coverage report per season, competition and team.
+
+Joins the canonical matches table (competition_id, season_name) with the
+starting XIs and the accepted mappings, then computes with plain groupby
+aggregations (no per-group Python callbacks):
+
+- appearance coverage: starting appearances whose player has an accepted fifa_id
+- player coverage: distinct StatsBomb players with an accepted fifa_id
+- match coverage: matches where both starting XIs are fully mapped
+  (for the team level: the team's own XI is fully mapped)
+
+Levels: overall, competition, season (season_name across competitions),
+competition_season, team (per competition/season). The suggested training
+cutoff is the latest season whose appearance coverage is at least
+CUTOFF_MIN_PCT.
+
+Outputs:
+- data/reports/mapping_coverage.parquet  one row per (level, group)
+- data/reports/mapping_coverage.json     overall numbers, per-season rows and the cutoff
+
+Usage: uv run scripts/coverage_report.py [--cutoff-min-pct 80]
+"""
+from pathlib import Path
+import argparse
+import json
+import os
+import numpy as np
+import pandas as pd
+
+from mapping_store import load_accepted
+
+ROOT = Path('data')
+MATCHES_P = ROOT / 'cache' / 'matches.parquet'
+SP_P = ROOT / 'cache' / 'matches_starting_players.parquet'
+REPORT_DIR = ROOT / 'reports'
+REPORT_P = REPORT_DIR / 'mapping_coverage.parquet'
+SUMMARY_P = REPORT_DIR / 'mapping_coverage.json'
+
+CUTOFF_MIN_PCT = 80.0
+LEVELS = {
+    'overall': [],
+    'competition': ['competition_id'],
+    'season': ['season_name'],
+    'competition_season': ['competition_id', 'season_name'],
+    'team': ['competition_id', 'season_name', 'team_id', 'team_name'],
+}
+GROUP_COLUMNS = ['competition_id', 'season_name', 'team_id', 'team_name']
+
+
+def appearance_table(sp: pd.DataFrame, matches: pd.DataFrame, accepted: pd.DataFrame) -> pd.DataFrame:
+    """One row per starting appearance with match context and a `mapped` flag."""
+    mapped_ids = accepted.loc[accepted['fifa_id'].notna(), 'player_id_sb'].to_numpy()
+    ctx = matches[['match_id', 'competition_id', 'season_name']].drop_duplicates('match_id')
+    app = sp[['match_id', 'team_id', 'team_name', 'player_id_sb']].merge(ctx, on='match_id', how='left')
+    app['mapped'] = app['player_id_sb'].isin(mapped_ids).to_numpy()
+    app['season_name'] = app['season_name'].fillna('unknown')
+    app['competition_id'] = app['competition_id'].fillna(-1).astype(np.int64)
+    return app
+
+
+def _aggregate(app: pd.DataFrame, slots: pd.DataFrame, keys: list, team_level: bool) -> pd.DataFrame:
+    if keys:
+        by_app = app.groupby(keys, sort=True, dropna=False)
+        apps = by_app.agg(appearances=('mapped', 'size'), mapped_appearances=('mapped', 'sum'))
+        players = by_app['player_id_sb'].nunique().rename('players')
+        mapped_players = app[app['mapped']].groupby(keys, dropna=False)['player_id_sb'].nunique().rename('mapped_players')
+    else:
+        apps = pd.DataFrame({'appearances': [len(app)], 'mapped_appearances': [int(app['mapped'].sum())]})
+        players = pd.Series([app['player_id_sb'].nunique()], name='players')
+        mapped_players = pd.Series([app.loc[app['mapped'], 'player_id_sb'].nunique()], name='mapped_players')
+    # a team level counts the team's own XI; every other level needs both XIs of the match
+    units = slots if team_level else slots.groupby('match_id', sort=False).agg(
+        full=('full', 'min'), competition_id=('competition_id', 'first'), season_name=('season_name', 'first')).reset_index()
+    if keys:
+        m = units.groupby(keys, sort=True, dropna=False).agg(matches=('full', 'size'), full_matches=('full', 'sum'))
+    else:
+        m = pd.DataFrame({'matches': [len(units)], 'full_matches': [int(units['full'].sum())]})
+    out = pd.concat([apps, players, mapped_players, m], axis=1)
+    out['mapped_players'] = out['mapped_players'].fillna(0)
+    out = out.reset_index() if keys else out
+    ints = ['appearances', 'mapped_appearances', 'players', 'mapped_players', 'matches', 'full_matches']
+    out[ints] = out[ints].fillna(0).astype(np.int64)
+    out['appearance_pct'] = 100 * out['mapped_appearances'] / out['appearances'].clip(lower=1)
+    out['match_pct'] = 100 * out['full_matches'] / out['matches'].clip(lower=1)
+    return out
+
+
+def coverage_report(sp: pd.DataFrame, matches: pd.DataFrame, accepted: pd.DataFrame) -> pd.DataFrame:
+    """Long report: level, competition_id, season_name, team_id, team_name and the coverage columns."""
+    app = appearance_table(sp, matches, accepted)
+    slots = app.groupby(['match_id', 'team_id'], sort=False).agg(
+        full=('mapped', 'min'), competition_id=('competition_id', 'first'), season_name=('season_name', 'first'), team_name=('team_name', 'first')).reset_index()
+    frames = []
+    for level, keys in LEVELS.items():
+        frame = _aggregate(app, slots, keys, level == 'team')
+        frames.append(frame.assign(level=level))
+    report = pd.concat(frames, ignore_index=True)
+    for col in GROUP_COLUMNS:
+        if col not in report.columns:
+            report[col] = None
+    report['competition_id'] = report['competition_id'].astype('Int64')
+    report['team_id'] = report['team_id'].astype('Int64')
+    return report[['level', *GROUP_COLUMNS, 'appearances', 'mapped_appearances', 'appearance_pct', 'players', 'mapped_players', 'matches', 'full_matches', 'match_pct']]
+
+
+def suggest_cutoff(report: pd.DataFrame, min_pct: float = CUTOFF_MIN_PCT):
+    """Latest season (by season_name order) whose appearance coverage reaches `min_pct`."""
+    seasons = report[(report['level'] == 'season') & (report['appearance_pct'] >= min_pct)]
+    return str(seasons['season_name'].max()) if len(seasons) else None
+
+
+def summary(report: pd.DataFrame, min_pct: float = CUTOFF_MIN_PCT) -> dict:
+    cols = ['season_name', 'appearances', 'appearance_pct', 'players', 'mapped_players', 'matches', 'full_matches', 'match_pct']
+    overall = report[report['level'] == 'overall'].iloc[0]
+    return {
+        'overall': {c: overall[c].item() for c in cols[1:]},
+        'seasons': report.loc[report['level'] == 'season', cols].to_dict('records'),
+        'cutoff_min_pct': min_pct,
+        'suggested_cutoff_season': suggest_cutoff(report, min_pct),
+    }
+
+
+def write_report(report: pd.DataFrame, min_pct: float = CUTOFF_MIN_PCT, out_p: Path = REPORT_P, summary_p: Path = SUMMARY_P):
+    out_p.parent.mkdir(parents=True, exist_ok=True)
+    tmp = out_p.with_suffix('.parquet.tmp')
+    report.to_parquet(tmp, index=False)
+    os.replace(tmp, out_p)
+    tmp = summary_p.with_suffix('.json.tmp')
+    tmp.write_text(json.dumps(summary(report, min_pct), indent=2, default=float), encoding='utf-8')
+    os.replace(tmp, summary_p)
+
+
+def print_report(report: pd.DataFrame, min_pct: float = CUTOFF_MIN_PCT):
+    o = report[report['level'] == 'overall'].iloc[0]
+    print(f"Appearances mapped: {o['mapped_appearances']} / {o['appearances']} ({o['appearance_pct']:.1f}%)")
+    print(f"Matches fully mapped: {o['full_matches']} / {o['matches']} ({o['match_pct']:.1f}%)")
+    cols = ['competition_id', 'season_name', 'appearances', 'appearance_pct', 'matches', 'full_matches', 'match_pct']
+    print(report.loc[report['level'] == 'competition_season', cols].to_string(index=False, float_format=lambda v: f'{v:.1f}'))
+    print(f'Suggested cutoff season (appearance coverage >= {min_pct:g}%):', suggest_cutoff(report, min_pct))
+
+
+def parse_args():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('--cutoff-min-pct', type=float, default=CUTOFF_MIN_PCT, help='appearance coverage a season needs to be a cutoff candidate')
+    return ap.parse_args()
+
+
+def main():
+    args = parse_args()
+    matches = pd.read_parquet(MATCHES_P, columns=['match_id', 'competition_id', 'season_name'])
+    sp = pd.read_parquet(SP_P, columns=['match_id', 'team_id', 'team_name', 'player_id_sb'])
+    report = coverage_report(sp, matches, load_accepted(columns=['player_id_sb', 'fifa_id']))
+    write_report(report, args.cutoff_min_pct)
+    print_report(report, args.cutoff_min_pct)
+    print(f'Wrote {REPORT_P} ({len(report)} rows) and {SUMMARY_P}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,20 @@
+"""Fast JSON file decoding shared by the StatsBomb readers.
+
+Uses orjson when it is installed (it is listed in the inline metadata of the
+scripts that import this module) and falls back to the stdlib json module.
+"""
+from pathlib import Path
+import json
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except Exception:
+    ORJSON_AVAILABLE = False
+
+
+def load_json(path: Path):
+    data = Path(path).read_bytes()
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+# /// script
+# requires-python = ">=3.12"
+# dependencies = ["pandas", "pyarrow", "numpy"]
+# ///
+"""Incremental match feature store on top of featurize.compute_features.
+
+`data/cache/features.parquet` holds one feature row per match (sorted by
+match_id). Next to it, `data/cache/feature_deps.parquet` records what every
+row was built from: one (player_id_sb, match_id, fifa_id) row per starting
+appearance, sorted by player_id_sb, where fifa_id is the mapping in effect at
+build time (null when the player was unmapped).
+
+On update only stale matches are recomputed and merged into the stored table:
+
+- mapping changes: the stored fifa_id of each player is compared with the
+  accepted table; the matches of changed players are a searchsorted slice of
+  the dependency table per player, so the work grows with the mapping delta
+- lineup or match changes (only checked when the signature of
+  matches_starting_players.parquet or matches.parquet moved): new matches,
+  matches whose XI or key columns (date, teams, ...) differ, and dropped
+  matches are removed
+- a change of the FIFA parquet (snapshots) or of the featurization code
+  (featurize, the attribute matrix, role pools in positions.py, mapping
+  table typing in mapping_store.py) invalidates every row and triggers a
+  full rebuild, as does `--full`
+
+Both files carry the same generation id in their schema metadata; if they
+disagree (e.g. a crash between the two writes) the store is rebuilt.
+
+Usage:
+  uv run scripts/feature_store.py          # bring features.parquet up to date
+  uv run scripts/feature_store.py --full   # rebuild every match
+"""
+from pathlib import Path
+import argparse
+import hashlib
+import inspect
+import json
+import os
+import sys
+import time
+import uuid
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import attribute_matrix
+import featurize
+import fifa_asof
+import mapping_store
+import positions
+from attribute_matrix import AttributeMatrix
+from featurize import FEATURES_P, KEY_COLUMNS, compute_features, load_inputs, mapped_fifa_ids
+from fifa_asof import FIFA_PARQ
+from fifa_name_index import source_signature
+
+ROOT = Path('data')
+DEPS_P = ROOT / 'cache' / 'feature_deps.parquet'
+SP_P = featurize.SP_P
+MATCHES_P = featurize.MATCHES_P
+
+STORE_VERSION = 1
+META_KEY = b'feature_store'
+DEPS_SCHEMA = pa.schema([('player_id_sb', pa.int64()), ('match_id', pa.int64()), ('fifa_id', pa.int64())])
+
+
+def code_hash() -> str:
+    h = hashlib.blake2b(digest_size=16)
+    for module in (featurize, attribute_matrix, fifa_asof, mapping_store, positions, sys.modules[__name__]):
+        h.update(Path(inspect.getsourcefile(module)).read_bytes())
+    return h.hexdigest()
+
+
+def base_key(fifa_src: Path = FIFA_PARQ) -> dict:
+    """Everything whose change invalidates every stored row."""
+    return {'version': STORE_VERSION, 'code': code_hash(), 'fifa': source_signature(fifa_src) if fifa_src.exists() else None}
+
+
+def input_key(sp_p: Path = SP_P, matches_p: Path = MATCHES_P) -> dict:
+    return {'starting_players': source_signature(sp_p), 'matches': source_signature(matches_p)}
+
+
+# ---- storage ----
+
+def _meta(path: Path):
+    if not path.exists():
+        return None
+    raw = (pq.read_schema(path).metadata or {}).get(META_KEY)
+    return json.loads(raw) if raw else None
+
+
+def _write(table: pa.Table, path: Path, meta: dict):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), META_KEY: json.dumps(meta).encode()})
+    tmp = path.with_suffix('.parquet.tmp')
+    pq.write_table(table, tmp)
+    os.replace(tmp, path)
+
+
+def read_store(path: Path = FEATURES_P, deps_path: Path = DEPS_P):
+    """(features, deps, meta), or (None, None, None) when the store is missing or torn."""
+    meta, deps_meta = _meta(path), _meta(deps_path)
+    if meta is None or deps_meta is None or meta.get('generation') != deps_meta.get('generation'):
+        return None, None, None
+    return pd.read_parquet(path), pd.read_parquet(deps_path), meta
+
+
+def write_store(features: pd.DataFrame, deps: pd.DataFrame, meta: dict, path: Path = FEATURES_P, deps_path: Path = DEPS_P):
+    meta = {**meta, 'generation': uuid.uuid4().hex}
+    # deps first: a crash before the features write leaves mismatched generations, i.e. a rebuild
+    _write(pa.Table.from_pandas(deps, schema=DEPS_SCHEMA, preserve_index=False), deps_path, meta)
+    _write(pa.Table.from_pandas(features, preserve_index=False), path, meta)
+
+
+# ---- invalidation ----
+
+def dependencies(sp: pd.DataFrame, accepted: pd.DataFrame) -> pd.DataFrame:
+    """One (player_id_sb, match_id, fifa_id) row per appearance, sorted by player_id_sb."""
+    fifa_ids = sp['player_id_sb'].map(mapped_fifa_ids(accepted))
+    deps = pd.DataFrame({
+        'player_id_sb': sp['player_id_sb'].to_numpy(dtype=np.int64),
+        'match_id': sp['match_id'].to_numpy(dtype=np.int64),
+        'fifa_id': pd.array(fifa_ids, dtype='Int64'),
+    })
+    return deps.sort_values(['player_id_sb', 'match_id'], kind='stable').reset_index(drop=True)
+
+
+def changed_players(deps: pd.DataFrame, accepted: pd.DataFrame) -> np.ndarray:
+    """Players whose current fifa_id differs from the one their features were built with."""
+    used = deps.drop_duplicates('player_id_sb')
+    current = pd.array(used['player_id_sb'].map(mapped_fifa_ids(accepted)), dtype='Int64')
+    before = pd.array(used['fifa_id'], dtype='Int64')
+    differs = (before.fillna(-1) != current.fillna(-1)).to_numpy(dtype=bool)
+    return used['player_id_sb'].to_numpy()[differs]
+
+
+def matches_of(deps: pd.DataFrame, players) -> np.ndarray:
+    """Matches in which any of `players` started: one searchsorted slice per player."""
+    ids = deps['player_id_sb'].to_numpy()
+    players = np.asarray(players, dtype=np.int64)
+    lo, hi = np.searchsorted(ids, players, side='left'), np.searchsorted(ids, players, side='right')
+    rows = [np.arange(a, b) for a, b in zip(lo, hi) if b > a]
+    return np.unique(deps['match_id'].to_numpy()[np.concatenate(rows)]) if rows else np.empty(0, dtype=np.int64)
+
+
+def lineup_changes(features: pd.DataFrame, deps: pd.DataFrame, sp: pd.DataFrame, matches: pd.DataFrame) -> np.ndarray:
+    """Matches that are new, or whose starting XI or key columns differ from the stored rows."""
+    pairs = sp[['match_id', 'player_id_sb']].astype(np.int64)
+    diff = pairs.merge(deps[['match_id', 'player_id_sb']], how='outer', indicator=True)
+    changed = diff.loc[diff['_merge'] != 'both', 'match_id'].to_numpy()
+    cols = [c for c in KEY_COLUMNS if c in matches.columns and c in features.columns]
+    keys = matches[cols].merge(features[cols], how='left', indicator=True)
+    changed = np.concatenate([changed, keys.loc[keys['_merge'] != 'both', 'match_id'].to_numpy()])
+    return np.unique(changed[np.isin(changed, matches['match_id'].to_numpy())])
+
+
+# ---- update ----
+
+def update(sp: pd.DataFrame, matches: pd.DataFrame, accepted: pd.DataFrame, matrix: AttributeMatrix, inputs: dict,
+           full: bool = False, path: Path = FEATURES_P, deps_path: Path = DEPS_P) -> dict:
+    """Recompute stale matches, merge them into the store and return a summary."""
+    matches = matches.drop_duplicates('match_id').sort_values('match_id', kind='stable').reset_index(drop=True)
+    sp = sp[sp['match_id'].isin(matches['match_id'])]
+    base = base_key()
+    features, deps, meta = (None, None, None) if full else read_store(path, deps_path)
+    if meta is None or meta.get('base') != base:
+        reason = 'full rebuild requested' if full else 'store missing or built from other FIFA data / code'
+        stale, dropped = matches['match_id'].to_numpy(), 0
+        features = deps = None
+    else:
+        reason = 'mapping changes'
+        parts = [matches_of(deps, changed_players(deps, accepted))]
+        if meta.get('inputs') != inputs:
+            reason += ' and lineup/match changes'
+            parts.append(lineup_changes(features, deps, sp, matches))
+        stale = np.unique(np.concatenate(parts))
+        dropped = int((~features['match_id'].isin(matches['match_id'])).sum())
+
+    if features is not None and not len(stale) and not dropped and meta.get('inputs') == inputs:
+        return {'recomputed': 0, 'dropped': 0, 'matches': len(features), 'reason': 'up to date'}
+
+    stale_matches = matches[matches['match_id'].isin(stale)]
+    stale_sp = sp[sp['match_id'].isin(stale)]
+    part = compute_features(stale_sp, stale_matches, accepted, matrix)
+    part_deps = dependencies(stale_sp, accepted)
+    if features is not None:
+        keep = features['match_id'].isin(matches['match_id']) & ~features['match_id'].isin(stale)
+        keep_deps = deps['match_id'].isin(matches['match_id']) & ~deps['match_id'].isin(stale)
+        part = pd.concat([features[keep], part], ignore_index=True) if len(part) else features[keep]
+        part_deps = pd.concat([deps[keep_deps], part_deps], ignore_index=True) if len(part_deps) else deps[keep_deps]
+    part = part.sort_values('match_id', kind='stable').reset_index(drop=True)
+    part_deps = part_deps.sort_values(['player_id_sb', 'match_id'], kind='stable').reset_index(drop=True)
+    write_store(part, part_deps, {'version': STORE_VERSION, 'base': base, 'inputs': inputs}, path, deps_path)
+    return {'recomputed': len(stale_matches), 'dropped': dropped, 'matches': len(part), 'reason': reason}
+
+
+def parse_args():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('--full', action='store_true', help='recompute every match')
+    return ap.parse_args()
+
+
+def main():
+    args = parse_args()
+    sp, matches, accepted = load_inputs()
+    inputs = input_key()
+    t0 = time.perf_counter()
+    result = update(sp, matches, accepted, AttributeMatrix(), inputs, full=args.full)
+    elapsed = time.perf_counter() - t0
+    print(f"Recomputed {result['recomputed']} matches, dropped {result['dropped']} ({result['reason']}); "
+          f"{result['matches']} matches in {FEATURES_P} after {elapsed * 1000:.0f} ms")
+
+
+if __name__ == '__main__':
+    main()
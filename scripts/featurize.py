@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+# /// script
+# requires-python = ">=3.12"
+# dependencies = ["pandas", "pyarrow", "numpy"]
+# ///
+"""Build match-level features from the starting XIs and their FIFA attributes.
+
+Every starting appearance (matches_starting_players.parquet) is mapped to a
+FIFA player through the accepted mapping table and gets the attributes of the
+snapshot current at the match date, gathered from the memory-mapped
+attribute matrix (attribute_matrix.py). Appearances are pooled per
+team into roles:
+
+- ALL           the whole XI
+- GK/DEF/MID/FWD  by the StatsBomb starting position (positions.py); UNK
+                positions only count towards ALL
+
+Appearances without a snapshot (unmapped players, or no FIFA row at the
+date) get the mean attributes of their position group over the latest
+snapshots (`role_means`), the same positional-mean fallback infer.py applies
+to unresolved players, so training rows and served rows are built alike.
+
+For each (team slot, role, attribute) the engine computes mean, std, sum and
+max over the players, imputed ones included. The result is a dense float32 tensor
+(slots, roles, attributes, stats), built with scatter reductions
+(np.bincount / np.maximum.at into slot*roles+role buckets, no sorting). There
+is no per-match Python loop, so the whole corpus is re-featurized
+in one pass after every mapping change.
+
+The tensor is flattened into one row per match with home_/away_ prefixes,
+e.g. `home_fwd_pace_mean`, plus per-role player counts (`_n_players`, and
+`_n_mapped` for the players with a real snapshot) and derived features:
+
+- overall_diff                 home minus away mean overall of the XI
+- {side}_attack_score          mean of FWD pace/shooting/dribbling means
+- {side}_defense_score         mean of DEF defending/physic means
+
+Output: data/cache/features.parquet
+
+Usage: uv run scripts/featurize.py
+"""
+from pathlib import Path
+import os
+import time
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from attribute_matrix import AttributeMatrix
+from mapping_store import load_accepted
+from positions import POS_GROUPS, sb_position_groups
+
+ROOT = Path('data')
+SP_P = ROOT / 'cache' / 'matches_starting_players.parquet'
+MATCHES_P = ROOT / 'cache' / 'matches.parquet'
+FEATURES_P = ROOT / 'cache' / 'features.parquet'
+
+ATTRIBUTES = ['pace', 'shooting', 'passing', 'dribbling', 'defending', 'physic', 'overall', 'age']
+ROLES = ['ALL', 'GK', 'DEF', 'MID', 'FWD']
+STATS = ['mean', 'std', 'sum', 'max']
+SIDES = ['home', 'away']
+KEY_COLUMNS = ['match_id', 'match_date', 'competition_id', 'season_name', 'home_team_id', 'away_team_id']
+ATTACK = ('FWD', ['pace', 'shooting', 'dribbling'])
+DEFENSE = ('DEF', ['defending', 'physic'])
+
+
+def mapped_fifa_ids(accepted: pd.DataFrame) -> pd.Series:
+    """player_id_sb -> the fifa_id features are built with (players without one are left out)."""
+    return accepted.dropna(subset=['fifa_id']).drop_duplicates('player_id_sb').set_index('player_id_sb')['fifa_id']
+
+
+def _asof_keys(sp: pd.DataFrame, matches: pd.DataFrame, accepted: pd.DataFrame):
+    dates = sp['match_id'].map(matches.drop_duplicates('match_id').set_index('match_id')['match_date'])
+    fifa_ids = sp['player_id_sb'].map(mapped_fifa_ids(accepted))
+    return fifa_ids.to_numpy(), dates.to_numpy()
+
+
+def role_means(matrix: AttributeMatrix) -> np.ndarray:
+    """float32 (POS_GROUPS, ATTRIBUTES) mean attributes of each position group over latest snapshots; UNK uses all players."""
+    ids = matrix.ids
+    latest = np.r_[ids[1:] != ids[:-1], True] if len(ids) else np.zeros(0, dtype=bool)
+    values = np.asarray(matrix.attributes[latest])[:, [matrix.columns.index(a) for a in ATTRIBUTES]]
+    groups = np.asarray(matrix.positions[latest])
+    means = np.full((len(POS_GROUPS), len(ATTRIBUTES)), np.nan, dtype=np.float32)
+    for code, group in enumerate(POS_GROUPS):
+        rows = values if group == 'UNK' else values[groups == code]
+        present = ~np.isnan(rows)
+        n = present.sum(axis=0)
+        means[code] = np.where(n > 0, np.where(present, rows, 0).sum(axis=0) / np.maximum(n, 1), np.nan)
+    return means
+
+
+def impute_positional(values: np.ndarray, groups: np.ndarray, means: np.ndarray) -> np.ndarray:
+    """Fill rows of `values` (players, ATTRIBUTES) without an overall rating with the
+    `means` row of their POS_GROUPS code, in place; returns the imputed mask."""
+    missing = np.isnan(values[:, ATTRIBUTES.index('overall')])
+    values[missing] = means[groups[missing]]
+    return missing
+
+
+def appearance_table(sp: pd.DataFrame, matches: pd.DataFrame, accepted: pd.DataFrame, matrix: AttributeMatrix) -> pd.DataFrame:
+    """Starting appearances with their role, as-of FIFA attributes (float32) and `imputed` flag.
+
+    Appearances without a snapshot carry the positional means of their role.
+    """
+    groups = sb_position_groups(sp)
+    role = groups.reindex(sp['position_id'].to_numpy()).astype(object).fillna('UNK').to_numpy()
+    # before the first snapshot of a player, use that first snapshot rather than nothing
+    values = matrix.gather(*_asof_keys(sp, matches, accepted), columns=ATTRIBUTES, before_first='first')
+    imputed = impute_positional(values, pd.Categorical(role, categories=POS_GROUPS).codes.astype(np.int64), role_means(matrix))
+    app = pd.DataFrame({'match_id': sp['match_id'].to_numpy(), 'team_id': sp['team_id'].to_numpy(), 'role': role})
+    app[ATTRIBUTES] = values
+    app['imputed'] = imputed
+    return app
+
+
+def team_tensor(slot: np.ndarray, role: np.ndarray, values: np.ndarray, n_slots: int, imputed: np.ndarray = None):
+    """Segment reductions of `values` (n, attributes) per (slot, role).
+
+    `slot` holds slot codes in [0, n_slots) and `role` role codes in
+    [0, len(ROLES)) with -1 for rows that only count towards ALL; `imputed`
+    marks rows holding positional means. Returns (stats, counts): float32
+    arrays of shape (n_slots, roles, attributes, stats) and (n_slots, roles, 2)
+    with the number of players and of players with their own attributes.
+    """
+    n_roles = len(ROLES)
+    # one scatter per attribute into (slot, role) buckets; rows without a role
+    # land in the ALL bucket, which is then replaced by the total over all buckets
+    bucket = slot * n_roles + np.maximum(role, 0)
+    size = n_slots * n_roles
+    # attribute-major (attributes, rows) so each scatter reads contiguous memory
+    vals = np.ascontiguousarray(np.asarray(values).T, dtype=np.float64)
+    present = ~np.isnan(vals)
+    filled = np.where(present, vals, 0)
+    n = np.stack([np.bincount(bucket, weights=p, minlength=size) for p in present]) if len(vals) else np.zeros((0, size))
+    total = np.stack([np.bincount(bucket, weights=f, minlength=size) for f in filled]) if len(vals) else n
+    squares = np.stack([np.bincount(bucket, weights=f * f, minlength=size) for f in filled]) if len(vals) else n
+    peak = np.full(n.shape, -np.inf)
+    for a in range(len(vals)):
+        np.maximum.at(peak[a], bucket, np.where(present[a], vals[a], -np.inf))
+    rows = np.bincount(bucket, minlength=size).astype(np.float64).reshape(n_slots, n_roles)
+    own = present[ATTRIBUTES.index('overall')] if imputed is None else present[ATTRIBUTES.index('overall')] & ~np.asarray(imputed, dtype=bool)
+    mapped = np.bincount(bucket, weights=own, minlength=size).reshape(n_slots, n_roles)
+    n, total, squares, peak = (x.reshape(len(vals), n_slots, n_roles) for x in (n, total, squares, peak))
+    for x in (n, total, squares):
+        x[..., 0] = x.sum(axis=2)
+    peak[..., 0] = peak.max(axis=2)
+    rows[:, 0] = rows.sum(axis=1)
+    mapped[:, 0] = mapped.sum(axis=1)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = total / n
+        std = np.sqrt(np.maximum(squares / n - mean * mean, 0))
+    none = n == 0
+    block = np.stack([mean, np.where(none, np.nan, std), np.where(none, np.nan, total), np.where(none, np.nan, peak)], axis=-1)
+    stats = block.transpose(1, 2, 0, 3).astype(np.float32)
+    counts = np.stack([rows, mapped], axis=-1).astype(np.float32)
+    return stats, counts
+
+
+def feature_names() -> list:
+    names = []
+    for side in SIDES:
+        for role in ROLES:
+            r = role.lower()
+            names += [f'{side}_{r}_{a}_{s}' for a in ATTRIBUTES for s in STATS]
+            names += [f'{side}_{r}_n_players', f'{side}_{r}_n_mapped']
+    return names
+
+
+DERIVED = ['overall_diff'] + [f'{side}_{score}' for side in SIDES for score in ('attack_score', 'defense_score')]
+FEATURE_COLUMNS = feature_names() + DERIVED
+FEATURE_INDEX = {name: i for i, name in enumerate(FEATURE_COLUMNS)}
+
+
+def _row_mean(block: np.ndarray) -> np.ndarray:
+    """Mean over columns ignoring NaN (NaN when a row has no value)."""
+    present = ~np.isnan(block)
+    n = present.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(n > 0, np.where(present, block, 0).sum(axis=1) / n, np.nan)
+
+
+def feature_matrix(slot: np.ndarray, role: np.ndarray, values: np.ndarray, n_slots: int, home: np.ndarray, away: np.ndarray, imputed: np.ndarray = None) -> np.ndarray:
+    """float32 (matches, FEATURE_COLUMNS) matrix from appearance arrays.
+
+    `slot`/`role`/`values`/`imputed` are as in team_tensor; `home` and `away`
+    hold the slot of each match's teams (-1 when a team has no starting XI,
+    which gives NaN features).
+    """
+    stats, counts = team_tensor(slot, role, values, n_slots, imputed)
+    per_slot = np.concatenate([stats.reshape(n_slots, len(ROLES), -1), counts], axis=2).reshape(n_slots, -1)
+    sides = []
+    for pos in (np.asarray(home), np.asarray(away)):
+        block = np.where((pos >= 0)[:, None], per_slot[np.maximum(pos, 0)] if len(per_slot) else np.nan, np.nan)
+        sides.append(block.astype(np.float32))
+    base = np.concatenate(sides, axis=1)
+    derived = [base[:, FEATURE_INDEX['home_all_overall_mean']] - base[:, FEATURE_INDEX['away_all_overall_mean']]]
+    for side in SIDES:
+        for role, attrs in (ATTACK, DEFENSE):
+            derived.append(_row_mean(base[:, [FEATURE_INDEX[f'{side}_{role.lower()}_{a}_mean'] for a in attrs]]))
+    return np.concatenate([base, np.stack(derived, axis=1).astype(np.float32)], axis=1)
+
+
+def compute_features(sp: pd.DataFrame, matches: pd.DataFrame, accepted: pd.DataFrame, matrix: AttributeMatrix) -> pd.DataFrame:
+    """One feature row per match in `matches` (teams without a starting XI give NaN)."""
+    matches = matches.drop_duplicates('match_id').reset_index(drop=True)
+    sp = sp[sp['match_id'].isin(matches['match_id'])]
+    app = appearance_table(sp, matches, accepted, matrix)
+
+    slots = pd.MultiIndex.from_arrays([app['match_id'].to_numpy(), app['team_id'].to_numpy()])
+    slot_codes, slot_keys = pd.factorize(slots)
+    role_codes = pd.Categorical(app['role'], categories=ROLES).codes.astype(np.int64)
+    # home and away slot of every match; -1 when the team has no starting XI
+    home, away = (slot_keys.get_indexer(pd.MultiIndex.from_arrays([matches['match_id'].to_numpy(), matches[f'{side}_team_id'].to_numpy()])) for side in SIDES)
+    values = feature_matrix(slot_codes.astype(np.int64), role_codes, app[ATTRIBUTES].to_numpy(), len(slot_keys), home, away, app['imputed'].to_numpy())
+    keys = matches[[c for c in KEY_COLUMNS if c in matches.columns]].reset_index(drop=True)
+    return pd.concat([keys, pd.DataFrame(values, columns=FEATURE_COLUMNS)], axis=1)
+
+
+def write_features(features: pd.DataFrame, path: Path = FEATURES_P):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix('.parquet.tmp')
+    pq.write_table(pa.Table.from_pandas(features, preserve_index=False), tmp)
+    os.replace(tmp, path)
+
+
+def load_inputs():
+    sp = pd.read_parquet(SP_P, columns=['match_id', 'team_id', 'player_id_sb', 'position_id', 'position'])
+    matches = pd.read_parquet(MATCHES_P, columns=KEY_COLUMNS)
+    accepted = load_accepted(columns=['player_id_sb', 'fifa_id'])
+    return sp, matches, accepted
+
+
+def main():
+    sp, matches, accepted = load_inputs()
+    matrix = AttributeMatrix()
+    t0 = time.perf_counter()
+    features = compute_features(sp, matches, accepted, matrix)
+    elapsed = time.perf_counter() - t0
+    write_features(features)
+    mapped = features['home_all_n_mapped'].fillna(0) + features['away_all_n_mapped'].fillna(0)
+    players = features['home_all_n_players'].fillna(0) + features['away_all_n_players'].fillna(0)
+    print(f'Featurized {len(features)} matches ({features.shape[1]} columns) in {elapsed * 1000:.0f} ms -> {FEATURES_P}')
+    print(f'Players with FIFA attributes: {int(mapped.sum())} / {int(players.sum())}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+# /// script
+# requires-python = ">=3.12"
+# dependencies = ["pandas", "pyarrow", "numpy"]
+# ///
+"""As-of lookup of FIFA snapshot attributes for (fifa_id, match_date) pairs.
+
+`fifa_players.parquet` holds one row per player snapshot (fifa_version /
+fifa_update). For a player and a match date the right snapshot is the latest
+one dated on or before the match. Every pair is answered in bulk:
+
+- the snapshot table is stored once sorted by (fifa_id, snapshot_date) in
+  `data/cache/fifa_snapshots.parquet` (source signature in the schema
+  metadata, rebuilt automatically when `fifa_players.parquet` changes)
+- each row gets a packed int64 key (fifa_id << 20 | days since epoch), so the
+  sort order is the key order and all lookups are one np.searchsorted over
+  the key column followed by a take
+
+Snapshot dates come from `fifa_update_date`. Rows without one (including
+parquets ingested before that column was kept) fall back to a release date
+derived from `fifa_version` (FIFA N ships around September of year
+2000 + N - 1); rows with neither are dropped.
+
+Matches played before a player's first snapshot get no row, unless
+`before_first='first'` is passed, which uses the earliest snapshot instead.
+
+Usage: uv run scripts/fifa_asof.py   # build the table and report coverage of all appearances
+"""
+from pathlib import Path
+import json
+import os
+import time
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from fifa_name_index import source_signature
+from mapping_store import load_accepted
+
+ROOT = Path('data')
+FIFA_PARQ = ROOT / 'cache' / 'fifa_players.parquet'
+SNAP_P = ROOT / 'cache' / 'fifa_snapshots.parquet'
+SP_P = ROOT / 'cache' / 'matches_starting_players.parquet'
+MATCHES_P = ROOT / 'cache' / 'matches.parquet'
+
+SNAP_VERSION = 2
+ATTRIBUTE_COLS = ['overall', 'age', 'pace', 'shooting', 'passing', 'dribbling', 'defending', 'physic', 'player_positions', 'club']
+DAY_BITS = 20  # days since 1970 fit in 20 bits until the year 4840
+
+
+def to_days(dates) -> np.ndarray:
+    """Days since epoch as int64 for any date-like array."""
+    dates = np.asarray(dates)
+    if dates.dtype.kind == 'M':
+        return dates.astype('datetime64[D]').astype(np.int64)
+    return pd.to_datetime(pd.Series(np.asarray(dates)), errors='coerce').to_numpy('datetime64[D]').astype(np.int64)
+
+
+def pack_keys(fifa_ids, days) -> np.ndarray:
+    return (np.asarray(fifa_ids, dtype=np.int64) << DAY_BITS) | np.asarray(days, dtype=np.int64)
+
+
+def asof_offsets(keys: np.ndarray, key_ids: np.ndarray, fifa_ids, days, before_first: str = None) -> np.ndarray:
+    """Offsets into sorted packed `keys` (player ids `key_ids`) of the latest row on or before each day, -1 if none."""
+    ids = np.asarray(fifa_ids)
+    if ids.dtype.kind not in 'iuf':
+        ids = pd.to_numeric(pd.Series(ids.astype(object)), errors='coerce').to_numpy(dtype=float)
+    ids = ids.astype(float)
+    days = np.asarray(days, dtype=np.int64)
+    valid = ~np.isnan(ids) & (days >= 0) & (days < (1 << DAY_BITS))
+    ids = np.where(valid, ids, -1).astype(np.int64)
+    query = pack_keys(np.maximum(ids, 0), np.where(valid, days, 0))
+    pos = np.searchsorted(keys, query, side='right') - 1
+    last = max(len(keys) - 1, 0)
+    safe = np.clip(pos, 0, last)
+    hit = valid & (pos >= 0) & (key_ids[safe] == ids) if len(keys) else np.zeros(len(ids), dtype=bool)
+    if before_first == 'first':
+        first = np.clip(pos + 1, 0, last)
+        early = valid & ~hit & (key_ids[first] == ids) if len(keys) else hit
+        pos = np.where(early, first, pos)
+        hit = hit | early
+    return np.where(hit, pos, -1)
+
+
+def _snapshot_dates(df: pd.DataFrame) -> pd.Series:
+    """Snapshot date per row: fifa_update_date, else the fifa_version release date, else NaT."""
+    if 'fifa_update_date' not in df.columns and 'fifa_version' not in df.columns:
+        raise SystemExit(f'{FIFA_PARQ} has no fifa_update_date or fifa_version column; re-run scripts/ingest_fifa.py')
+    dates = pd.Series(pd.NaT, index=df.index, dtype='datetime64[ns]')
+    if 'fifa_update_date' in df.columns:
+        dates = pd.to_datetime(df['fifa_update_date'], errors='coerce')
+    if 'fifa_version' in df.columns:
+        version = pd.to_numeric(df['fifa_version'], errors='coerce').astype('float64')
+        release = pd.to_datetime((2000 + version - 1).astype('Int64').astype(str) + '-09-01', errors='coerce')
+        dates = dates.fillna(release)
+    return dates
+
+
+def build_snapshots(src: Path = FIFA_PARQ, out: Path = SNAP_P) -> pa.Table:
+    if not src.exists():
+        raise FileNotFoundError('FIFA parquet not found; run ingest_fifa.py first')
+    available = set(pq.read_schema(src).names)
+    cols = [c for c in ('sofifa_id', 'fifa_version', 'fifa_update', 'fifa_update_date', *ATTRIBUTE_COLS) if c in available]
+    if 'sofifa_id' not in available:
+        raise SystemExit(f'{src} has no sofifa_id column; cannot key snapshots by player')
+    src_table = pq.read_table(src, columns=cols)
+    dates = _snapshot_dates(src_table.select([c for c in ('fifa_version', 'fifa_update_date') if c in available]).to_pandas())
+    keep = dates.notna().to_numpy()
+    if not keep.all():
+        print(f'Dropping {int((~keep).sum())} FIFA rows without a usable fifa_update_date or fifa_version')
+    fifa_ids = src_table.column('sofifa_id').to_numpy().astype(np.int64)[keep]
+    days = dates.to_numpy('datetime64[D]')[keep]
+    # attribute columns keep their compact ingest types (uint8 ratings, dictionary strings)
+    table = src_table.select([c for c in ATTRIBUTE_COLS if c in available]).filter(pa.array(keep))
+    table = table.add_column(0, 'fifa_id', pa.array(fifa_ids)).add_column(1, 'snapshot_date', pa.array(days, type=pa.date32()))
+    key = pack_keys(fifa_ids, days.astype(np.int64))
+    # stable sort: several updates on the same date keep their file order, the last one wins
+    order = np.argsort(key, kind='stable')
+    table = table.take(order).append_column('key', pa.array(key[order]))
+    meta = {'version': SNAP_VERSION, 'source': source_signature(src), 'dated_by': 'fifa_update_date' if 'fifa_update_date' in available else 'fifa_version'}
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), b'fifa_snapshots': json.dumps(meta).encode()})
+    tmp = out.with_suffix('.parquet.tmp')
+    pq.write_table(table, tmp)
+    os.replace(tmp, out)
+    return table
+
+
+def is_current(path: Path = SNAP_P, src: Path = FIFA_PARQ) -> bool:
+    if not path.exists() or not src.exists():
+        return False
+    raw = (pq.read_schema(path).metadata or {}).get(b'fifa_snapshots')
+    if raw is None:
+        return False
+    meta = json.loads(raw)
+    return meta.get('version') == SNAP_VERSION and meta.get('source') == source_signature(src)
+
+
+class SnapshotIndex:
+    """Bulk as-of lookups over the (fifa_id, snapshot_date)-sorted snapshot table."""
+
+    def __init__(self, path: Path = SNAP_P, src: Path = FIFA_PARQ):
+        if not is_current(path, src):
+            print('FIFA snapshot table missing or stale; building', path)
+            build_snapshots(src, path)
+        self.table = pq.read_table(path, memory_map=True)
+        self.keys = self.table.column('key').to_numpy()
+        self.ids = self.keys >> DAY_BITS
+
+    def offsets(self, fifa_ids, dates, before_first: str = None) -> np.ndarray:
+        """Row of the latest snapshot on or before each date (-1 when there is none)."""
+        return asof_offsets(self.keys, self.ids, fifa_ids, to_days(dates), before_first)
+
+    def lookup(self, fifa_ids, dates, columns=None, before_first: str = None) -> pd.DataFrame:
+        """Snapshot attributes aligned with the input pairs (null rows where no snapshot applies)."""
+        off = self.offsets(fifa_ids, dates, before_first)
+        cols = columns or ['fifa_id', 'snapshot_date', *[c for c in ATTRIBUTE_COLS if c in self.table.column_names]]
+        rows = self.table.select(cols).take(pa.array(np.maximum(off, 0))).to_pandas() if len(self.keys) else pd.DataFrame(index=range(len(off)), columns=cols)
+        return rows.where(pd.Series(off >= 0, index=rows.index), axis=0)
+
+
+def appearance_snapshots(sp: pd.DataFrame, matches: pd.DataFrame, accepted: pd.DataFrame, index: SnapshotIndex, columns=None, before_first: str = None) -> pd.DataFrame:
+    """FIFA snapshot attributes for every starting appearance, in `sp` order, in one lookup."""
+    dates = sp['match_id'].map(matches.drop_duplicates('match_id').set_index('match_id')['match_date'])
+    fifa_ids = sp['player_id_sb'].map(accepted.drop_duplicates('player_id_sb').set_index('player_id_sb')['fifa_id'])
+    out = index.lookup(fifa_ids.to_numpy(), dates.to_numpy(), columns, before_first)
+    out.index = sp.index
+    return out
+
+
+def main():
+    index = SnapshotIndex()
+    print(f'{SNAP_P}: {index.table.num_rows} snapshots of {len(np.unique(index.ids))} players')
+    sp = pd.read_parquet(SP_P, columns=['match_id', 'player_id_sb'])
+    matches = pd.read_parquet(MATCHES_P, columns=['match_id', 'match_date'])
+    accepted = load_accepted(columns=['player_id_sb', 'fifa_id'])
+    t0 = time.perf_counter()
+    snaps = appearance_snapshots(sp, matches, accepted, index)
+    elapsed = time.perf_counter() - t0
+    found = snaps['fifa_id'].notna()
+    print(f'As-of snapshots for {int(found.sum())} / {len(sp)} appearances in {elapsed * 1000:.0f} ms')
+    if found.any():
+        lag = (pd.to_datetime(sp['match_id'].map(matches.set_index('match_id')['match_date']))[found] - pd.to_datetime(snaps.loc[found, 'snapshot_date'])).dt.days
+        print(f'Snapshot age at match date: median {lag.median():.0f} days, max {lag.max():.0f} days')
+
+
+if __name__ == '__main__':
+    main()
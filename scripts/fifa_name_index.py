@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+# /// script
+# requires-python = ">=3.12"
+# dependencies = ["pandas", "pyarrow", "numpy", "rapidfuzz", "orjson"]
+# ///
+"""Build (and load) the persistent FIFA name index shared by the mapping passes.
+
+`fifa_players.parquet` holds one row per player snapshot (every FIFA
+version/update), so the same name appears many times per player. The index is
+the canonical matching layer: its rows are the unique (fifa_id, normalized
+name) variants, roughly 100x fewer strings than snapshots. Attributes stay in
+the snapshot table and are reached by fifa_id (fifa_asof.py).
+
+The index is built once from `data/cache/fifa_players.parquet` and written to
+`data/cache/fifa_name_index/`:
+- meta.json            version, source file signature and sizes
+- rows.arrow           Arrow IPC file: short_name, normalized (one row per name variant)
+- row_fifa_id.npy      row -> fifa_id
+- tokens.arrow         token vocabulary (Arrow IPC, one string per token id)
+- postings_indptr.npy  CSR offsets: token id -> slice of postings_rows
+- postings_rows.npy    CSR posting lists (sorted row ids per token)
+- trigrams.arrow, trigram_indptr.npy, trigram_rows.npy
+                       character-trigram vocabulary and CSR posting lists
+- row_trigram_count.npy  row -> number of distinct trigrams
+
+The trigram postings back `trigram_candidates`, a blocking query that ranks
+names by shared trigrams; unlike exact-token intersection it still finds
+spelling variants such as "mohamed" / "mohammed". A query reads its trigrams
+rarest first and stops at QUERY_MAX_POSTINGS postings, so common trigrams
+(" ma", "an ") never turn one lookup into a scan of most of the index.
+
+Everything is memory-mapped on load, so opening the index is sub-second.
+The index is rebuilt automatically when the source parquet changes or the
+on-disk version differs from INDEX_VERSION.
+
+Usage: uv run scripts/fifa_name_index.py
+"""
+from pathlib import Path
+import json
+import os
+import shutil
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from name_normalize import normalize_names
+
+ROOT = Path('data')
+FIFA_PARQ = ROOT / 'cache' / 'fifa_players.parquet'
+INDEX_DIR = ROOT / 'cache' / 'fifa_name_index'
+
+INDEX_VERSION = 4
+
+QUERY_MAX_POSTINGS = 20000  # trigram postings read per blocking query, rarest trigrams first
+
+
+def source_signature(src: Path) -> dict:
+    st = src.stat()
+    return {'path': src.as_posix(), 'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+
+def _write_arrow(path: Path, table: pa.Table):
+    with pa.OSFile(str(path), 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+
+def _read_arrow(path: Path) -> pa.Table:
+    return pa.ipc.open_file(pa.memory_map(str(path), 'r')).read_all()
+
+
+def build_postings(normalized: pa.Array, n_rows: int):
+    """Return (vocab, indptr, rows) CSR posting lists for tokens longer than one char."""
+    split = pc.split_pattern(normalized, ' ')
+    flat = pc.list_flatten(split)
+    parents = pc.list_parent_indices(split)
+    keep = pc.greater(pc.utf8_length(flat), 1)
+    encoded = pc.dictionary_encode(flat.filter(keep))
+    vocab = encoded.dictionary
+    codes = encoded.indices.to_numpy().astype(np.int64)
+    rows = np.asarray(parents.filter(keep)).astype(np.int64)
+    # one posting per (token, row), sorted by token then row
+    keys = np.unique(codes * n_rows + rows)
+    codes = keys // n_rows
+    indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(codes, minlength=len(vocab)), out=indptr[1:])
+    return vocab, indptr, (keys % n_rows).astype(np.int32)
+
+
+def name_trigrams(norm: str) -> set:
+    """Distinct character trigrams of a normalized name, padded at both ends."""
+    text = ' ' + ' '.join(t for t in norm.split() if t != '||') + ' '
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def padded_names(normalized: pa.Array) -> pa.Array:
+    """The text name_trigrams reads, for a whole column: tokens other than '||', space-joined and padded."""
+    split = pc.split_pattern(normalized, ' ')
+    flat = pc.list_flatten(split)
+    keep = pc.and_(pc.not_equal(flat, '||'), pc.not_equal(flat, ''))
+    parents = np.asarray(pc.list_parent_indices(split).filter(keep)).astype(np.int64)
+    offsets = np.zeros(len(normalized) + 1, dtype=np.int32)
+    np.cumsum(np.bincount(parents, minlength=len(normalized)), out=offsets[1:])
+    joined = pc.binary_join(pa.ListArray.from_arrays(pa.array(offsets), flat.filter(keep)), ' ')
+    return pc.binary_join_element_wise(' ', joined, ' ', '')
+
+
+def trigram_codes(padded: pa.Array):
+    """(code, row) of every trigram of every string of `padded`; a code packs three 21-bit code points."""
+    lengths = pc.utf8_length(padded).to_numpy(zero_copy_only=False).astype(np.int64)
+    points = np.frombuffer(''.join(padded.to_pylist()).encode('utf-32-le'), dtype=np.uint32).astype(np.int64)
+    n_grams = np.maximum(lengths - 2, 0)
+    rows = np.repeat(np.arange(len(lengths)), n_grams)
+    pos = np.repeat(np.cumsum(lengths) - lengths, n_grams) + np.arange(n_grams.sum()) - np.repeat(np.cumsum(n_grams) - n_grams, n_grams)
+    return (points[pos] << 42) | (points[pos + 1] << 21) | points[pos + 2], rows
+
+
+def build_trigram_postings(normalized: pa.Array, n_rows: int, chunk: int = 1 << 18):
+    """Return (vocab, indptr, rows, counts) CSR trigram postings for `normalized`, the same trigrams as name_trigrams."""
+    parts = [trigram_codes(padded_names(normalized.slice(lo, chunk))) for lo in range(0, n_rows, chunk)]
+    codes = np.concatenate([c for c, _ in parts]) if parts else np.empty(0, dtype=np.int64)
+    rows = np.concatenate([r + lo for (_, r), lo in zip(parts, range(0, n_rows, chunk))]) if parts else np.empty(0, dtype=np.int64)
+    vocab_codes, gram = np.unique(codes, return_inverse=True)
+    # one posting per (trigram, row), sorted by trigram then row, as for the token postings
+    keys = np.sort(gram * n_rows + rows)
+    keys = keys[np.r_[True, keys[1:] != keys[:-1]]] if len(keys) else keys
+    gram, rows = keys // n_rows, keys % n_rows
+    indptr = np.zeros(len(vocab_codes) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(gram, minlength=len(vocab_codes)), out=indptr[1:])
+    mask = (1 << 21) - 1
+    chars = np.stack([vocab_codes >> 42, (vocab_codes >> 21) & mask, vocab_codes & mask], axis=1).astype(np.uint32)
+    vocab = pa.array(np.ascontiguousarray(chars).view('<U3').ravel().tolist(), type=pa.string())
+    counts = np.bincount(rows, minlength=n_rows).astype(np.int16)
+    return vocab, indptr, rows.astype(np.int32), counts
+
+
+def canonical_names(df: pd.DataFrame) -> pd.DataFrame:
+    """Collapse FIFA snapshots to unique (fifa_id, normalized name) variants.
+
+    Returns one row per variant in first-seen order with the first snapshot's
+    short_name.
+    """
+    keys = ['fifa_id', 'short_name', 'long_name']
+    # normalize each distinct raw name pair once instead of once per snapshot
+    raw = df[keys].drop_duplicates().reset_index(drop=True)
+    name_candidates = (raw['short_name'].fillna('') + ' || ' + raw['long_name'].fillna('')).astype(str)
+    raw['normalized'] = normalize_names(name_candidates).to_pandas()
+    names = raw.groupby(['fifa_id', 'normalized'], sort=False).agg(short_name=('short_name', 'first')).reset_index()
+    return names
+
+
+def build_index(src: Path = FIFA_PARQ, out: Path = INDEX_DIR):
+    if not src.exists():
+        raise FileNotFoundError('FIFA parquet not found; run ingest_fifa.py first')
+    available = set(pq.read_schema(src).names)
+    cols = [c for c in ('sofifa_id', 'short_name', 'long_name') if c in available]
+    df = pd.read_parquet(src, columns=cols)
+    if 'sofifa_id' in df.columns:
+        df = df.rename(columns={'sofifa_id': 'fifa_id'})
+    else:
+        df['fifa_id'] = np.arange(len(df))
+    for c in ('short_name', 'long_name'):
+        if c not in df.columns:
+            df[c] = None
+    names = canonical_names(df)
+    n_rows = len(names)
+    normalized = pa.array(names['normalized'], type=pa.string())
+    short_name = pa.array(names['short_name'], type=pa.string())
+    fifa_ids = names['fifa_id'].to_numpy(dtype=np.int64)
+    vocab, indptr, rows = build_postings(normalized, n_rows)
+    gram_vocab, gram_indptr, gram_rows, gram_counts = build_trigram_postings(normalized, n_rows)
+
+    tmp = out.with_name(out.name + '.tmp')
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    _write_arrow(tmp / 'rows.arrow', pa.table({'short_name': short_name, 'normalized': normalized}))
+    _write_arrow(tmp / 'tokens.arrow', pa.table({'token': vocab}))
+    np.save(tmp / 'row_fifa_id.npy', fifa_ids)
+    np.save(tmp / 'postings_indptr.npy', indptr)
+    np.save(tmp / 'postings_rows.npy', rows)
+    _write_arrow(tmp / 'trigrams.arrow', pa.table({'trigram': gram_vocab}))
+    np.save(tmp / 'trigram_indptr.npy', gram_indptr)
+    np.save(tmp / 'trigram_rows.npy', gram_rows)
+    np.save(tmp / 'row_trigram_count.npy', gram_counts)
+    meta = {'version': INDEX_VERSION, 'source': source_signature(src), 'n_snapshots': len(df), 'n_rows': n_rows, 'n_tokens': len(vocab), 'n_postings': int(len(rows)), 'n_trigrams': len(gram_vocab)}
+    (tmp / 'meta.json').write_text(json.dumps(meta, indent=2), encoding='utf-8')
+    shutil.rmtree(out, ignore_errors=True)
+    os.replace(tmp, out)
+    return meta
+
+
+class FifaNameIndex:
+    """Read-only, memory-mapped view of the on-disk FIFA name index."""
+
+    def __init__(self, path: Path = INDEX_DIR):
+        self.path = path
+        self.meta = json.loads((path / 'meta.json').read_text(encoding='utf-8'))
+        rows = _read_arrow(path / 'rows.arrow')
+        self.normalized = rows.column('normalized')
+        self.short_names = rows.column('short_name')
+        self.fifa_ids = np.load(path / 'row_fifa_id.npy', mmap_mode='r')
+        self.indptr = np.load(path / 'postings_indptr.npy', mmap_mode='r')
+        self.rows = np.load(path / 'postings_rows.npy', mmap_mode='r')
+        vocab = _read_arrow(path / 'tokens.arrow').column('token').to_pylist()
+        self.token_ids = {t: i for i, t in enumerate(vocab)}
+        self.gram_indptr = np.load(path / 'trigram_indptr.npy', mmap_mode='r')
+        self.gram_rows = np.load(path / 'trigram_rows.npy', mmap_mode='r')
+        self.gram_counts = np.load(path / 'row_trigram_count.npy', mmap_mode='r')
+        grams = _read_arrow(path / 'trigrams.arrow').column('trigram').to_pylist()
+        self.trigram_ids = {g: i for i, g in enumerate(grams)}
+
+    @property
+    def n_rows(self) -> int:
+        return self.meta['n_rows']
+
+    def postings(self, token: str) -> np.ndarray:
+        i = self.token_ids.get(token)
+        if i is None:
+            return self.rows[:0]
+        return self.rows[self.indptr[i]:self.indptr[i + 1]]
+
+    def token_count(self, token: str) -> int:
+        i = self.token_ids.get(token)
+        return 0 if i is None else int(self.indptr[i + 1] - self.indptr[i])
+
+    def names(self, rows) -> list:
+        return self.normalized.take(pa.array(np.asarray(rows, dtype=np.int64))).to_pylist()
+
+    def short_name(self, row: int):
+        return self.short_names[int(row)].as_py()
+
+    def fifa_id(self, row: int) -> int:
+        return int(self.fifa_ids[int(row)])
+
+    def query_trigrams(self, norm: str):
+        """(trigram ids read by a blocking query, rarest first; number of query trigrams not in the index).
+
+        Known trigrams are taken in order of increasing posting length while
+        the running total stays within QUERY_MAX_POSTINGS (the rarest one is
+        always taken).
+        """
+        ids = [self.trigram_ids.get(g) for g in name_trigrams(norm)]
+        known = np.array([i for i in ids if i is not None], dtype=np.int64)
+        sizes = np.asarray(self.gram_indptr[known + 1] - self.gram_indptr[known]) if len(known) else np.empty(0, dtype=np.int64)
+        order = np.argsort(sizes, kind='stable')
+        take = np.cumsum(sizes[order]) <= QUERY_MAX_POSTINGS
+        take[:1] = True
+        return known[order[take]], len(ids) - len(known)
+
+    def trigram_candidates(self, norm: str, limit: int, min_containment: float = 0.5) -> np.ndarray:
+        """Return up to `limit` rows sharing the most trigrams with `norm` (sorted by row).
+
+        Rows must contain at least `min_containment` of the trigrams the
+        query read (query_trigrams; trigrams unknown to the index count as
+        read, common ones skipped for the postings budget do not); ties are
+        broken in favour of shorter names.
+        """
+        read, unknown = self.query_trigrams(norm)
+        if not len(read):
+            return np.empty(0, dtype=np.int64)
+        lists = [self.gram_rows[self.gram_indptr[i]:self.gram_indptr[i + 1]] for i in read]
+        # count over the postings read (at most QUERY_MAX_POSTINGS plus the rarest list), not the whole index
+        rows, shared = np.unique(np.concatenate(lists), return_counts=True)
+        hit = shared >= min_containment * (len(read) + unknown)
+        rows, shared = rows[hit], shared[hit]
+        if len(rows) > limit:
+            best = np.lexsort((self.gram_counts[rows], -shared))[:limit]
+            rows = np.sort(rows[best])
+        return rows.astype(np.int64)
+
+    def block_key(self, norm: str):
+        """Rarest indexed trigram of `norm` (None if it has none): queries sharing it have overlapping blocks."""
+        read, _ = self.query_trigrams(norm)
+        return int(read[0]) if len(read) else None
+
+    def exact(self, norm: str) -> int:
+        """Return the first row whose normalized short or long name equals `norm`, or -1.
+
+        Stored names are "short || long"; `norm` may match either side (or the
+        whole string).
+        """
+        tokens = [t for t in norm.split() if len(t) > 1]
+        if not tokens:
+            return -1
+        cands = min((self.postings(t) for t in tokens), key=len)
+        for row, name in zip(cands, self.names(cands)):
+            if name == norm or norm in (side.strip() for side in name.split('||')):
+                return int(row)
+        return -1
+
+
+def is_current(path: Path = INDEX_DIR, src: Path = FIFA_PARQ) -> bool:
+    meta_p = path / 'meta.json'
+    if not meta_p.exists() or not src.exists():
+        return False
+    meta = json.loads(meta_p.read_text(encoding='utf-8'))
+    return meta.get('version') == INDEX_VERSION and meta.get('source') == source_signature(src)
+
+
+def load_index(path: Path = INDEX_DIR, src: Path = FIFA_PARQ) -> FifaNameIndex:
+    """Open the index, (re)building it first if it is missing or stale."""
+    if not is_current(path, src):
+        print('FIFA name index missing or stale; building', path)
+        build_index(src, path)
+    return FifaNameIndex(path)
+
+
+def main():
+    meta = build_index()
+    print(f"Wrote FIFA name index to {INDEX_DIR}: {meta['n_snapshots']} snapshots -> {meta['n_rows']} name variants, {meta['n_tokens']} tokens, {meta['n_postings']} postings, {meta['n_trigrams']} trigrams")
+
+
+if __name__ == '__main__':
+    main()
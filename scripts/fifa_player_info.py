@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# /// script
+# requires-python = ">=3.12"
+# dependencies = ["pandas", "pyarrow"]
+# ///
+"""Build (and load) the per-player FIFA lookup table used by the promotion passes.
+
+`fifa_players.parquet` has one row per player snapshot, so looking a
+candidate up by `fifa_id` used to hit a non-unique 10M-row index. This table
+keeps one row per fifa_id (its first snapshot, the same one the name index
+points at) with the columns the passes compare against:
+
+- fifa_id, short_name, player_positions, nationality, club
+- pos_group  categorical GK/DEF/MID/FWD/UNK, computed once per distinct
+             `player_positions` value (see positions.py)
+
+Written to `data/cache/fifa_player_info.parquet`; the source signature is kept
+in the Parquet schema metadata and the table is rebuilt automatically when
+`fifa_players.parquet` changes. Rows are sorted by fifa_id, so the row offset
+of any player is a binary search away (`PlayerInfoIndex`) and interactive
+tools never scan the snapshot table.
+
+Usage: uv run scripts/fifa_player_info.py
+"""
+from pathlib import Path
+import json
+import os
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from fifa_name_index import source_signature
+from positions import fifa_position_groups
+
+ROOT = Path('data')
+FIFA_PARQ = ROOT / 'cache' / 'fifa_players.parquet'
+INFO_P = ROOT / 'cache' / 'fifa_player_info.parquet'
+
+INFO_VERSION = 2
+INFO_COLS = ['fifa_id', 'short_name', 'player_positions', 'nationality', 'club']
+
+
+def build_player_info(src: Path = FIFA_PARQ, out: Path = INFO_P) -> pd.DataFrame:
+    if not src.exists():
+        raise FileNotFoundError('FIFA parquet not found; run ingest_fifa.py first')
+    available = set(pq.read_schema(src).names)
+    cols = [c for c in ('sofifa_id', *INFO_COLS[1:]) if c in available]
+    df = pd.read_parquet(src, columns=cols)
+    if 'sofifa_id' in df.columns:
+        df = df.rename(columns={'sofifa_id': 'fifa_id'})
+    else:
+        df['fifa_id'] = range(len(df))
+    for c in INFO_COLS:
+        if c not in df.columns:
+            df[c] = None
+    info = df[INFO_COLS].drop_duplicates('fifa_id', keep='first')
+    info['fifa_id'] = info['fifa_id'].astype('int64')
+    info = info.sort_values('fifa_id', kind='stable').reset_index(drop=True)
+    info['pos_group'] = fifa_position_groups(info['player_positions'])
+    table = pa.Table.from_pandas(info, preserve_index=False)
+    meta = {'version': INFO_VERSION, 'source': source_signature(src), 'n_snapshots': len(df)}
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), b'fifa_player_info': json.dumps(meta).encode()})
+    tmp = out.with_suffix('.parquet.tmp')
+    pq.write_table(table, tmp)
+    os.replace(tmp, out)
+    return info
+
+
+def is_current(path: Path = INFO_P, src: Path = FIFA_PARQ) -> bool:
+    if not path.exists() or not src.exists():
+        return False
+    raw = (pq.read_schema(path).metadata or {}).get(b'fifa_player_info')
+    if raw is None:
+        return False
+    meta = json.loads(raw)
+    return meta.get('version') == INFO_VERSION and meta.get('source') == source_signature(src)
+
+
+def load_player_info(path: Path = INFO_P, src: Path = FIFA_PARQ, columns=None) -> pd.DataFrame:
+    """Return the per-player table, (re)building it first if it is missing or stale."""
+    if not is_current(path, src):
+        print('FIFA player info missing or stale; building', path)
+        build_player_info(src, path)
+    return pd.read_parquet(path, columns=columns)
+
+
+class PlayerInfoIndex:
+    """fifa_id -> row offset lookups over the memory-mapped per-player table."""
+
+    def __init__(self, path: Path = INFO_P, src: Path = FIFA_PARQ, columns=None):
+        if not is_current(path, src):
+            print('FIFA player info missing or stale; building', path)
+            build_player_info(src, path)
+        self.table = pq.read_table(path, columns=columns, memory_map=True)
+        self.ids = self.table.column('fifa_id').to_numpy()
+
+    def offsets(self, fifa_ids) -> np.ndarray:
+        """Row offset of each fifa_id, -1 when unknown."""
+        ids = np.asarray(fifa_ids, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(self.ids, ids), max(len(self.ids) - 1, 0))
+        found = (self.ids[pos] == ids) if len(self.ids) else np.zeros(len(ids), dtype=bool)
+        return np.where(found, pos, -1)
+
+    def lookup(self, fifa_ids) -> pd.DataFrame:
+        """Rows for `fifa_ids` in order (unknown ids give a null row)."""
+        off = self.offsets(fifa_ids)
+        rows = self.table.take(np.maximum(off, 0)).to_pandas() if len(self.ids) else pd.DataFrame(index=range(len(off)), columns=self.table.column_names)
+        rows = rows.where(pd.Series(off >= 0, index=rows.index), axis=0)
+        if 'fifa_id' in rows.columns:
+            rows['fifa_id'] = rows['fifa_id'].astype('Int64')
+        return rows
+
+
+def main():
+    info = build_player_info()
+    print(f'Wrote {len(info)} FIFA players to {INFO_P}')
+    print(info['pos_group'].value_counts().to_string())
+
+
+if __name__ == '__main__':
+    main()
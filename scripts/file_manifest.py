@@ -0,0 +1,74 @@
+"""File manifests for incremental ingestion.
+
+A manifest records (path, size, mtime, content hash) for every source file that
+went into a cache artifact. It is stored next to the artifact as
+`<artifact stem>.manifest.json`, e.g. `data/cache/matches.manifest.json`.
+
+Files whose size and mtime are unchanged are trusted without re-hashing, so a
+scan of an unchanged tree only costs one `stat` per file. Files that were
+touched but whose content hash is unchanged are not reported as changed.
+"""
+from pathlib import Path
+import hashlib
+import json
+import os
+
+MANIFEST_VERSION = 1
+
+
+def manifest_path(artifact: Path) -> Path:
+    return artifact.with_name(artifact.stem + '.manifest.json')
+
+
+def file_hash(path: Path) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def load_manifest(artifact: Path) -> dict:
+    """Return {path: entry} for `artifact`, or {} if there is no usable manifest."""
+    p = manifest_path(artifact)
+    if not p.exists() or not artifact.exists():
+        return {}
+    try:
+        data = json.loads(p.read_text(encoding='utf-8'))
+    except Exception:
+        return {}
+    if data.get('version') != MANIFEST_VERSION:
+        return {}
+    return data.get('files', {})
+
+
+def save_manifest(artifact: Path, entries: dict):
+    p = manifest_path(artifact)
+    tmp = p.with_suffix(p.suffix + '.tmp')
+    tmp.write_text(json.dumps({'version': MANIFEST_VERSION, 'files': entries}), encoding='utf-8')
+    os.replace(tmp, p)
+
+
+def scan_files(files, previous: dict):
+    """Compare `files` against a previous manifest.
+
+    Returns (entries, changed, removed): the manifest entries for `files`, the
+    files that are new or whose content changed, and the manifest paths that
+    are no longer present in `files`.
+    """
+    entries = {}
+    changed = []
+    for f in files:
+        f = Path(f)
+        key = f.as_posix()
+        st = f.stat()
+        prev = previous.get(key)
+        if prev and prev['size'] == st.st_size and prev['mtime_ns'] == st.st_mtime_ns:
+            entries[key] = prev
+            continue
+        digest = file_hash(f)
+        entries[key] = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'hash': digest}
+        if not prev or prev['hash'] != digest:
+            changed.append(f)
+    removed = sorted(set(previous) - set(entries))
+    return entries, changed, removed
@@ -0,0 +1,132 @@
+"""Batched fuzzy scoring of StatsBomb names against blocked FIFA name candidates.
+
+Candidate blocks come from the FIFA name index's character-trigram postings
+(see fifa_name_index.py), so spelling variants still get candidates.
+Instead of one `process.extractOne` call per StatsBomb name (and a second one
+for the fallback scorer), queries are grouped by their blocking key (the rarest
+indexed trigram) and each group is scored against the union of its members'
+candidate blocks with one `process.cdist(..., workers=-1)` call per scorer.
+A group is split when its union grows past GROUP_MAX_CHOICES or when most of
+the dense score matrix would fall outside the members' own blocks.
+Scores outside a query's own block are masked, so results match per-query
+blocking. The output is a top-k candidate table rather than a single best hit.
+
+The matchers persist that table as `data/mappings/candidates.parquet` (long
+format, one row per (player_id_sb, rank) with every scorer value; see
+candidates_store.py), so later passes can re-rank candidates without touching
+the FIFA index again.
+"""
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from rapidfuzz import process, fuzz
+
+SCORERS = {
+    'token_sort_ratio': fuzz.token_sort_ratio,
+    'token_set_ratio': fuzz.token_set_ratio,
+}
+TOP_K = 10
+GROUP_MAX_CHOICES = 20000  # split a blocking group once its choice union gets this large
+GROUP_MIN_DENSITY = 0.25  # ... or once under this share of its (queries x union) cells lie in a query's own block
+BLOCK_MIN_CONTAINMENT = 0.5  # share of the query's trigrams a candidate must contain
+
+
+
+def block_candidates(norm: str, fifa_index, max_total: int, min_containment: float = BLOCK_MIN_CONTAINMENT):
+    """Return (block_key, sorted candidate rows) for a normalized StatsBomb name.
+
+    Candidates come from the index's character-trigram postings: the (at most
+    `max_total`) names sharing the most trigrams with the query. The block key
+    used to group queries is the query's rarest trigram in the index, so
+    queries grouped together draw their blocks from the same posting list.
+    """
+    return fifa_index.block_key(norm), fifa_index.trigram_candidates(norm, max_total, min_containment)
+
+
+def _groups(keys, blocks):
+    """Query groups scored with one cdist call each.
+
+    Queries sharing a block key are added to a group while its choice union
+    stays within GROUP_MAX_CHOICES and at least GROUP_MIN_DENSITY of the dense
+    (queries x union) score matrix falls inside the members' own blocks, so a
+    query whose block barely overlaps the others starts a new group instead
+    of paying for the whole union.
+    """
+    by_key = {}
+    for i, key in enumerate(keys):
+        if len(blocks[i]):
+            by_key.setdefault(key, []).append(i)
+    for members in by_key.values():
+        group, union, useful = [], set(), 0
+        for i in members:
+            block = blocks[i].tolist()
+            n_union = len(union) + sum(r not in union for r in block)
+            if group and (n_union > GROUP_MAX_CHOICES or useful + len(block) < GROUP_MIN_DENSITY * (len(group) + 1) * n_union):
+                yield group
+                group, union, useful = [], set(), 0
+            group.append(i)
+            union.update(block)
+            useful += len(block)
+        yield group
+
+
+def score_topk(queries, keys, blocks, fifa_index, k: int = TOP_K, cutoff: float = 0) -> pd.DataFrame:
+    """Score every query against its block and return the top-k candidates per query.
+
+    `queries` are normalized names; `keys`/`blocks` come from block_candidates.
+    Candidates are ranked by token_sort_ratio when the query's best sort score
+    reaches `cutoff`, otherwise by token_set_ratio (the old extractOne fallback).
+    Returns a long frame: query, rank, row, fifa_id, candidate_name,
+    candidate_normalized, one column per scorer and `score` (the ranking score).
+    """
+    out = []
+    for group in _groups(keys, blocks):
+        choices_rows = np.unique(np.concatenate([blocks[i] for i in group]))
+        choices = fifa_index.names(choices_rows)
+        group_queries = [queries[i] for i in group]
+        scores = {name: process.cdist(group_queries, choices, scorer=scorer, workers=-1) for name, scorer in SCORERS.items()}
+        # restrict each query to its own block (blocks are sorted subsets of the sorted union)
+        allowed = np.zeros((len(group), len(choices_rows)), dtype=bool)
+        for j, i in enumerate(group):
+            allowed[j, np.searchsorted(choices_rows, blocks[i])] = True
+        sort_s = np.where(allowed, scores['token_sort_ratio'], -1)
+        set_s = np.where(allowed, scores['token_set_ratio'], -1)
+        use_sort = sort_s.max(axis=1) >= cutoff
+        rank_s = np.where(use_sort[:, None], sort_s, set_s)
+        kk = min(k, rank_s.shape[1])
+        # everything scoring at least each query's k-th best score, ordered by score then column; equal
+        # scores go to the lower index row (the union is sorted), so results do not depend on the grouping
+        kth = -np.partition(-rank_s, kk - 1, axis=1)[:, kk - 1]
+        qr, qc = np.nonzero(rank_s >= kth[:, None])
+        o = np.lexsort((qc, -rank_s[qr, qc], qr))
+        qr, qc = qr[o], qc[o]
+        first = np.searchsorted(qr, np.arange(len(group)))
+        top = qc[(np.arange(len(qr)) - first[qr]) < kk].reshape(len(group), kk)
+        qi = np.repeat(np.arange(len(group)), kk)
+        cols = top.ravel()
+        frame = pd.DataFrame({
+            'query': np.asarray(group)[qi],
+            'rank': np.tile(np.arange(1, kk + 1), len(group)),
+            'row': choices_rows[cols],
+            'token_sort_ratio': sort_s[qi, cols],
+            'token_set_ratio': set_s[qi, cols],
+            'score': rank_s[qi, cols],
+        })
+        out.append(frame[frame['score'] >= 0])
+    cols = ['query', 'rank', 'row', 'fifa_id', 'candidate_name', 'candidate_normalized', *SCORERS, 'score']
+    if not out:
+        return pd.DataFrame(columns=cols)
+    res = pd.concat(out, ignore_index=True).sort_values(['query', 'rank'], ignore_index=True)
+    rows = res['row'].to_numpy(dtype=np.int64)
+    res['fifa_id'] = np.asarray(fifa_index.fifa_ids)[rows]
+    res['candidate_name'] = fifa_index.short_names.take(pa.array(rows)).to_pylist()
+    res['candidate_normalized'] = fifa_index.names(rows)
+    return res[cols]
+
+
+def candidates_frame(topk: pd.DataFrame, player_ids, method: str) -> pd.DataFrame:
+    """Attach StatsBomb ids (indexed by `query`) to a score_topk result."""
+    frame = topk.drop(columns=['query', 'row'])
+    frame.insert(0, 'player_id_sb', np.asarray(player_ids, dtype=np.int64)[topk['query'].to_numpy(dtype=np.int64)])
+    frame['method'] = method
+    return frame
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+# /// script
+# requires-python = ">=3.12"
+# dependencies = ["pandas", "pyarrow", "numpy", "rapidfuzz", "orjson", "scikit-learn"]
+# ///
+"""Single-match inference with all state loaded once per process.
+
+`InferenceEngine` opens, at startup:
+
+- the match model bundle `models/lightgbm_baseline/model.pkl` (a pickled
+  dict: `model` with predict_proba, `features` = featurize.py column names
+  it was trained on, optional `classes` labels and `scaler`)
+- the memory-mapped FIFA name index (fifa_name_index.py)
+- the memory-mapped attribute matrix (attribute_matrix.py)
+- the accepted StatsBomb -> FIFA mappings, as normalized StatsBomb name -> fifa_id
+
+`predict(home_xi, away_xi)` then runs in-process without touching Parquet:
+
+1. resolve every player: an int is a fifa_id; a name goes through the
+   accepted mappings, then an exact hit on a normalized short or long name in
+   the index, then one batched fuzzy match (fuzzy_batch.score_topk) for the
+   rest, accepted at NAME_MIN_SCORE with ties broken by the lowest fifa_id.
+   Resolutions are cached per normalized name (LRU of RESOLVED_CACHE names).
+2. gather the attributes of the 22 players from the matrix (as of `date`, or
+   the latest snapshots); unresolved players get the mean attributes of their
+   position group (featurize.impute_positional, the same fallback training
+   features use; they count in `_n_players` but not in `_n_mapped`)
+3. build the feature row with featurize.feature_matrix, the same code path
+   as training features
+4. one predict_proba call
+
+Positions are optional (StatsBomb or FIFA position names, e.g. "Center Back"
+or "CB"); without them a resolved player's FIFA position group is used.
+
+Usage:
+  uv run scripts/infer.py --home "Name 1,Name 2,..." --away "..." [--date 2023-05-01]
+  uv run scripts/infer.py --match-id 3754058          # a historic match's starting XIs
+  uv run scripts/infer.py --match-id 3754058 --repeat 100   # warm latency
+"""
+from collections import OrderedDict
+from pathlib import Path
+import argparse
+import pickle
+import time
+import numpy as np
+import pandas as pd
+
+from attribute_matrix import AttributeMatrix
+from featurize import ATTRIBUTES, FEATURE_INDEX, MATCHES_P, ROLES, SP_P, feature_matrix, impute_positional, role_means
+from fifa_name_index import load_index
+from fuzzy_batch import block_candidates, score_topk
+from mapping_store import load_accepted
+from name_normalize import normalize_name, normalize_names
+from positions import POS_GROUPS, pos_group_from_sb
+
+MODEL_DIR = Path('models') / 'lightgbm_baseline'
+
+NAME_MIN_SCORE = 90  # same bar as the mapping passes' auto-accept
+FUZZY_MAX_CANDIDATES = 2000
+FUZZY_TOP_K = 5
+RESOLVED_CACHE = 1 << 16  # normalized names kept by a long-lived engine
+# positions.POS_GROUPS code -> featurize.ROLES code (-1: counts towards ALL only)
+GROUP_ROLE = np.array([ROLES.index(g) if g in ROLES else -1 for g in POS_GROUPS], dtype=np.int64)
+
+
+def load_model(path: Path = MODEL_DIR) -> dict:
+    p = path / 'model.pkl'
+    if not p.exists():
+        raise SystemExit(f'{p} not found; train a match model first (bundle keys: model, features[, classes, scaler])')
+    with open(p, 'rb') as f:
+        bundle = pickle.load(f)
+    unknown = [c for c in bundle['features'] if c not in FEATURE_INDEX]
+    if unknown:
+        raise SystemExit(f'{path} was trained on features featurize.py does not produce: {unknown[:5]}')
+    return bundle
+
+
+def sb_name_map(accepted: pd.DataFrame) -> dict:
+    """Normalized StatsBomb name -> fifa_id, for names that map to a single FIFA player."""
+    rows = accepted.dropna(subset=['fifa_id', 'player_name_sb'])
+    names = pd.DataFrame({'norm': normalize_names(rows['player_name_sb']).to_pandas(), 'fifa_id': rows['fifa_id'].to_numpy(dtype=np.int64)})
+    unique = names.groupby('norm')['fifa_id'].nunique()
+    names = names[names['norm'].isin(unique.index[unique == 1]) & (names['norm'] != '')]
+    return dict(zip(names['norm'], names['fifa_id']))
+
+
+class InferenceEngine:
+    """Warm in-process state for repeated single-match predictions."""
+
+    def __init__(self, model_dir: Path = MODEL_DIR, accepted: pd.DataFrame = None):
+        bundle = load_model(model_dir)
+        self.model = bundle['model']
+        self.scaler = bundle.get('scaler')
+        self.features = list(bundle['features'])
+        self.columns = np.array([FEATURE_INDEX[c] for c in self.features], dtype=np.int64)
+        self.classes = [str(c) for c in bundle.get('classes', getattr(self.model, 'classes_', []))]
+        self.names = load_index()
+        self.matrix = AttributeMatrix()
+        if accepted is None:
+            accepted = load_accepted(columns=['player_name_sb', 'fifa_id'])
+        self.sb_names = sb_name_map(accepted)
+        self.role_means = role_means(self.matrix)
+        self.resolved = OrderedDict()  # normalized name -> (fifa_id or -1, how), least recently used first
+
+    def remember(self, norm: str, hit: tuple):
+        """Cache a resolution, evicting the least recently used beyond RESOLVED_CACHE names."""
+        self.resolved[norm] = hit
+        self.resolved.move_to_end(norm)
+        if len(self.resolved) > RESOLVED_CACHE:
+            self.resolved.popitem(last=False)
+
+    def resolve(self, players) -> tuple:
+        """(fifa_ids int64 with -1 for unresolved, how per player) for names or fifa ids."""
+        fifa_ids = np.full(len(players), -1, dtype=np.int64)
+        how = ['unresolved'] * len(players)
+        pending = {}
+        for i, p in enumerate(players):
+            if isinstance(p, (int, np.integer)) or (isinstance(p, str) and p.strip().isdigit()):
+                fifa_ids[i], how[i] = int(p), 'fifa_id'
+                continue
+            norm = normalize_name(p)
+            if norm in self.resolved:
+                self.resolved.move_to_end(norm)
+                fifa_ids[i], how[i] = self.resolved[norm]
+            elif norm in self.sb_names:
+                fifa_ids[i], how[i] = self.sb_names[norm], 'mapping'
+            elif norm:
+                row = self.names.exact(norm)
+                if row >= 0:
+                    fifa_ids[i], how[i] = self.names.fifa_id(row), 'exact'
+                else:
+                    pending.setdefault(norm, []).append(i)
+            if norm and how[i] != 'unresolved':
+                self.remember(norm, (fifa_ids[i], how[i]))
+        if pending:
+            queries = list(pending)
+            keys, blocks = zip(*(block_candidates(q, self.names, FUZZY_MAX_CANDIDATES) for q in queries))
+            top = score_topk(queries, keys, blocks, self.names, k=FUZZY_TOP_K, cutoff=NAME_MIN_SCORE)
+            # score_topk breaks equal scores by index row; break them by fifa_id, the id callers see
+            top = top.sort_values(['query', 'score', 'fifa_id'], ascending=[True, False, True]).drop_duplicates('query')
+            best = dict(zip(top['query'].to_numpy(dtype=np.int64), zip(top['fifa_id'], top['score'])))
+            for q, norm in enumerate(queries):
+                fifa_id, score = best.get(q, (-1, 0))
+                hit = (int(fifa_id), 'fuzzy') if score >= NAME_MIN_SCORE else (-1, 'unresolved')
+                self.remember(norm, hit)
+                for i in pending[norm]:
+                    fifa_ids[i], how[i] = hit
+        return fifa_ids, how
+
+    def position_groups(self, positions) -> np.ndarray:
+        """POS_GROUPS code per given position name, -1 where none is given; each distinct name is classified once."""
+        codes, uniques = pd.factorize(pd.Series(positions))
+        groups = [POS_GROUPS.index(pos_group_from_sb(u)) if isinstance(u, str) and u else -1 for u in uniques]
+        return np.array(groups + [-1], dtype=np.int64)[codes]
+
+    def player_values(self, fifa_ids, dates=None, given_groups: np.ndarray = None):
+        """(float32 (players, ATTRIBUTES), POS_GROUPS codes, fallback mask), with the positional-mean fallback applied.
+
+        `given_groups` (from position_groups) win over the FIFA position group.
+        """
+        rows = self.matrix.offsets(fifa_ids, dates, before_first='first')
+        values = self.matrix.take(rows, ATTRIBUTES)
+        groups = self.matrix.position_codes_at(rows).astype(np.int64)
+        if given_groups is not None:
+            groups = np.where(given_groups >= 0, given_groups, groups)
+        missing = impute_positional(values, groups, self.role_means)
+        return values, groups, missing
+
+    def feature_row(self, home_xi, away_xi, home_positions=None, away_positions=None, date=None):
+        """(float32 (1, FEATURE_COLUMNS) row, per-player resolution records)."""
+        players = list(home_xi) + list(away_xi)
+        fifa_ids, how = self.resolve(players)
+        dates = None if date is None else np.full(len(players), np.datetime64(pd.Timestamp(date).date(), 'D'))
+        positions = list(home_positions or [None] * len(home_xi)) + list(away_positions or [None] * len(away_xi))
+        values, groups, missing = self.player_values(fifa_ids, dates, self.position_groups(positions))
+        slot = np.r_[np.zeros(len(home_xi), dtype=np.int64), np.ones(len(away_xi), dtype=np.int64)]
+        row = feature_matrix(slot, GROUP_ROLE[groups], values, 2, np.array([0]), np.array([1]), missing)
+        records = [{'side': 'home' if s == 0 else 'away', 'input': p, 'fifa_id': int(f) if f >= 0 else None,
+                    'resolved_by': 'positional_mean' if m else h, 'group': POS_GROUPS[g]}
+                   for s, p, f, h, m, g in zip(slot, players, fifa_ids, how, missing, groups)]
+        return row, records
+
+    def score(self, rows: np.ndarray) -> np.ndarray:
+        """Class probabilities for feature rows (columns in featurize.FEATURE_COLUMNS order)."""
+        X = rows[:, self.columns]
+        if self.scaler is not None:
+            X = self.scaler.transform(X)
+        return self.model.predict_proba(X)
+
+    def predict(self, home_xi, away_xi, home_positions=None, away_positions=None, date=None) -> dict:
+        row, players = self.feature_row(home_xi, away_xi, home_positions, away_positions, date)
+        proba = self.score(row)[0]
+        return {'probabilities': dict(zip(self.classes, proba.astype(float).tolist())), 'players': players}
+
+
+def historic_lineups(match_id: int) -> dict:
+    """Starting XI names/positions and date of a match from the cached StatsBomb tables."""
+    match = pd.read_parquet(MATCHES_P, filters=[('match_id', '=', match_id)])
+    if match.empty:
+        raise SystemExit(f'match {match_id} not in {MATCHES_P}')
+    sp = pd.read_parquet(SP_P, columns=['match_id', 'team_id', 'player_name_sb', 'position'], filters=[('match_id', '=', match_id)])
+    m = match.iloc[0]
+    home, away = sp[sp['team_id'] == m['home_team_id']], sp[sp['team_id'] == m['away_team_id']]
+    return {
+        'home_xi': home['player_name_sb'].tolist(), 'away_xi': away['player_name_sb'].tolist(),
+        'home_positions': home['position'].tolist(), 'away_positions': away['position'].tolist(),
+        'date': m['match_date'],
+    }
+
+
+def parse_args():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('--home', help='comma-separated home XI (names or fifa ids)')
+    ap.add_argument('--away', help='comma-separated away XI (names or fifa ids)')
+    ap.add_argument('--date', help='match date for as-of FIFA snapshots (default: latest snapshots)')
+    ap.add_argument('--match-id', type=int, help="use a historic match's starting XIs and date")
+    ap.add_argument('--model-dir', type=Path, default=MODEL_DIR)
+    ap.add_argument('--repeat', type=int, default=1, help='run the prediction N times and report warm latency')
+    return ap.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.match_id is not None:
+        request = historic_lineups(args.match_id)
+    elif args.home and args.away:
+        request = {'home_xi': [p.strip() for p in args.home.split(',')], 'away_xi': [p.strip() for p in args.away.split(',')], 'date': args.date}
+    else:
+        raise SystemExit('pass --match-id or both --home and --away')
+    t0 = time.perf_counter()
+    engine = InferenceEngine(args.model_dir)
+    print(f'Engine ready in {(time.perf_counter() - t0) * 1000:.0f} ms')
+    timings = []
+    for _ in range(max(args.repeat, 1)):
+        t0 = time.perf_counter()
+        result = engine.predict(**request)
+        timings.append(time.perf_counter() - t0)
+    for p in result['players']:
+        print(f"  {p['side']:4} {str(p['input']):30} -> {p['fifa_id']} ({p['resolved_by']}, {p['group']})")
+    print('Probabilities:', ', '.join(f'{k}={v:.3f}' for k, v in result['probabilities'].items()))
+    print(f'predict: first {timings[0] * 1000:.1f} ms, median {np.median(timings) * 1000:.2f} ms over {len(timings)} runs')
+
+
+if __name__ == '__main__':
+    main()
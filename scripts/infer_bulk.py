@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# /// script
+# requires-python = ">=3.12"
+# dependencies = ["pandas", "pyarrow", "numpy", "rapidfuzz", "orjson", "scikit-learn"]
+# ///
+"""Bulk inference over fixture lists or scenario lineups, streamed to Parquet.
+
+Input is a long lineup table (Parquet/Arrow), one row per player:
+
+- lineup_id   any id; the rows of a lineup need not be contiguous
+- side        'home' or 'away'
+- player      name or fifa id (or a `fifa_id` column instead)
+- position    optional StatsBomb/FIFA position name
+- date        optional match date for as-of FIFA snapshots (latest where missing)
+
+With `--matches` the lineups are the cached StatsBomb starting XIs of
+matches.parquet (optionally one `--season`), dated by match_date, with the
+fifa_id of each player's accepted mapping (unmapped players fall back to
+positional means, as in features.parquet).
+
+Everything goes through the same InferenceEngine as infer.py, but batched:
+
+- every distinct player is resolved once (one engine.resolve call, so one
+  batched fuzzy matcher call for the names the mappings and the exact index
+  miss), then broadcast back with the factorize codes
+- lineups are sorted once by id and cut into chunks of CHUNK lineups; per
+  chunk, attributes are one matrix gather, features one feature_matrix call
+  and the model one predict_proba call
+- each chunk is appended to the output Parquet file (row group per chunk,
+  written to a temp file and moved into place at the end)
+
+Output columns: lineup_id, one `p_<class>` column per model class and
+home_/away_ counts of players that fell back to positional means.
+
+Usage:
+  uv run scripts/infer_bulk.py --input lineups.parquet [--out data/predictions/lineups.parquet]
+  uv run scripts/infer_bulk.py --matches [--season 2015/2016]
+"""
+from pathlib import Path
+import argparse
+import os
+import time
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from attribute_matrix import LATEST_DAY
+from featurize import MATCHES_P, SIDES, SP_P, feature_matrix, mapped_fifa_ids
+from infer import GROUP_ROLE, MODEL_DIR, InferenceEngine
+from mapping_store import load_accepted
+
+ROOT = Path('data')
+OUT_DIR = ROOT / 'predictions'
+CHUNK = 50000  # lineups per feature matrix / predict_proba call
+
+
+def lineups_from_matches(season: str = None, accepted: pd.DataFrame = None) -> pd.DataFrame:
+    """Long lineup table of the cached starting XIs (lineup_id = match_id).
+
+    Players are identified by the fifa_id of their accepted mapping (-1 when
+    unmapped), not re-resolved by name, so rows match features.parquet.
+    """
+    matches = pd.read_parquet(MATCHES_P, columns=['match_id', 'match_date', 'season_name', 'home_team_id', 'away_team_id'])
+    if season is not None:
+        matches = matches[matches['season_name'] == season]
+    matches = matches.drop_duplicates('match_id').set_index('match_id')
+    sp = pd.read_parquet(SP_P, columns=['match_id', 'team_id', 'player_id_sb', 'player_name_sb', 'position'])
+    sp = sp[sp['match_id'].isin(matches.index)]
+    home = sp['team_id'].to_numpy() == sp['match_id'].map(matches['home_team_id']).to_numpy()
+    away = sp['team_id'].to_numpy() == sp['match_id'].map(matches['away_team_id']).to_numpy()
+    if accepted is None:
+        accepted = load_accepted(columns=['player_id_sb', 'fifa_id'])
+    return pd.DataFrame({
+        'lineup_id': sp['match_id'].to_numpy(),
+        'side': np.where(home, 'home', np.where(away, 'away', None)),
+        'player': sp['player_name_sb'].to_numpy(),
+        'fifa_id': sp['player_id_sb'].map(mapped_fifa_ids(accepted)).fillna(-1).to_numpy(dtype=np.int64),
+        'position': sp['position'].to_numpy(),
+        'date': sp['match_id'].map(matches['match_date']).to_numpy(),
+    })
+
+
+def resolve_column(engine: InferenceEngine, lineups: pd.DataFrame) -> np.ndarray:
+    """fifa_id per row (-1 unresolved), resolving each distinct player once."""
+    if 'fifa_id' in lineups.columns:
+        return pd.to_numeric(lineups['fifa_id'], errors='coerce').fillna(-1).to_numpy(dtype=np.int64)
+    codes, uniques = pd.factorize(lineups['player'])
+    fifa_ids, _ = engine.resolve(list(uniques))
+    return np.r_[fifa_ids, -1][codes]
+
+
+def parse_dates(values: pd.Series) -> np.ndarray:
+    """datetime64[D] per row, parsing each distinct value once (fixture lists repeat a few dates).
+
+    Missing or unparseable dates become attribute_matrix.LATEST_DAY, i.e. the
+    latest snapshot, instead of no snapshot at all.
+    """
+    codes, uniques = pd.factorize(values)
+    latest = np.datetime64(LATEST_DAY, 'D')
+    parsed = pd.to_datetime(pd.Series(uniques), errors='coerce').to_numpy('datetime64[D]')
+    return np.r_[np.where(np.isnat(parsed), latest, parsed), latest][codes]
+
+
+def score_lineups(engine: InferenceEngine, lineups: pd.DataFrame, chunk: int = CHUNK):
+    """Yield one probability frame per chunk of `chunk` lineups."""
+    lineups = lineups[lineups['side'].isin(SIDES)].reset_index(drop=True)
+    fifa_ids = resolve_column(engine, lineups)
+    codes, ids = pd.factorize(lineups['lineup_id'])
+    order = np.argsort(codes, kind='stable')
+    codes, fifa_ids = codes[order], fifa_ids[order]
+    away = (lineups['side'] == 'away').to_numpy(dtype=np.int64)[order]
+    # position names and dates are converted once for the whole table, not per chunk
+    groups = engine.position_groups(lineups['position'])[order] if 'position' in lineups.columns else None
+    dates = parse_dates(lineups['date'])[order] if 'date' in lineups.columns else None
+    bounds = np.searchsorted(codes, np.arange(0, len(ids) + chunk, chunk).clip(max=len(ids)))
+    for c0, (lo, hi) in zip(range(0, len(ids), chunk), zip(bounds[:-1], bounds[1:])):
+        n = min(chunk, len(ids) - c0)
+        values, roles, missing = engine.player_values(fifa_ids[lo:hi], None if dates is None else dates[lo:hi], None if groups is None else groups[lo:hi])
+        slot = (codes[lo:hi] - c0) * 2 + away[lo:hi]
+        X = feature_matrix(slot, GROUP_ROLE[roles], values, 2 * n, np.arange(n) * 2, np.arange(n) * 2 + 1, missing)
+        proba = engine.score(X)
+        fallback = np.bincount(slot, weights=missing, minlength=2 * n).reshape(n, 2).astype(np.int16)
+        frame = pd.DataFrame(proba.astype(np.float32), columns=[f'p_{c}' for c in engine.classes])
+        frame.insert(0, 'lineup_id', ids[c0:c0 + n])
+        frame['home_fallback'], frame['away_fallback'] = fallback[:, 0], fallback[:, 1]
+        yield frame
+
+
+def write_stream(frames, out: Path) -> int:
+    """Append every frame to `out` as its own row group; returns the row count."""
+    out.parent.mkdir(parents=True, exist_ok=True)
+    tmp = out.with_suffix('.parquet.tmp')
+    writer, rows = None, 0
+    try:
+        for frame in frames:
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(tmp, table.schema)
+            writer.write_table(table)
+            rows += len(frame)
+    finally:
+        if writer is not None:
+            writer.close()
+    if writer is None:
+        return 0
+    os.replace(tmp, out)
+    return rows
+
+
+def parse_args():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    src = ap.add_mutually_exclusive_group(required=True)
+    src.add_argument('--input', type=Path, help='long lineup table (Parquet or Arrow IPC)')
+    src.add_argument('--matches', action='store_true', help='score the cached StatsBomb starting XIs')
+    ap.add_argument('--season', help='with --matches: only this season_name')
+    ap.add_argument('--out', type=Path, help='output Parquet (default: data/predictions/<input or matches>.parquet)')
+    ap.add_argument('--chunk', type=int, default=CHUNK, help='lineups per predict call')
+    ap.add_argument('--model-dir', type=Path, default=MODEL_DIR)
+    return ap.parse_args()
+
+
+def read_lineups(path: Path) -> pd.DataFrame:
+    if path.suffix in ('.arrow', '.feather', '.ipc'):
+        return pa.ipc.open_file(pa.memory_map(str(path), 'r')).read_all().to_pandas()
+    return pd.read_parquet(path)
+
+
+def main():
+    args = parse_args()
+    if args.matches:
+        lineups = lineups_from_matches(args.season)
+        name = 'matches' if args.season is None else 'matches_' + args.season.replace('/', '-')
+    else:
+        lineups = read_lineups(args.input)
+        name = args.input.stem
+    out = args.out or OUT_DIR / f'{name}.parquet'
+    engine = InferenceEngine(args.model_dir)
+    t0 = time.perf_counter()
+    rows = write_stream(score_lineups(engine, lineups, args.chunk), out)
+    elapsed = time.perf_counter() - t0
+    print(f'Scored {rows} lineups in {elapsed:.2f}s ({rows / max(elapsed, 1e-9):,.0f}/s) -> {out}')
+
+
+if __name__ == '__main__':
+    main()
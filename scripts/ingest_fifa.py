@@ -1,15 +1,33 @@
 #!/usr/bin/env python3
 # /// script
 # requires-python = ">=3.12"
-# dependencies = ["pandas", "pyarrow"]
+# dependencies = ["pandas", "pyarrow", "numpy"]
 # ///
 """Ingest FIFA CSV(s) and write a canonical player table to Parquet.
 
+The CSV is streamed through pyarrow's CSV reader with only the selected
+columns and a declared compact schema (int32 ids, int16 ratings, uint8
+attributes, dictionary-encoded nationality/club/positions). The snapshot
+columns (fifa_version, fifa_update, fifa_update_date) are kept so each row
+can be dated; see fifa_asof.py. Integer columns are parsed as float64 (CSVs
+exported from pandas write ratings as "81.0" when a column has NaNs) and cast
+to their compact type per batch; values that are fractional or out of range
+become null with a warning instead of failing the ingest. Empty strings are
+read as null. Every decoded
+block is written as its own Parquet row group, so peak memory is bounded by
+the block size rather than the size of the file.
+
 Output:
 - data/cache/fifa_players.parquet
 """
 from pathlib import Path
+import os
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pv
+import pyarrow.parquet as pq
 
 FOLDER = Path("data") / "fifa23"
 OUT = Path("data") / "cache"
@@ -19,6 +37,9 @@ CSV_CANDIDATES = ["male_players.csv", "male_players (legacy).csv", "female_playe
 
 DEFAULT_COLS = [
     "sofifa_id",
+    "fifa_version",
+    "fifa_update",
+    "fifa_update_date",
     "short_name",
     "long_name",
     "player_positions",
@@ -34,6 +55,36 @@ DEFAULT_COLS = [
     "physic",
 ]
 
+# FIFA 23 dataset column names for the canonical columns above
+COLUMN_ALIASES = {
+    "sofifa_id": "player_id",
+    "nationality": "nationality_name",
+    "club": "club_name",
+}
+
+_DICT_STRING = pa.dictionary(pa.int32(), pa.string())
+COLUMN_TYPES = {
+    "sofifa_id": pa.int32(),
+    "fifa_version": pa.uint8(),
+    "fifa_update": pa.uint8(),
+    "fifa_update_date": pa.date32(),
+    "short_name": pa.string(),
+    "long_name": pa.string(),
+    "player_positions": _DICT_STRING,
+    "overall": pa.int16(),
+    "age": pa.uint8(),
+    "nationality": _DICT_STRING,
+    "club": _DICT_STRING,
+    "pace": pa.uint8(),
+    "shooting": pa.uint8(),
+    "passing": pa.uint8(),
+    "dribbling": pa.uint8(),
+    "defending": pa.uint8(),
+    "physic": pa.uint8(),
+}
+
+BLOCK_SIZE = 16 << 20  # bytes of CSV per decoded batch / row group
+
 
 def find_csv():
     for c in CSV_CANDIDATES:
@@ -43,35 +94,84 @@ def find_csv():
     raise FileNotFoundError("No FIFA CSV found in data/fifa23/ (searched candidates)")
 
 
-def load_and_select(path: Path):
-    # read a small chunk to inspect columns
-    sample = pd.read_csv(path, nrows=100)
-    available = set(sample.columns)
-    cols = [c for c in DEFAULT_COLS if c in available]
+def select_columns(path: Path) -> list[tuple[str, str]]:
+    """Return (csv column, canonical column) pairs for the default columns present in `path`."""
+    # read the header only to inspect columns
+    available = set(pd.read_csv(path, nrows=0).columns)
+    cols = []
+    for col in DEFAULT_COLS:
+        if col in available:
+            cols.append((col, col))
+        elif COLUMN_ALIASES.get(col) in available:
+            cols.append((COLUMN_ALIASES[col], col))
     if not cols:
         raise RuntimeError("None of the default columns found in FIFA CSV; available columns: " + ",".join(list(available)[:20]))
-    print("Selected columns:", cols)
-    df = pd.read_csv(path, usecols=cols)
-    # normalize column names
-    df = df.rename(columns={
-        col: col for col in cols
-    })
-    return df
+    print("Selected columns:", [f"{src}->{dst}" if src != dst else dst for src, dst in cols])
+    return cols
+
+
+def read_type(dst: str) -> pa.DataType:
+    """Type the CSV reader parses `dst` as: float64 for integer columns, else the declared type."""
+    return pa.float64() if pa.types.is_integer(COLUMN_TYPES[dst]) else COLUMN_TYPES[dst]
+
+
+def to_declared(column: pa.Array, dst: str) -> tuple[pa.Array, int]:
+    """Cast a parsed column to its declared type; returns (array, number of values nulled).
+
+    Integer columns arrive as float64; fractional or out-of-range values become null.
+    """
+    target = COLUMN_TYPES[dst]
+    if not pa.types.is_integer(target):
+        return column, 0
+    info = np.iinfo(target.to_pandas_dtype())
+    valid = pc.and_(pc.equal(pc.floor(column), column),
+                    pc.and_(pc.greater_equal(column, info.min), pc.less_equal(column, info.max)))
+    cleaned = pc.if_else(valid, column, pa.scalar(None, pa.float64()))
+    return pc.cast(cleaned, target), cleaned.null_count - column.null_count
+
+
+def stream_batches(path: Path, cols: list[tuple[str, str]]):
+    """Yield (schema, batch iterator) reading only `cols`, cast to their declared types."""
+    schema = pa.schema([(dst, COLUMN_TYPES[dst]) for _, dst in cols])
+    reader = pv.open_csv(
+        path,
+        read_options=pv.ReadOptions(block_size=BLOCK_SIZE),
+        convert_options=pv.ConvertOptions(
+            include_columns=[src for src, _ in cols],
+            column_types={src: read_type(dst) for src, dst in cols},
+            strings_can_be_null=True,
+        ),
+    )
+
+    def batches():
+        for batch in reader:
+            arrays = []
+            for column, (_, dst) in zip(batch.columns, cols):
+                array, n_invalid = to_declared(column, dst)
+                if n_invalid:
+                    print(f"Warning: {n_invalid} fractional or out-of-range {dst} values set to null")
+                arrays.append(array)
+            # canonical names come from the schema, source names are dropped
+            yield pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+    return schema, batches()
 
 
 def main():
     path = find_csv()
     print("Loading FIFA CSV:", path)
-    df = load_and_select(path)
+    cols = select_columns(path)
+    schema, batches = stream_batches(path, cols)
     out = OUT / "fifa_players.parquet"
-    try:
-        df.to_parquet(out, index=False)
-        print("Wrote FIFA players to", out)
-    except Exception as e:
-        out_csv = OUT / "fifa_players.csv"
-        df.to_csv(out_csv, index=False)
-        print("Parquet write failed (fallback to CSV). Wrote FIFA players to", out_csv)
-        print("Error was:", e)
+    tmp = out.with_suffix(".parquet.tmp")
+    n_rows = n_groups = 0
+    with pq.ParquetWriter(tmp, schema) as writer:
+        for batch in batches:
+            writer.write_batch(batch)
+            n_rows += batch.num_rows
+            n_groups += 1
+    os.replace(tmp, out)
+    print(f"Wrote {n_rows} FIFA players ({n_groups} row groups) to", out)
 
 
 if __name__ == '__main__':
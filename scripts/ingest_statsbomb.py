@@ -1,16 +1,41 @@
 #!/usr/bin/env python3
 # /// script
 # requires-python = ">=3.12"
-# dependencies = ["pandas", "pyarrow"]
+# dependencies = ["pandas", "pyarrow", "orjson"]
 # ///
 """Ingest StatsBomb open-data for Big-5 competitions and write a canonical matches table.
 
+Match files (one per competition/season) are decoded in a process pool and each
+file is streamed into the Parquet writer as an Arrow record batch, so memory
+stays flat regardless of how many seasons are ingested.
+
+A manifest of the source files is kept next to the output. With
+`--incremental` only new or changed match files are decoded and merged into
+the existing table: every row a changed file produced last time (its
+match_ids are kept in its manifest entry) is dropped before the re-decoded
+rows are appended, so matches removed from a file disappear too. If a source
+file disappeared, or the manifest predates the recorded match_ids, the table
+is rebuilt in full.
+
+Usage:
+  uv run scripts/ingest_statsbomb.py [--workers N] [--incremental]
+
+`--workers 0` (default) uses every core, `--workers 1` decodes in-process.
+
 Output:
 - data/cache/matches.parquet
 """
 from pathlib import Path
-import json
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import os
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from fast_json import load_json
+from file_manifest import load_manifest, save_manifest, scan_files
 
 ROOT = Path("data") / "statsbom-opendata" / "data"
 OUT = Path("data") / "cache"
@@ -19,11 +44,23 @@ OUT.mkdir(parents=True, exist_ok=True)
 BIG5_KEYWORDS = ["Premier", "Premier League", "La Liga", "LaLiga", "Serie A", "Bundesliga", "1. Bundesliga", "Ligue 1"]
 BIG5_COUNTRIES = ["England", "Spain", "Italy", "Germany", "France"]
 
+MATCH_SCHEMA = pa.schema([
+    ("match_id", pa.int64()),
+    ("competition_id", pa.int64()),
+    ("season_name", pa.string()),
+    ("match_date", pa.string()),
+    ("home_team_id", pa.int64()),
+    ("home_team_name", pa.string()),
+    ("away_team_id", pa.int64()),
+    ("away_team_name", pa.string()),
+    ("home_score", pa.int64()),
+    ("away_score", pa.int64()),
+])
+
 
 def load_competitions():
     p = ROOT / "competitions.json"
-    with p.open("r", encoding="utf-8") as f:
-        comps = json.load(f)
+    comps = load_json(p)
     df = pd.DataFrame(comps)
     return df
 
@@ -39,54 +76,125 @@ def select_big5_competition_ids(comps: pd.DataFrame):
     return selected
 
 
-def read_matches_for_competition(comp_id: int):
+def match_files_for_competition(comp_id: int) -> list[Path]:
     folder = ROOT / "matches" / str(comp_id)
     if not folder.exists():
         return []
-    out = []
-    for file in folder.glob("*.json"):
-        with file.open("r", encoding="utf-8") as f:
-            m = json.load(f)
-        # Some files contain a list of matches
-        entries = m if isinstance(m, list) else [m]
-        for entry in entries:
-            out.append({
-                "match_id": entry.get("match_id"),
-                "competition_id": entry.get("competition_id"),
-                "season_name": entry.get("season_name"),
-                "match_date": entry.get("match_date"),
-                "home_team_id": entry.get("home_team" , {}).get("home_team_id") if isinstance(entry.get("home_team"), dict) else entry.get("home_team"),
-                "home_team_name": entry.get("home_team", {}).get("home_team_name") if isinstance(entry.get("home_team"), dict) else None,
-                "away_team_id": entry.get("away_team", {}).get("away_team_id") if isinstance(entry.get("away_team"), dict) else entry.get("away_team"),
-                "away_team_name": entry.get("away_team", {}).get("away_team_name") if isinstance(entry.get("away_team"), dict) else None,
-                "home_score": entry.get("home_score"),
-                "away_score": entry.get("away_score"),
-            })
-    return out
+    return sorted(folder.glob("*.json"))
+
+
+def match_row(entry: dict) -> dict:
+    home = entry.get("home_team")
+    away = entry.get("away_team")
+    # match files nest competition/season; keep the flat keys as a fallback
+    competition = entry.get("competition") if isinstance(entry.get("competition"), dict) else {}
+    season = entry.get("season") if isinstance(entry.get("season"), dict) else {}
+    return {
+        "match_id": entry.get("match_id"),
+        "competition_id": entry.get("competition_id", competition.get("competition_id")),
+        "season_name": entry.get("season_name", season.get("season_name")),
+        "match_date": entry.get("match_date"),
+        "home_team_id": home.get("home_team_id") if isinstance(home, dict) else home,
+        "home_team_name": home.get("home_team_name") if isinstance(home, dict) else None,
+        "away_team_id": away.get("away_team_id") if isinstance(away, dict) else away,
+        "away_team_name": away.get("away_team_name") if isinstance(away, dict) else None,
+        "home_score": entry.get("home_score"),
+        "away_score": entry.get("away_score"),
+    }
+
+
+def read_match_file(file: Path) -> pa.RecordBatch:
+    """Decode one competition/season match file into a typed record batch."""
+    m = load_json(file)
+    # Some files contain a list of matches
+    entries = m if isinstance(m, list) else [m]
+    return pa.RecordBatch.from_pylist([match_row(e) for e in entries], schema=MATCH_SCHEMA)
+
+
+def iter_match_batches(files: list[Path], workers: int):
+    if workers == 1 or len(files) <= 1:
+        for file in files:
+            yield read_match_file(file)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # map() yields in submission order, so the output is deterministic
+        yield from pool.map(read_match_file, files, chunksize=4)
+
+
+def record_match_ids(files: list[Path], batches, entries: dict):
+    """Pass `batches` through, storing each file's match_ids in its manifest entry."""
+    for file, batch in zip(files, batches):
+        entries[file.as_posix()]["match_ids"] = batch.column("match_id").to_pylist()
+        yield batch
+
+
+def merge_changed(out_path: Path, batches, stale_ids: list) -> int:
+    """Replace the rows of `out_path` that came from changed files with their re-decoded rows.
+
+    `stale_ids` are the match_ids the changed files produced last time; they
+    are dropped even if a file no longer contains them.
+    """
+    new = pa.Table.from_batches(list(batches), schema=MATCH_SCHEMA)
+    existing = pq.read_table(out_path)
+    drop = pa.concat_arrays([pa.array(stale_ids, pa.int64()), new["match_id"].combine_chunks()])
+    keep = existing.filter(pc.invert(pc.is_in(existing["match_id"], value_set=drop)))
+    return write_batches(pa.concat_tables([keep, new]).to_batches(), out_path)
+
+
+def write_batches(batches, out_path: Path) -> int:
+    """Stream record batches into `out_path` (written to a temp file, then renamed)."""
+    tmp_path = out_path.with_suffix(out_path.suffix + ".tmp")
+    n_rows = 0
+    with pq.ParquetWriter(tmp_path, MATCH_SCHEMA) as writer:
+        for batch in batches:
+            if batch.num_rows:
+                writer.write_batch(batch)
+                n_rows += batch.num_rows
+    os.replace(tmp_path, out_path)
+    return n_rows
+
+
+def parse_args():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--workers", type=int, default=0, help="decoder processes (0 = all cores, 1 = no pool)")
+    ap.add_argument("--incremental", action="store_true", help="only decode new or changed match files")
+    return ap.parse_args()
 
 
 def main():
+    args = parse_args()
+    workers = args.workers or os.cpu_count() or 1
     comps = load_competitions()
     selected = select_big5_competition_ids(comps)
     comp_ids = selected["competition_id"].unique().tolist()
     print("Selected competition ids:", comp_ids)
 
-    all_matches = []
-    for cid in comp_ids:
-        ms = read_matches_for_competition(cid)
-        all_matches.extend(ms)
-
-    df = pd.DataFrame(all_matches)
+    files = [f for cid in comp_ids for f in match_files_for_competition(cid)]
     out_path = OUT / "matches.parquet"
-    try:
-        df.to_parquet(out_path, index=False)
-        print("Wrote matches to", out_path)
-    except Exception as e:
-        # Fallback to CSV if parquet engine is missing in this environment
-        out_csv = OUT / "matches.csv"
-        df.to_csv(out_csv, index=False)
-        print("Parquet write failed (fallback to CSV). Wrote matches to", out_csv)
-        print("Error was:", e)
+    previous = load_manifest(out_path) if args.incremental else {}
+    entries, changed, removed = scan_files(files, previous)
+    for key, entry in entries.items():
+        # touched but unchanged files keep the match_ids of their previous entry
+        if "match_ids" not in entry and "match_ids" in previous.get(key, {}):
+            entry["match_ids"] = previous[key]["match_ids"]
+
+    # manifests written before match_ids were recorded cannot say which rows a changed file owns
+    incremental = args.incremental and bool(previous) and not removed and all("match_ids" in e for e in previous.values())
+    if incremental and pq.read_schema(out_path).equals(MATCH_SCHEMA, check_metadata=False):
+        print(f"Incremental run: {len(changed)} new/changed of {len(files)} match files")
+        if changed:
+            stale_ids = [i for f in changed for i in previous.get(f.as_posix(), {}).get("match_ids", [])]
+            n_rows = merge_changed(out_path, record_match_ids(changed, iter_match_batches(changed, workers), entries), stale_ids)
+            print(f"Wrote {n_rows} matches to", out_path)
+        else:
+            print("Matches table is up to date:", out_path)
+    else:
+        if args.incremental:
+            print("No usable manifest (or source files were removed); rebuilding in full")
+        print(f"Decoding {len(files)} match files with {workers} worker(s)")
+        n_rows = write_batches(record_match_ids(files, iter_match_batches(files, workers), entries), out_path)
+        print(f"Wrote {n_rows} matches to", out_path)
+    save_manifest(out_path, entries)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+# /// script
+# requires-python = ">=3.12"
+# dependencies = ["pandas", "pyarrow", "numpy", "scikit-learn"]
+# ///
+"""Learned mapping classifier: score every stored candidate and auto-accept at a precision target.
+
+Runs after the fuzzy/promotion passes. Every (StatsBomb player, FIFA
+candidate) pair in `data/mappings/candidates.parquet` gets one feature row,
+built column-wise as NumPy arrays in a single pass over the candidate table:
+
+- fuzzy scores (score, token_sort_ratio, token_set_ratio), rank, gap to the
+  player's best score, number of candidates
+- token overlap (Jaccard) between the StatsBomb and FIFA normalized names
+- position group agreement (positions.py), country agreement (countries.py)
+- team consistency with accepted teammates' clubs (match_players_team_context.py)
+
+Labels come from the human decisions of review_mapping.py: a manually
+accepted player's candidate carrying the chosen fifa_id is positive and its
+other candidates negative; every candidate of a rejected player is negative.
+These players were drawn from the same review queue the classifier promotes
+from, so precision measured on them is precision on the promoted rows. The
+mappings accepted by the heuristic passes are not used for calibration: they
+were accepted by thresholds on the very features the model sees (score,
+positions, countries, team consistency), so they would only teach it those
+rules back and would say nothing about the rows below them.
+
+A HistGradientBoostingClassifier is trained on a player-grouped split of the
+manual decisions. The held-out players are split again: the decision
+threshold is the lowest one reaching PRECISION_TARGET on one part, and
+metrics.json reports precision and recall on the other part (EVAL_SHARE).
+With fewer than MIN_MANUAL_PLAYERS reviewed players the model is trained on
+the heuristic labels instead and every reviewed player is held out; without
+calibration players of both outcomes no threshold can be chosen and nothing
+is promoted. Review/unmatched players are then scored in one batched
+predict_proba and their best candidate is promoted when it clears the
+threshold.
+
+Outputs:
+- models/mapping_classifier/model.pkl     model, feature names and threshold
+- models/mapping_classifier/metrics.json  validation metrics
+- promoted rows upserted into the accepted and review tables (mapping_store.py)
+
+Usage: uv run scripts/mapping_classifier.py [--precision 0.98] [--no-train]
+"""
+from pathlib import Path
+import argparse
+import json
+import pickle
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import HistGradientBoostingClassifier
+from sklearn.metrics import precision_recall_curve, roc_auc_score
+from sklearn.model_selection import GroupShuffleSplit
+
+from candidates_store import load_candidates
+from fifa_player_info import load_player_info
+from mapping_store import ACCEPTED_MANUAL, OPEN_STATUSES, REJECTED, load_accepted, load_review, promote, upsert_accepted, upsert_review
+from match_players_country_pass import fifa_countries, sb_player_countries
+from match_players_position_pass import sb_player_groups
+from match_players_team_context import MATCHES_P, load_snapshot_clubs, team_consistency
+from name_normalize import normalize_names
+
+ROOT = Path('data')
+SP_P = ROOT / 'cache' / 'matches_starting_players.parquet'
+MODEL_DIR = Path('models') / 'mapping_classifier'
+
+PRECISION_TARGET = 0.98
+VALID_SHARE = 0.25
+EVAL_SHARE = 0.5  # of the held-out players: metrics are reported on these, the threshold is chosen on the rest
+MIN_MANUAL_PLAYERS = 200  # reviewed players needed to train on the manual decisions alone
+SEED = 0
+FEATURES = [
+    'score', 'token_sort_ratio', 'token_set_ratio', 'rank', 'score_gap', 'n_candidates',
+    'token_jaccard', 'pos_known', 'pos_match', 'country_known', 'country_match', 'team_consistency',
+]
+
+
+def token_jaccard(sb_names, fifa_names) -> np.ndarray:
+    """Jaccard overlap of the name tokens of each (StatsBomb, FIFA) normalized name pair."""
+    cache = {}
+    out = np.empty(len(sb_names), dtype=np.float32)
+    for i, (a, b) in enumerate(zip(sb_names, fifa_names)):
+        ta = cache.get(a)
+        if ta is None:
+            ta = cache[a] = frozenset(a.split())
+        tb = set(b.split())
+        tb.discard('||')
+        union = len(ta | tb)
+        out[i] = len(ta & tb) / union if union else 0
+    return out
+
+
+def candidate_features(cands: pd.DataFrame, sb_names: pd.Series, sb_groups: pd.Series, sb_countries: pd.Series, fifa: pd.DataFrame, consistency: np.ndarray) -> np.ndarray:
+    """Return the (len(cands), len(FEATURES)) float32 feature matrix.
+
+    `sb_names`, `sb_groups` and `sb_countries` are indexed by player_id_sb;
+    `fifa` is the per-player FIFA table indexed by fifa_id with `pos_group`
+    and `country` columns.
+    """
+    pid = cands['player_id_sb'].to_numpy()
+    score = cands['score'].to_numpy(dtype=np.float32)
+    by_player = cands.groupby('player_id_sb', sort=False)['score']
+    sb_g = sb_groups.reindex(pid).astype(object).fillna('UNK').to_numpy()
+    hit = fifa.reindex(cands['fifa_id'].to_numpy())
+    fifa_g = hit['pos_group'].astype(object).fillna('UNK').to_numpy()
+    sb_c = sb_countries.reindex(pid).astype(object).fillna('').to_numpy()
+    fifa_c = hit['country'].astype(object).fillna('').to_numpy()
+    pos_known = (sb_g != 'UNK') & (fifa_g != 'UNK')
+    country_known = (sb_c != '') & (fifa_c != '')
+    cols = {
+        'score': score,
+        'token_sort_ratio': cands['token_sort_ratio'].to_numpy(dtype=np.float32),
+        'token_set_ratio': cands['token_set_ratio'].to_numpy(dtype=np.float32),
+        'rank': cands['rank'].to_numpy(dtype=np.float32),
+        'score_gap': by_player.transform('max').to_numpy(dtype=np.float32) - score,
+        'n_candidates': by_player.transform('size').to_numpy(dtype=np.float32),
+        'token_jaccard': token_jaccard(sb_names.reindex(pid).fillna('').tolist(), cands['candidate_normalized'].fillna('').tolist()),
+        'pos_known': pos_known,
+        'pos_match': pos_known & (sb_g == fifa_g),
+        'country_known': country_known,
+        'country_match': country_known & (sb_c == fifa_c),
+        'team_consistency': consistency,
+    }
+    return np.column_stack([np.asarray(cols[f], dtype=np.float32) for f in FEATURES])
+
+
+def build_features(cands: pd.DataFrame, review: pd.DataFrame, accepted: pd.DataFrame, sp: pd.DataFrame, matches: pd.DataFrame, fifa: pd.DataFrame, snaps: pd.DataFrame) -> np.ndarray:
+    """Featurize every row of `cands` from the in-memory side tables.
+
+    `sp` is the starting players table, `matches` its (match_id, match_date)
+    dates, `fifa` the per-player FIFA table and `snaps` the as-of club table
+    (match_players_team_context.load_snapshot_clubs).
+    """
+    players = review.drop_duplicates('player_id_sb')
+    sb_names = pd.Series(normalize_names(players['player_name_sb']).to_pylist(), index=players['player_id_sb'].to_numpy())
+    fifa_side = pd.DataFrame({'pos_group': fifa['pos_group'].to_numpy(), 'country': fifa_countries(fifa).to_numpy()}, index=fifa['fifa_id'].to_numpy())
+    consistency = team_consistency(cands, sp, matches, accepted, snaps)
+    return candidate_features(cands, sb_names, sb_player_groups(sp), sb_player_countries(sp), fifa_side, consistency)
+
+
+def training_labels(cands: pd.DataFrame, review: pd.DataFrame, accepted: pd.DataFrame):
+    """Return (y, labeled, manual) for `cands`.
+
+    `manual` marks the candidates of players decided in review_mapping.py
+    (accepted_manual or rejected); the other labeled rows come from the
+    mappings the heuristic passes accepted.
+    """
+    rejected = review.loc[review['status'] == REJECTED, 'player_id_sb']
+    manual_ids = pd.concat([review.loc[review['status'] == ACCEPTED_MANUAL, 'player_id_sb'], rejected])
+    truth = accepted[accepted['method'] != 'classifier'].drop_duplicates('player_id_sb').set_index('player_id_sb')['fifa_id']
+    truth = pd.to_numeric(truth, errors='coerce').astype(float)
+    truth = truth[~truth.index.isin(rejected)]
+    y = (cands['fifa_id'].to_numpy() == truth.reindex(cands['player_id_sb'].to_numpy()).to_numpy()).astype(np.int8)
+    # players whose accepted id is not among their candidates carry no signal
+    has_pos = pd.Series(y, index=cands.index).groupby(cands['player_id_sb']).transform('max').to_numpy() > 0
+    is_rejected = cands['player_id_sb'].isin(rejected).to_numpy()
+    labeled = (cands['player_id_sb'].isin(truth.index).to_numpy() & has_pos) | is_rejected
+    manual = labeled & cands['player_id_sb'].isin(manual_ids).to_numpy()
+    return y, labeled, manual
+
+
+def choose_threshold(y_true: np.ndarray, proba: np.ndarray, target: float) -> float:
+    """Lowest probability threshold whose precision reaches `target` (inf if none does)."""
+    precision, _, thresholds = precision_recall_curve(y_true, proba)
+    ok = np.flatnonzero(precision[:-1] >= target)
+    return float(thresholds[ok[0]]) if len(ok) else float('inf')
+
+
+def split_players(rows: np.ndarray, y: np.ndarray, groups: np.ndarray, share: float):
+    """Player-grouped split of `rows` into (rest, share of the players) row indices."""
+    if len(np.unique(groups[rows])) < 2:
+        return rows, rows[:0]
+    rest, part = next(GroupShuffleSplit(n_splits=1, test_size=share, random_state=SEED).split(rows, y[rows], groups[rows]))
+    return rows[rest], rows[part]
+
+
+def train(X: np.ndarray, y: np.ndarray, groups: np.ndarray, manual: np.ndarray, target: float):
+    """Fit and calibrate on the manual decisions; return (model, threshold, metrics).
+
+    With at least MIN_MANUAL_PLAYERS reviewed players the model is fit on a
+    player-grouped split of them. Otherwise it is fit on the heuristic labels
+    and all reviewed players are held out. The held-out players are split
+    again: the threshold is chosen on one part and the reported metrics come
+    from the other, so they are not optimistic by construction. The threshold
+    is inf (nothing is promoted) when the calibration players do not have
+    both outcomes.
+    """
+    n_manual = len(np.unique(groups[manual]))
+    if n_manual >= MIN_MANUAL_PLAYERS:
+        labels = 'manual'
+        train_idx, valid_idx = split_players(np.flatnonzero(manual), y, groups, VALID_SHARE)
+    else:
+        labels = 'heuristic'
+        train_idx, valid_idx = np.flatnonzero(~manual), np.flatnonzero(manual)
+    calib_idx, eval_idx = split_players(valid_idx, y, groups, EVAL_SHARE)
+    if len(np.unique(y[train_idx])) < 2:
+        raise SystemExit('Need both accepted and rejected candidates to train; run the fuzzy passes first.')
+    model = HistGradientBoostingClassifier(max_iter=200, learning_rate=0.1, random_state=SEED)
+    model.fit(X[train_idx], y[train_idx])
+    proba_calib = model.predict_proba(X[calib_idx])[:, 1] if len(calib_idx) else np.empty(0)
+    y_calib = y[calib_idx]
+    calibrated = len(np.unique(y_calib)) == 2
+    threshold = choose_threshold(y_calib, proba_calib, target) if calibrated else float('inf')
+    if not calibrated:
+        print(f'Only {n_manual} reviewed players; review more rows with review_mapping.py to calibrate a threshold. Nothing is promoted.')
+    # metrics on players the threshold was not chosen on
+    proba = model.predict_proba(X[eval_idx])[:, 1] if len(eval_idx) else np.empty(0)
+    y_eval = y[eval_idx]
+    accept = proba >= threshold
+    tp = int((accept & (y_eval == 1)).sum())
+    metrics = {
+        'labels': labels,
+        'n_manual_players': int(n_manual),
+        'n_train': int(len(train_idx)),
+        'n_calibration': int(len(calib_idx)),
+        'n_eval': int(len(eval_idx)),
+        'precision_target': target,
+        'threshold': threshold if np.isfinite(threshold) else None,
+        'eval_precision': tp / int(accept.sum()) if accept.any() else None,
+        'eval_recall': tp / int(y_eval.sum()) if y_eval.any() else None,
+        'eval_auc': float(roc_auc_score(y_eval, proba)) if len(np.unique(y_eval)) == 2 else None,
+    }
+    return model, threshold, metrics
+
+
+def save_model(model, threshold: float, metrics: dict, out: Path = MODEL_DIR):
+    out.mkdir(parents=True, exist_ok=True)
+    with open(out / 'model.pkl', 'wb') as f:
+        pickle.dump({'model': model, 'features': FEATURES, 'threshold': threshold}, f)
+    (out / 'metrics.json').write_text(json.dumps(metrics, indent=2), encoding='utf-8')
+
+
+def load_model(path: Path = MODEL_DIR):
+    with open(path / 'model.pkl', 'rb') as f:
+        bundle = pickle.load(f)
+    if bundle['features'] != FEATURES:
+        raise SystemExit(f'{path} was trained on different features; retrain without --no-train')
+    return bundle['model'], bundle['threshold']
+
+
+def promote_by_classifier(review: pd.DataFrame, accepted: pd.DataFrame, candidates: pd.DataFrame, sp: pd.DataFrame, matches: pd.DataFrame, fifa: pd.DataFrame, snaps: pd.DataFrame, precision: float = PRECISION_TARGET, retrain: bool = True, model_dir: Path = MODEL_DIR):
+    """(Re)train, score all candidates and return the (review_delta, accepted_delta) of the promotion."""
+    cands = candidates.reset_index(drop=True)
+    X = build_features(cands, review, accepted, sp, matches, fifa, snaps)
+    print(f'Featurized {len(cands)} candidate pairs ({X.shape[1]} features)')
+
+    if retrain:
+        y, labeled, manual = training_labels(cands, review, accepted)
+        model, threshold, metrics = train(X[labeled], y[labeled], cands['player_id_sb'].to_numpy()[labeled], manual[labeled], precision)
+        save_model(model, threshold, metrics, model_dir)
+        print('Evaluation:', json.dumps(metrics))
+    else:
+        model, threshold = load_model(model_dir)
+
+    open_ids = review.loc[review['status'].isin(OPEN_STATUSES), 'player_id_sb']
+    todo = cands['player_id_sb'].isin(open_ids).to_numpy()
+    proba = model.predict_proba(X[todo])[:, 1] if todo.any() else np.empty(0)
+    scored = cands.loc[todo, ['player_id_sb', 'fifa_id', 'candidate_name', 'score']].assign(proba=proba)
+    best = scored.sort_values(['player_id_sb', 'proba'], ascending=[True, False]).drop_duplicates('player_id_sb')
+    winners = best[best['proba'] >= threshold].set_index('player_id_sb')
+    print(f'Scored {int(todo.sum())} candidates of {len(open_ids)} open review rows (threshold {threshold:.3f}).')
+    return promote(review, winners, 'accepted_classifier', 'classifier')
+
+
+def parse_args():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('--precision', type=float, default=PRECISION_TARGET, help='precision target for auto-accepting')
+    ap.add_argument('--no-train', action='store_true', help='reuse the saved model and threshold')
+    return ap.parse_args()
+
+
+def main():
+    args = parse_args()
+    review = load_review(columns=['player_id_sb', 'player_name_sb', 'status'])
+    accepted = load_accepted(columns=['player_id_sb', 'fifa_id', 'method'])
+    sp = pd.read_parquet(SP_P, columns=['match_id', 'team_id', 'player_id_sb', 'position_id', 'position', 'player_country'])
+    matches = pd.read_parquet(MATCHES_P, columns=['match_id', 'match_date'])
+    fifa = load_player_info(columns=['fifa_id', 'pos_group', 'nationality'])
+    review_delta, accepted_delta = promote_by_classifier(review, accepted, load_candidates(), sp, matches, fifa, load_snapshot_clubs(), args.precision, retrain=not args.no_train)
+    upsert_accepted(accepted_delta)
+    upsert_review(review_delta)
+    print(f'Promoted {len(accepted_delta)} mappings (classifier).')
+
+
+if __name__ == '__main__':
+    main()
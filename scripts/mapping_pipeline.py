@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+# /// script
+# requires-python = ">=3.12"
+# dependencies = ["pandas", "rapidfuzz", "pyarrow", "numpy", "orjson", "scikit-learn"]
+# ///
+"""Run the whole player-mapping flow in one process as a DAG of cached stages.
+
+Stages (each one is the pure function behind the corresponding script):
+
+    lineups -> quick -> full_fuzzy -> position -> country -> team_context [-> classifier] -> coverage -> report
+
+Tables are handed from stage to stage in memory. A stage's tables are the
+tables of its dependencies overlaid with the ones it produces (a promotion
+pass only produces `review` and `accepted`, its deltas upserted into the
+incoming tables; `candidates` flows through).
+
+Every stage's outputs are cached under `data/cache/pipeline/<stage>/<key>/`,
+where the key is a content hash of:
+
+- the stage's parameters (thresholds such as auto_accept or min_score)
+- the keys of its dependencies
+- its external sources (lineup file hashes, FIFA parquet signature, a hash
+  of the manual review decisions, which are overlaid on the quick stage's
+  tables so every later pass and the coverage numbers include them)
+- the source code of the module implementing it and of the shared helpers
+  (SHARED_MODULES: name index, as-of snapshots, fuzzy scoring, ...)
+
+Changing one threshold therefore re-runs only that stage and the ones
+downstream; everything upstream is loaded from the cache. At the end the final
+tables are exported to the usual artifacts (player_map.parquet,
+player_map_review.parquet, candidates.parquet, matches_starting_players.parquet)
+together with the per-season coverage report (coverage_report.py), and the
+coverage simulation is printed.
+
+Usage:
+  uv run scripts/mapping_pipeline.py
+  uv run scripts/mapping_pipeline.py --set position.min_score=80 --classifier
+  uv run scripts/mapping_pipeline.py --force full_fuzzy   # re-run a stage and everything after it
+"""
+from dataclasses import dataclass, field
+from functools import cache, partial
+from pathlib import Path
+import argparse
+import hashlib
+import inspect
+import json
+import os
+import shutil
+import sys
+import pandas as pd
+import pyarrow.parquet as pq
+
+import candidates_store
+import countries
+import coverage_report
+import fifa_asof
+import fifa_name_index
+import fifa_player_info
+import fuzzy_batch
+import mapping_classifier
+import mapping_store
+import match_players
+import match_players_country_pass
+import match_players_fullfuzzy
+import match_players_position_pass
+import match_players_team_context
+import name_normalize
+import positions
+import simulate_threshold_coverage
+from candidates_store import write_candidates
+from file_manifest import load_manifest, save_manifest, scan_files
+from mapping_store import ACCEPTED_COLUMNS, REVIEW_COLUMNS, keep_manual, manual_decisions, save_accepted, save_review, upsert
+
+ROOT = Path('data')
+CACHE_DIR = ROOT / 'cache' / 'pipeline'
+FIFA_PARQ = ROOT / 'cache' / 'fifa_players.parquet'
+OUT_PLAYERS = ROOT / 'cache' / 'matches_starting_players.parquet'
+MATCHES_PARQ = ROOT / 'cache' / 'matches.parquet'
+
+KEEP_RUNS = 5  # cached outputs kept per stage (most recent first)
+# helpers every stage depends on; their source is part of every stage key
+SHARED_MODULES = (candidates_store, countries, fifa_asof, fifa_name_index, fifa_player_info, fuzzy_batch, mapping_store, name_normalize, positions)
+
+
+@dataclass
+class Stage:
+    name: str
+    run: object  # run(tables: dict, **params) -> dict of DataFrames
+    deps: list = field(default_factory=list)
+    params: dict = field(default_factory=dict)
+    sources: object = None  # () -> JSON-able description of external inputs
+    module: object = None  # module whose source code is part of the key
+
+
+# ---- shared resources, loaded at most once per process ----
+
+@cache
+def fifa_index():
+    return fifa_name_index.load_index()
+
+
+@cache
+def fifa_players():
+    return fifa_player_info.load_player_info()
+
+
+@cache
+def snapshot_clubs():
+    return match_players_team_context.load_snapshot_clubs()
+
+
+@cache
+def match_dates():
+    return pd.read_parquet(MATCHES_PARQ, columns=['match_id', 'match_date'])
+
+
+@cache
+def manual():
+    return manual_decisions()
+
+
+def manual_digest() -> str:
+    """Content hash of the manual decisions (not the file signature: every export rewrites the review table)."""
+    h = hashlib.blake2b(digest_size=16)
+    for df in manual():
+        h.update(pd.util.hash_pandas_object(df.sort_values('player_id_sb'), index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def fifa_sources():
+    return {'fifa': fifa_name_index.source_signature(FIFA_PARQ), 'index_version': fifa_name_index.INDEX_VERSION, 'info_version': fifa_player_info.INFO_VERSION}
+
+
+def quick_sources():
+    """fifa_sources plus the manual decisions overlaid on the quick stage."""
+    return {**fifa_sources(), 'manual': manual_digest()}
+
+
+def dated_sources():
+    """fifa_sources plus the match dates and snapshot table the as-of club lookups use."""
+    return {**fifa_sources(), 'matches': fifa_name_index.source_signature(MATCHES_PARQ), 'snapshot_version': fifa_asof.SNAP_VERSION}
+
+
+@cache
+def lineup_scan():
+    """(match_ids, manifest entries, content digest) of the current lineup files."""
+    match_ids = match_players.load_match_ids()
+    files = [p for p in (match_players.LINEUPS / f'{mid}.json' for mid in match_ids) if p.exists()]
+    entries, _, _ = scan_files(files, load_manifest(OUT_PLAYERS))
+    digest = hashlib.blake2b(json.dumps(sorted((k, v['hash']) for k, v in entries.items())).encode(), digest_size=16).hexdigest()
+    return match_ids, entries, digest
+
+
+# ---- stage bodies ----
+
+def run_lineups(tables, workers=0):
+    match_ids, _, _ = lineup_scan()
+    table, entries = match_players.starting_players_table(match_ids, OUT_PLAYERS, incremental=True, workers=workers or os.cpu_count() or 1)
+    pq.write_table(table, OUT_PLAYERS)
+    save_manifest(OUT_PLAYERS, entries)
+    return {'players': table.to_pandas()}
+
+
+def run_quick(tables, **params):
+    unique_players = match_players.unique_sb_players(tables['players'])
+    review, accepted, candidates = match_players.initial_mapping(unique_players, fifa_index(), **params)
+    # decisions from review_mapping.py win from the first stage on, so no pass re-promotes a
+    # rejected player and team context / the classifier see manually accepted teammates
+    review, accepted = keep_manual(review, accepted, manual())
+    return {'review': review, 'accepted': accepted, 'candidates': candidates}
+
+
+def apply_deltas(tables, review_delta, accepted_delta) -> dict:
+    return {
+        'review': upsert(tables['review'], review_delta, REVIEW_COLUMNS),
+        'accepted': upsert(tables['accepted'], accepted_delta, ACCEPTED_COLUMNS),
+    }
+
+
+def run_full_fuzzy(tables, **params):
+    review_delta, accepted_delta, candidates = match_players_fullfuzzy.full_pass(tables['review'], tables['candidates'], fifa_index(), **params)
+    return {**apply_deltas(tables, review_delta, accepted_delta), 'candidates': candidates}
+
+
+def run_position(tables, **params):
+    review_delta, accepted_delta = match_players_position_pass.promote_by_position(tables['review'], tables['players'], fifa_players(), **params)
+    print(f'Promoted {len(accepted_delta)} mappings (position-aware).')
+    return apply_deltas(tables, review_delta, accepted_delta)
+
+
+def run_country(tables, **params):
+    review_delta, accepted_delta = match_players_country_pass.promote_by_country(tables['review'], tables['candidates'], tables['players'], fifa_players(), **params)
+    print(f'Promoted {len(accepted_delta)} mappings (country-aware).')
+    return apply_deltas(tables, review_delta, accepted_delta)
+
+
+def run_team_context(tables, **params):
+    review_delta, accepted_delta = match_players_team_context.promote_by_context(tables['review'], tables['accepted'], tables['candidates'], tables['players'], match_dates(), snapshot_clubs(), **params)
+    print(f'Promoted {len(accepted_delta)} mappings (team context).')
+    return apply_deltas(tables, review_delta, accepted_delta)
+
+
+def run_classifier(tables, **params):
+    review_delta, accepted_delta = mapping_classifier.promote_by_classifier(tables['review'], tables['accepted'], tables['candidates'], tables['players'], match_dates(), fifa_players(), snapshot_clubs(), **params)
+    print(f'Promoted {len(accepted_delta)} mappings (classifier).')
+    return apply_deltas(tables, review_delta, accepted_delta)
+
+
+def run_coverage(tables, thresholds):
+    return {'coverage': simulate_threshold_coverage.simulate_coverage(tables['players'], tables['accepted'], tables['review'], thresholds)}
+
+
+def run_report(tables):
+    matches = pd.read_parquet(MATCHES_PARQ, columns=['match_id', 'competition_id', 'season_name'])
+    return {'report': coverage_report.coverage_report(tables['players'], matches, tables['accepted'])}
+
+
+def build_stages(with_classifier: bool = False, workers: int = 0) -> dict:
+    mp, ff = match_players, match_players_fullfuzzy
+    pos, ctry, ctx = match_players_position_pass, match_players_country_pass, match_players_team_context
+    stages = [
+        # the worker count does not change the result, so it is not a keyed parameter
+        Stage('lineups', partial(run_lineups, workers=workers), sources=lambda: {'lineups': lineup_scan()[2]}, module=mp),
+        Stage('quick', run_quick, ['lineups'], {'auto_accept': mp.AUTO_ACCEPT, 'quick_accept': mp.QUICK_ACCEPT, 'quick_review': mp.QUICK_REVIEW, 'max_candidates': mp.QUICK_MAX_CANDIDATES}, quick_sources, mp),
+        Stage('full_fuzzy', run_full_fuzzy, ['quick'], {'auto_accept': ff.AUTO_ACCEPT_SCORE, 'review_low': ff.REVIEW_LOW, 'max_candidates': ff.MAX_TOTAL_CANDIDATES}, fifa_sources, ff),
+        Stage('position', run_position, ['full_fuzzy'], {'min_score': pos.MIN_SCORE, 'unk_min_score': pos.UNK_MIN_SCORE}, fifa_sources, pos),
+        Stage('country', run_country, ['position'], {'min_score': ctry.MIN_SCORE, 'margin': ctry.MARGIN}, fifa_sources, ctry),
+        Stage('team_context', run_team_context, ['country'], {'min_score': ctx.MIN_SCORE, 'min_consistency': ctx.MIN_CONSISTENCY, 'context_bonus': ctx.CONTEXT_BONUS, 'margin': ctx.MARGIN}, dated_sources, ctx),
+    ]
+    last = 'team_context'
+    if with_classifier:
+        stages.append(Stage('classifier', run_classifier, [last], {'precision': mapping_classifier.PRECISION_TARGET}, dated_sources, mapping_classifier))
+        last = 'classifier'
+    stages.append(Stage('coverage', run_coverage, [last], {'thresholds': simulate_threshold_coverage.THRESHOLDS}, module=simulate_threshold_coverage))
+    stages.append(Stage('report', run_report, ['coverage'], sources=lambda: {'matches': fifa_name_index.source_signature(MATCHES_PARQ)}, module=coverage_report))
+    return {s.name: s for s in stages}
+
+
+# ---- runner ----
+
+def code_hash(stage: Stage) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    for obj in (stage.module, *SHARED_MODULES, sys.modules[__name__]):
+        if obj is not None:
+            h.update(Path(inspect.getsourcefile(obj)).read_bytes())
+    return h.hexdigest()
+
+
+def stage_keys(stages: dict) -> dict:
+    """Content-addressed key of every stage, in dependency order."""
+    keys = {}
+    for name, stage in stages.items():
+        desc = {
+            'stage': name,
+            'params': stage.params,
+            'deps': [keys[d] for d in stage.deps],
+            'sources': stage.sources() if stage.sources else None,
+            'code': code_hash(stage),
+        }
+        keys[name] = hashlib.blake2b(json.dumps(desc, sort_keys=True, default=str).encode(), digest_size=16).hexdigest()
+    return keys
+
+
+def cache_path(name: str, key: str) -> Path:
+    return CACHE_DIR / name / key
+
+
+def load_outputs(path: Path) -> dict:
+    meta = json.loads((path / 'stage.json').read_text(encoding='utf-8'))
+    return {t: pd.read_parquet(path / f'{t}.parquet') for t in meta['tables']}
+
+
+def save_outputs(path: Path, outputs: dict, meta: dict):
+    tmp = path.with_name(path.name + '.tmp')
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    for t, df in outputs.items():
+        df.to_parquet(tmp / f'{t}.parquet', index=False)
+    (tmp / 'stage.json').write_text(json.dumps({**meta, 'tables': sorted(outputs)}, indent=2, default=str), encoding='utf-8')
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp, path)
+    runs = sorted((p for p in path.parent.iterdir() if p.is_dir() and not p.name.endswith('.tmp')), key=lambda p: p.stat().st_mtime, reverse=True)
+    for old in runs[KEEP_RUNS:]:
+        shutil.rmtree(old, ignore_errors=True)
+
+
+class Runner:
+    """Resolve stage tables on demand: cached stages are loaded, stale ones re-run."""
+
+    def __init__(self, stages: dict, keys: dict, force=()):
+        self.stages = stages
+        self.keys = keys
+        self.force = set(force)
+        self.own = {}  # stage -> tables it produced (or loaded)
+        self.ran = []
+
+    def forced(self, name: str) -> bool:
+        return name in self.force or any(self.forced(d) for d in self.stages[name].deps)
+
+    def outputs(self, name: str) -> dict:
+        if name not in self.own:
+            path = cache_path(name, self.keys[name])
+            if (path / 'stage.json').exists() and not self.forced(name):
+                print(f'[{name}] cached ({self.keys[name][:12]})')
+                self.own[name] = load_outputs(path)
+            else:
+                stage = self.stages[name]
+                print(f'[{name}] running ({self.keys[name][:12]})')
+                self.own[name] = stage.run(self.tables_for(stage), **stage.params)
+                save_outputs(path, self.own[name], {'stage': name, 'key': self.keys[name], 'params': stage.params, 'deps': {d: self.keys[d] for d in stage.deps}})
+                self.ran.append(name)
+        return self.own[name]
+
+    def tables(self, name: str) -> dict:
+        """All tables visible after `name`: its dependencies' tables overlaid with its own."""
+        return {**self.tables_for(self.stages[name]), **self.outputs(name)}
+
+    def tables_for(self, stage: Stage) -> dict:
+        tables = {}
+        for d in stage.deps:
+            tables.update(self.tables(d))
+        # every stage after lineups sees the starting players table
+        if stage.name != 'lineups':
+            tables.setdefault('players', self.tables('lineups')['players'])
+        return tables
+
+
+def parse_value(raw: str):
+    try:
+        return json.loads(raw)
+    except json.JSONDecodeError:
+        return raw
+
+
+def parse_args():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('--set', action='append', default=[], metavar='STAGE.PARAM=VALUE', help='override a stage parameter (repeatable)')
+    ap.add_argument('--force', action='append', default=[], metavar='STAGE', help='re-run STAGE and everything downstream')
+    ap.add_argument('--classifier', action='store_true', help='run the learned mapping classifier after team_context')
+    ap.add_argument('--workers', type=int, default=0, help='lineup decoder processes (0 = all cores)')
+    ap.add_argument('--no-export', action='store_true', help='do not write player_map*.parquet / candidates.parquet / the coverage report')
+    return ap.parse_args()
+
+
+def main():
+    args = parse_args()
+    stages = build_stages(args.classifier, args.workers)
+    for item in args.set:
+        target, _, raw = item.partition('=')
+        name, _, param = target.partition('.')
+        if name not in stages or param not in stages[name].params:
+            raise SystemExit(f'unknown parameter {target!r}; known: ' + ', '.join(f'{n}.{p}' for n, s in stages.items() for p in s.params))
+        stages[name].params[param] = parse_value(raw)
+    for name in args.force:
+        if name not in stages:
+            raise SystemExit(f'unknown stage {name!r}; known: ' + ', '.join(stages))
+    keys = stage_keys(stages)
+
+    runner = Runner(stages, keys, args.force)
+    final = runner.tables('report')
+    print('Stages run:', ', '.join(runner.ran) or 'none (all cached)')
+
+    if not args.no_export:
+        # the manual decisions are already part of the tables (quick stage)
+        review, accepted = final['review'], final['accepted']
+        save_review(review)
+        save_accepted(accepted)
+        write_candidates(final['candidates'], [], replace=True)
+        coverage_report.write_report(final['report'])
+        print(f"Exported {len(accepted)} accepted mappings and {len(review)} review rows")
+    simulate_threshold_coverage.print_coverage(final['coverage'])
+    coverage_report.print_report(final['report'])
+
+
+if __name__ == '__main__':
+    main()
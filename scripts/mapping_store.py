@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+# /// script
+# requires-python = ">=3.12"
+# dependencies = ["pandas", "pyarrow", "numpy"]
+# ///
+"""Typed Parquet store for the player mapping tables shared by the mapping passes.
+
+- review    data/mappings/player_map_review.parquet: one row per StatsBomb player
+            with its current candidate, score, method and status
+- accepted  data/mappings/player_map.parquet: accepted player_id_sb -> fifa_id mappings
+
+Both tables have a fixed Arrow schema and primary key `player_id_sb`. Passes
+read only the columns they need (`load_review(columns=...)`) and hand back
+deltas, which are upserted: a delta row updates the columns it carries on the
+stored row with the same player_id_sb (or is inserted), so re-running a pass
+never duplicates accepted rows.
+
+Passes hand over deltas, but the store applies each one as a full atomic
+rewrite: the table is read, merged and written to a temp file that is renamed
+into place. Both tables hold one row per StatsBomb player (tens of thousands
+of rows), so a rewrite costs milliseconds. In exchange every reader sees one
+self-contained file: no delta files to merge on read or to compact, and no
+half-applied state after a crash.
+
+The old CSV artifacts (player_map.csv, player_map_review.csv) are migrated
+automatically the first time a table is loaded and no Parquet file exists
+yet. CSV copies for reading by hand can still be exported:
+
+Usage: uv run scripts/mapping_store.py [--export-csv]
+"""
+from pathlib import Path
+import argparse
+import os
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+MAPDIR = Path('data') / 'mappings'
+REVIEW_P = MAPDIR / 'player_map_review.parquet'
+ACCEPT_P = MAPDIR / 'player_map.parquet'
+REVIEW_CSV = MAPDIR / 'player_map_review.csv'
+ACCEPT_CSV = MAPDIR / 'player_map.csv'
+
+KEY = 'player_id_sb'
+REVIEW_SCHEMA = pa.schema([
+    ('player_id_sb', pa.int64()),
+    ('player_name_sb', pa.string()),
+    ('candidate_fifa_id', pa.int64()),
+    ('candidate_name', pa.string()),
+    ('score', pa.int16()),
+    ('method', pa.string()),
+    ('status', pa.string()),
+])
+ACCEPTED_SCHEMA = pa.schema([
+    ('player_id_sb', pa.int64()),
+    ('player_name_sb', pa.string()),
+    ('fifa_id', pa.int64()),
+    ('score', pa.int16()),
+    ('method', pa.string()),
+])
+OPEN_STATUSES = ['review', 'unmatched']
+# decisions made in review_mapping.py; they survive full rewrites of the tables
+ACCEPTED_MANUAL, REJECTED = 'accepted_manual', 'rejected'
+MANUAL_STATUSES = [ACCEPTED_MANUAL, REJECTED]
+
+
+def _dtypes(schema: pa.Schema, columns=None) -> dict:
+    names = columns or schema.names
+    return {n: 'object' if pa.types.is_string(schema.field(n).type) else ('int64' if n == KEY else 'Int64') for n in names}
+
+
+def subset(columns: dict, names) -> dict:
+    """The entries of `columns` named in `names`, in table order."""
+    return {n: t for n, t in columns.items() if n in set(names)}
+
+
+REVIEW_COLUMNS = _dtypes(REVIEW_SCHEMA)
+ACCEPTED_COLUMNS = _dtypes(ACCEPTED_SCHEMA)
+
+
+def typed(df: pd.DataFrame, columns: dict) -> pd.DataFrame:
+    """Return `df` restricted to `columns` with their dtypes (missing columns are null)."""
+    out = pd.DataFrame(index=df.index)
+    for name, dtype in columns.items():
+        col = df[name] if name in df.columns else pd.Series(pd.NA, index=df.index, dtype=object)
+        if dtype == 'Int64':
+            col = pd.Series(np.floor(pd.to_numeric(col, errors='coerce')), index=df.index).astype('Int64')
+        elif dtype == 'object':
+            col = col.astype(object).where(col.notna(), None)
+        else:
+            col = col.astype(dtype)
+        out[name] = col
+    return out.reset_index(drop=True)
+
+
+def empty(columns: dict) -> pd.DataFrame:
+    return typed(pd.DataFrame(), columns)
+
+
+def upsert(table: pd.DataFrame, delta: pd.DataFrame, columns: dict) -> pd.DataFrame:
+    """Return `table` with `delta` merged in on player_id_sb.
+
+    Rows whose key already exists get the columns present in `delta`
+    overwritten; the other columns keep their stored values. New keys are
+    appended (columns missing from `delta` are null).
+    """
+    delta = typed(delta, subset(columns, delta.columns)).drop_duplicates(KEY, keep='last').set_index(KEY)
+    table = empty(columns) if table is None else typed(table, columns)
+    if delta.empty:
+        return table
+    table = table.drop_duplicates(KEY, keep='last').set_index(KEY)
+    known = delta.index.isin(table.index)
+    table.loc[delta.index[known], delta.columns] = delta[known]
+    merged = pd.concat([table, delta[~known]]) if (~known).any() else table
+    return typed(merged.reset_index(), columns)
+
+
+# ---- files ----
+
+def _write(df: pd.DataFrame, path: Path, schema: pa.Schema):
+    table = pa.Table.from_pandas(typed(df, _dtypes(schema)), schema=schema, preserve_index=False)
+    tmp = path.with_suffix(path.suffix + '.tmp')
+    pq.write_table(table, tmp)
+    os.replace(tmp, path)
+
+
+def _read(path: Path, schema: pa.Schema, columns=None) -> pd.DataFrame:
+    cols = list(columns) if columns else schema.names
+    if not path.exists():
+        return empty(_dtypes(schema, cols))
+    return typed(pq.read_table(path, columns=cols).to_pandas(), _dtypes(schema, cols))
+
+
+def _read_csv(path: Path, schema: pa.Schema) -> pd.DataFrame:
+    df = pd.read_csv(path, dtype=str, keep_default_na=False, na_values=[''])
+    return typed(df, _dtypes(schema)).drop_duplicates(KEY, keep='last')
+
+
+def migrate_csv():
+    """Create the Parquet tables from the legacy CSVs where only the CSV exists."""
+    for csv_p, path, schema in ((REVIEW_CSV, REVIEW_P, REVIEW_SCHEMA), (ACCEPT_CSV, ACCEPT_P, ACCEPTED_SCHEMA)):
+        if csv_p.exists() and not path.exists():
+            try:
+                df = _read_csv(csv_p, schema)
+            except pd.errors.EmptyDataError:
+                df = empty(_dtypes(schema))
+            _write(df, path, schema)
+            print(f'Migrated {csv_p} -> {path} ({len(df)} rows)')
+
+
+def load_review(columns=None, path: Path = REVIEW_P) -> pd.DataFrame:
+    migrate_csv()
+    return _read(path, REVIEW_SCHEMA, columns)
+
+
+def load_accepted(columns=None, path: Path = ACCEPT_P) -> pd.DataFrame:
+    migrate_csv()
+    return _read(path, ACCEPTED_SCHEMA, columns)
+
+
+def save_review(review: pd.DataFrame, path: Path = REVIEW_P):
+    """Replace the whole review table."""
+    _write(upsert(None, review, REVIEW_COLUMNS), path, REVIEW_SCHEMA)
+
+
+def save_accepted(accepted: pd.DataFrame, path: Path = ACCEPT_P):
+    """Replace the whole accepted table."""
+    _write(upsert(None, accepted, ACCEPTED_COLUMNS), path, ACCEPTED_SCHEMA)
+
+
+def upsert_review(delta: pd.DataFrame, path: Path = REVIEW_P):
+    """Merge `delta` into the stored review table (an atomic rewrite of the file)."""
+    if len(delta):
+        _write(upsert(load_review(path=path), delta, REVIEW_COLUMNS), path, REVIEW_SCHEMA)
+
+
+def upsert_accepted(delta: pd.DataFrame, path: Path = ACCEPT_P):
+    """Merge `delta` into the stored accepted table (an atomic rewrite of the file)."""
+    if len(delta):
+        _write(upsert(load_accepted(path=path), delta, ACCEPTED_COLUMNS), path, ACCEPTED_SCHEMA)
+
+
+def manual_decisions():
+    """(review rows, accepted rows) of the stored manual decisions from review_mapping.py."""
+    stored = load_review()
+    manual = stored[stored['status'].isin(MANUAL_STATUSES)].reset_index(drop=True)
+    manual_accepted = load_accepted() if len(manual) else empty(ACCEPTED_COLUMNS)
+    manual_accepted = manual_accepted[manual_accepted[KEY].isin(manual.loc[manual['status'] != REJECTED, KEY])].reset_index(drop=True)
+    return manual, manual_accepted
+
+
+def keep_manual(review: pd.DataFrame, accepted: pd.DataFrame, decisions=None):
+    """Overlay the manual decisions (default: the stored ones) on freshly rebuilt (review, accepted) tables."""
+    manual, manual_accepted = decisions if decisions is not None else manual_decisions()
+    if manual.empty:
+        return review, accepted
+    accepted = upsert(accepted, manual_accepted, ACCEPTED_COLUMNS)
+    accepted = accepted[~accepted[KEY].isin(manual.loc[manual['status'] == REJECTED, KEY])].reset_index(drop=True)
+    return upsert(review, manual, REVIEW_COLUMNS), accepted
+
+
+def export_csv():
+    for df, path in ((load_review(), REVIEW_CSV), (load_accepted(), ACCEPT_CSV)):
+        tmp = path.with_suffix(path.suffix + '.tmp')
+        df.to_csv(tmp, index=False)
+        os.replace(tmp, path)
+        print(f'Exported {len(df)} rows to {path}')
+
+
+# ---- promotion deltas ----
+
+def promote(review: pd.DataFrame, winners: pd.DataFrame, status: str, method: str):
+    """Accept `winners` for open review rows; return (review_delta, accepted_delta).
+
+    `review` needs player_id_sb, player_name_sb and status; `winners` is
+    indexed by player_id_sb with fifa_id, candidate_name and score. The review
+    delta sets the candidate, score and `status`; the accepted delta holds
+    full rows with `method`.
+    """
+    mask = (review['status'].isin(OPEN_STATUSES) & review[KEY].isin(winners.index)).to_numpy()
+    rows = review.loc[mask, [KEY, 'player_name_sb']].drop_duplicates(KEY).reset_index(drop=True)
+    hit = winners[~winners.index.duplicated()].reindex(rows[KEY].to_numpy())
+    score = np.floor(hit['score'].to_numpy(dtype=float))
+    review_delta = rows[[KEY]].assign(candidate_fifa_id=hit['fifa_id'].to_numpy(), candidate_name=hit['candidate_name'].to_numpy(), score=score, status=status)
+    accepted_delta = rows.assign(fifa_id=hit['fifa_id'].to_numpy(), score=score, method=method)
+    return typed(review_delta, subset(REVIEW_COLUMNS, review_delta.columns)), typed(accepted_delta, ACCEPTED_COLUMNS)
+
+
+def parse_args():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('--export-csv', action='store_true', help='also write player_map.csv / player_map_review.csv')
+    return ap.parse_args()
+
+
+def main():
+    args = parse_args()
+    review = load_review(columns=['status'])
+    accepted = load_accepted(columns=['method'])
+    print(f'{REVIEW_P}: {len(review)} rows')
+    print(review['status'].value_counts().to_string())
+    print(f'{ACCEPT_P}: {len(accepted)} rows')
+    print(accepted['method'].value_counts().to_string())
+    if args.export_csv:
+        export_csv()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,20 +1,38 @@
 #!/usr/bin/env python3
 # /// script
 # requires-python = ">=3.12"
-# dependencies = ["pandas", "rapidfuzz", "pyarrow"]
+# dependencies = ["pandas", "rapidfuzz", "pyarrow", "numpy", "orjson"]
 # ///
 """Extract starting XIs from StatsBomb and produce mapping candidates to FIFA players.
 
+Lineup files are decoded in a process pool (`--workers`, default all cores);
+each worker returns a columnar Arrow batch for a chunk of match ids.
+With `--incremental` only lineup files that are new or changed since the last
+run (tracked in `matches_starting_players.manifest.json`) are re-parsed and
+merged into the existing starting-players table.
+
 Outputs:
 - data/cache/matches_starting_players.parquet (long format)
-- data/mappings/player_map_review.csv
-- data/mappings/player_map.csv (auto-accepted mappings)
+- data/mappings/player_map_review.parquet (mapping_store.py)
+- data/mappings/player_map.parquet (auto-accepted mappings)
+- data/mappings/candidates.parquet (top-k fuzzy candidates per unmatched player)
 """
 from pathlib import Path
-import json
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import os
 import pandas as pd
-from rapidfuzz import process, fuzz
-import unicodedata
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from candidates_store import write_candidates
+from fast_json import load_json
+from fifa_name_index import load_index
+from file_manifest import load_manifest, save_manifest, scan_files
+from fuzzy_batch import block_candidates, candidates_frame, score_topk
+from mapping_store import ACCEPT_P, ACCEPTED_COLUMNS, REVIEW_COLUMNS, REVIEW_P, keep_manual, save_accepted, save_review, typed
+from name_normalize import normalize_name, normalize_names
 
 ROOT = Path("data") / "statsbom-opendata" / "data"
 OUT = Path("data") / "cache"
@@ -30,88 +48,106 @@ MATCHES_PARQ = Path("data") / "cache" / "matches.parquet"
 # thresholds
 AUTO_ACCEPT = 90
 REVIEW_LOW = 70
+# quick fuzzy: token_sort_ratio of the best candidate
+QUICK_ACCEPT = 85
+QUICK_REVIEW = 75
+# quick fuzzy trigram block size per name
+QUICK_MAX_CANDIDATES = 2000
 
 
-def normalize_name(s: str) -> str:
-    if not isinstance(s, str):
-        return ""
-    s = s.lower()
-    s = unicodedata.normalize('NFKD', s)
-    s = ''.join([c for c in s if not unicodedata.combining(c)])
-    s = s.replace("'", "").replace("\"", "").replace('.', '')
-    s = ' '.join(s.split())
-    return s
+LINEUP_SCHEMA = pa.schema([
+    ('match_id', pa.int64()),
+    ('team_id', pa.int64()),
+    ('team_name', pa.string()),
+    ('player_id_sb', pa.int64()),
+    ('player_name_sb', pa.string()),
+    ('jersey', pa.int64()),
+    ('position', pa.string()),
+    ('position_id', pa.int64()),
+    ('player_country', pa.string()),
+])
+LINEUP_CHUNK = 64  # match ids per worker task
 
 
-def extract_starting_players(match_id: int):
-    p = LINEUPS / f"{match_id}.json"
-    if not p.exists():
-        return []
-    with p.open('r', encoding='utf-8') as f:
-        data = json.load(f)
-    out = []
-    # data is a list of team objects
-    for team in data:
-        team_id = team.get('team_id')
-        team_name = team.get('team_name')
-        for pl in team.get('lineup', []):
-            player_id = pl.get('player_id')
-            player_name = pl.get('player_name')
-            jersey = pl.get('jersey_number')
-            # player country if available
-            country_name = None
-            if pl.get('country') and isinstance(pl.get('country'), dict):
-                country_name = pl.get('country').get('name')
-            # find position entry with start_reason containing 'Starting'
-            positions = pl.get('positions', [])
-            start_positions = [pos for pos in positions if pos.get('start_reason') and 'Starting' in pos.get('start_reason')]
-            if start_positions:
+def extract_lineup_batch(match_ids) -> pa.RecordBatch:
+    """Extract the starting players of `match_ids` as one columnar record batch.
+
+    Runs inside the worker processes: each lineup file is decoded and its
+    starters are appended straight into per-column lists.
+    """
+    cols = {name: [] for name in LINEUP_SCHEMA.names}
+    for match_id in match_ids:
+        p = LINEUPS / f"{match_id}.json"
+        if not p.exists():
+            continue
+        data = load_json(p)
+        # data is a list of team objects
+        for team in data:
+            team_id = team.get('team_id')
+            team_name = team.get('team_name')
+            for pl in team.get('lineup', []):
+                # find position entry with start_reason containing 'Starting'
+                positions = pl.get('positions', [])
+                start_positions = [pos for pos in positions if pos.get('start_reason') and 'Starting' in pos.get('start_reason')]
+                if not start_positions:
+                    # skip non-starting players
+                    continue
                 pos = start_positions[0]
-                position = pos.get('position')
-                position_id = pos.get('position_id')
-                is_start = True
-            else:
-                # skip non-starting players
-                continue
-            out.append({
-                'match_id': match_id,
-                'team_id': team_id,
-                'team_name': team_name,
-                'player_id_sb': player_id,
-                'player_name_sb': player_name,
-                'jersey': jersey,
-                'position': position,
-                'position_id': position_id,
-                'player_country': country_name,
-            })
-    return out
-
-
-def build_fifa_lookup():
-    # Support both parquet and csv fallback
-    if FIFA_PARQ.exists():
-        df = pd.read_parquet(FIFA_PARQ)
+                # player country if available
+                country = pl.get('country')
+                cols['match_id'].append(match_id)
+                cols['team_id'].append(team_id)
+                cols['team_name'].append(team_name)
+                cols['player_id_sb'].append(pl.get('player_id'))
+                cols['player_name_sb'].append(pl.get('player_name'))
+                cols['jersey'].append(pl.get('jersey_number'))
+                cols['position'].append(pos.get('position'))
+                cols['position_id'].append(pos.get('position_id'))
+                cols['player_country'].append(country.get('name') if isinstance(country, dict) else None)
+    arrays = [pa.array(cols[f.name], type=f.type) for f in LINEUP_SCHEMA]
+    return pa.RecordBatch.from_arrays(arrays, schema=LINEUP_SCHEMA)
+
+
+def extract_starting_players(match_id: int):
+    return extract_lineup_batch([match_id]).to_pylist()
+
+
+def extract_lineups(match_ids, workers: int = 1) -> pa.Table:
+    """Fan `match_ids` out over a process pool; batches are assembled without copying."""
+    chunks = [match_ids[i:i + LINEUP_CHUNK] for i in range(0, len(match_ids), LINEUP_CHUNK)]
+    if workers == 1 or len(chunks) <= 1:
+        batches = [extract_lineup_batch(c) for c in chunks]
     else:
-        csvp = FIFA_PARQ.with_suffix('.csv')
-        if csvp.exists():
-            df = pd.read_csv(csvp)
-        else:
-            raise FileNotFoundError("FIFA players cache not found. Run scripts/ingest_fifa.py first.")
-    # create a combined name field
-    df['name_candidates'] = df.get('short_name', '').fillna('') + ' || ' + df.get('long_name', '').fillna('')
-    # use list comprehension for faster normalized mapping
-    df['normalized'] = [normalize_name(x) for x in df['name_candidates'].fillna('')]
-    # We'll store mapping of normalized name -> fifa_id and original name
-    if 'sofifa_id' in df.columns:
-        lookup = df[['sofifa_id','short_name','long_name']].copy()
-        lookup = lookup.rename(columns={'sofifa_id': 'fifa_id'})
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            batches = list(pool.map(extract_lineup_batch, chunks))
+    return pa.Table.from_batches(batches, schema=LINEUP_SCHEMA)
+
+
+def starting_players_table(match_ids, out_players: Path, incremental: bool = False, workers: int = 1):
+    """Return (players_table, manifest_entries) for `match_ids`.
+
+    In incremental mode rows of unchanged lineup files are reused from
+    `out_players` and only new/changed lineups are extracted.
+    """
+    files = [p for p in (LINEUPS / f"{mid}.json" for mid in match_ids) if p.exists()]
+    previous = load_manifest(out_players) if incremental else {}
+    entries, changed, removed = scan_files(files, previous)
+    if previous:
+        existing = pq.read_table(out_players, columns=LINEUP_SCHEMA.names).cast(LINEUP_SCHEMA)
+        changed_ids = [int(p.stem) for p in changed]
+        current_ids = [int(p.stem) for p in files]
+        mask = pc.and_(pc.is_in(existing['match_id'], value_set=pa.array(current_ids, pa.int64())),
+                       pc.invert(pc.is_in(existing['match_id'], value_set=pa.array(changed_ids, pa.int64()))))
+        keep = existing.filter(mask).replace_schema_metadata(None)
+        print(f'Incremental run: {len(changed)} new/changed of {len(files)} lineup files ({len(removed)} removed)')
+        to_extract = sorted(changed_ids)
     else:
-        lookup = df[['short_name','long_name']].copy()
-        lookup['fifa_id'] = lookup.index.astype(str)
-    lookup['normalized'] = df['normalized']
-    # build normalized -> row mapping for fast exact lookup
-    norm_map = {row['normalized']: (row.get('fifa_id'), row.get('short_name')) for _, row in lookup.iterrows()}
-    return df, lookup, norm_map
+        keep = None
+        to_extract = [int(p.stem) for p in files]
+    table = extract_lineups(to_extract, workers)
+    if keep is not None:
+        table = pa.concat_tables([keep, table])
+    return table, entries
 
 
 def match_player_name(name: str, fifa_df, fifa_lookup, fifa_norm_map):
@@ -125,197 +161,68 @@ def match_player_name(name: str, fifa_df, fifa_lookup, fifa_norm_map):
     return None, None, 0, 'no-fuzzy'
 
 
-def main():
-    # load matches
-    # load matches (parquet or csv fallback)
-    if MATCHES_PARQ.exists():
-        matches = pd.read_parquet(MATCHES_PARQ)
-    else:
-        csvp = MATCHES_PARQ.with_suffix('.csv')
-        if csvp.exists():
-            matches = pd.read_csv(csvp)
-        else:
-            raise FileNotFoundError('matches cache not found. Run scripts/ingest_statsbomb.py first')
-    print(f"Loaded {len(matches)} matches")
-    rows = []
-    match_ids = matches['match_id'].dropna().astype(int).unique().tolist()
-    for mid in match_ids:
-        players = extract_starting_players(int(mid))
-        for p in players:
-            rows.append(p)
-    players_df = pd.DataFrame(rows)
-    out_players = OUT / 'matches_starting_players.parquet'
-    try:
-        players_df.to_parquet(out_players, index=False)
-        print('Wrote starting players:', out_players)
-    except Exception as e:
-        out_csv = OUT / 'matches_starting_players.csv'
-        players_df.to_csv(out_csv, index=False)
-        print('Parquet write failed (fallback to CSV). Wrote starting players to', out_csv)
-        print('Error was:', e)
+def print_diagnostics(unique_players: pd.DataFrame, fifa_index):
+    # tokens present in SB names
+    sb_norms = set(normalize_names(unique_players['player_name_sb']).to_pylist())
+    sb_tokens = {t for n in sb_norms for t in n.split() if len(t) > 1}
+    token_counts = {t: fifa_index.token_count(t) for t in sb_tokens if t in fifa_index.token_ids}
+    print('--- Mapping diagnostics ---')
+    print(f'Unique SB players: {len(unique_players)}')
+    print(f'FIFA names in index: {fifa_index.n_rows}')
+    print(f'Token index size: {len(token_counts)}')
+    if len(token_counts) > 0:
+        sample = list(token_counts.items())[:10]
+        print('Sample token index entries (token -> #candidates):', sample)
 
-    # build unique sb players
-    if players_df.empty:
-        print('No starting players found, exiting')
-        return
-    unique_players = players_df[['player_id_sb','player_name_sb']].drop_duplicates().reset_index(drop=True)
 
+def initial_mapping(unique_players: pd.DataFrame, fifa_index, auto_accept: float = AUTO_ACCEPT, quick_accept: float = QUICK_ACCEPT, quick_review: float = QUICK_REVIEW, max_candidates: int = QUICK_MAX_CANDIDATES):
+    """Exact + quick fuzzy pass over `unique_players` (player_id_sb, player_name_sb).
+
+    Returns (review, accepted, candidates): the typed review and accepted
+    tables and the top-k fuzzy candidates of every exact miss.
+    """
     # Build a fast normalized map only for StatsBomb player names (avoid scanning full FIFA unnecessarily)
-    sb_norms = set(unique_players['player_name_sb'].apply(normalize_name).tolist())
+    norms = normalize_names(unique_players['player_name_sb']).to_pylist()
+    # exact lookups come from the prebuilt, memory-mapped FIFA name index
     fifa_norm_map = {}
-    # debug: confirm fifa parquet existence
-    print('Checking FIFA_PARQ:', FIFA_PARQ, 'exists=', FIFA_PARQ.exists())
-    # try to load fifa CSV (fallback if parquet not available); use chunked read to avoid heavy memory/CPU
-    if FIFA_PARQ.exists():
-        fifa_df_full = pd.read_parquet(FIFA_PARQ)
-        name_candidates = (fifa_df_full.get('short_name', '').fillna('') + ' || ' + fifa_df_full.get('long_name', '').fillna('')).astype(str).tolist()
-        norms = [normalize_name(x) for x in name_candidates]
-        # build a lookup aligned with norms for later fuzzy selection
-        fifa_norms = norms
-        # build lookup with a stable 'fifa_id' column (use sofifa_id if present, else row index)
-        if 'sofifa_id' in fifa_df_full.columns:
-            fifa_lookup = fifa_df_full[['sofifa_id', 'short_name']].copy().rename(columns={'sofifa_id': 'fifa_id'})
-        else:
-            fifa_lookup = fifa_df_full[['short_name']].copy()
-            fifa_lookup['fifa_id'] = fifa_lookup.index.astype(str)
-        for i, norm in enumerate(norms):
-            if norm in sb_norms and norm not in fifa_norm_map:
-                row = fifa_df_full.iloc[i]
-                fid = row.get('sofifa_id') if 'sofifa_id' in row.index else str(i)
-                fifa_norm_map[norm] = (fid, row.get('short_name'))
-    else:
-        csvp = FIFA_PARQ.with_suffix('.csv')
-        if not csvp.exists():
-            raise FileNotFoundError('FIFA CSV not found. Run scripts/ingest_fifa.py first')
-        # read first chunk only as a fast initial pass (you can re-run later for full coverage)
-        reader = pd.read_csv(csvp, chunksize=2000)
-        try:
-            chunk = next(reader)
-        except StopIteration:
-            chunk = None
-        if chunk is not None:
-            name_candidates = (chunk.get('short_name', '').fillna('') + ' || ' + chunk.get('long_name', '').fillna('')).astype(str).tolist()
-            norms = [normalize_name(x) for x in name_candidates]
-            # build local fifa arrays for fuzzy scanning
-            fifa_norms = norms
-            # build local lookup for chunk with stable 'fifa_id'
-            if 'sofifa_id' in chunk.columns:
-                fifa_lookup = chunk[['sofifa_id', 'short_name']].copy().rename(columns={'sofifa_id': 'fifa_id'})
-            else:
-                fifa_lookup = chunk[['short_name']].copy()
-                fifa_lookup['fifa_id'] = fifa_lookup.index.astype(str)
-            for i, norm in enumerate(norms):
-                if norm in sb_norms and norm not in fifa_norm_map:
-                    row = chunk.iloc[i]
-                    fid = row.get('sofifa_id') if 'sofifa_id' in row.index else None
-                    fifa_norm_map[norm] = (fid, row.get('short_name'))
-        else:
-            fifa_norms = []
-            fifa_lookup = None
-        # Note: This is an initial pass for speed. Run a full pass later if you want higher coverage.
+    for norm in set(norms):
+        row = fifa_index.exact(norm)
+        if row >= 0:
+            fifa_norm_map[norm] = (fifa_index.fifa_id(row), fifa_index.short_name(row))
 
-    # Build token index for the subset of FIFA names relevant to SB names (quick fuzzy)
-    # Ensure we have fifa_norms and a fifa_lookup available from the previous load (parquet or chunk)
-    fifa_norms = locals().get('fifa_norms', [])
-    fifa_lookup = locals().get('fifa_lookup', None)
-
-    # tokens present in SB names
-    sb_tokens = set()
-    for name in unique_players['player_name_sb'].astype(str):
-        for t in normalize_name(name).split():
-            if len(t) > 1:
-                sb_tokens.add(t)
-    token_index = {}
-    for idx, val in enumerate(fifa_norms):
-        toks = [t for t in val.split() if len(t) > 1]
-        for t in toks:
-            if t in sb_tokens:
-                token_index.setdefault(t, []).append(idx)
-
-    # Diagnostics
-    print('--- Mapping diagnostics ---')
-    print(f'Unique SB players: {len(unique_players)}')
-    print(f'FIFA norms loaded: {len(fifa_norms)}')
-    if fifa_lookup is not None:
-        try:
-            print(f'FIFA lookup rows: {len(fifa_lookup)}')
-        except Exception:
-            pass
-    print(f'Token index size: {len(token_index)}')
-    if len(token_index) > 0:
-        sample = list(token_index.items())[:10]
-        print('Sample token index entries (token -> #candidates):', [(t, len(idxs)) for t, idxs in sample])
+    # quick fuzzy: only for exact misses, all scored in one batched top-k call
+    misses = [i for i, n in enumerate(norms) if n not in fifa_norm_map]
+    keys, blocks = [], []
+    for i in misses:
+        key, rows = block_candidates(norms[i], fifa_index, max_candidates)
+        keys.append(key)
+        blocks.append(rows)
+    topk = score_topk([norms[i] for i in misses], keys, blocks, fifa_index)
+    miss_ids = unique_players['player_id_sb'].to_numpy()[misses]
+    candidates = candidates_frame(topk, miss_ids, 'fuzzy')
+    best = {misses[q]: r for q, r in zip(topk['query'], topk.itertuples()) if r.rank == 1}
 
     review_rows = []
     accepted = []
-    for _, r in unique_players.iterrows():
+    for i, r in unique_players.iterrows():
         sbid = r['player_id_sb']
         sbname = r['player_name_sb']
-        sbcountry = r.get('player_country') if 'player_country' in r.index else None
         sofifa, cand_name, score, method = match_player_name(sbname, None, None, fifa_norm_map)
         status = 'unmatched'
-        if score >= AUTO_ACCEPT:
+        if score >= auto_accept:
             status = 'accepted'
             accepted.append({'player_id_sb': sbid, 'player_name_sb': sbname, 'fifa_id': sofifa, 'score': score, 'method': method})
-        else:
-            # quick fuzzy: only when exact miss
-            n = normalize_name(sbname)
-            tokens = [t for t in n.split() if len(t) > 1]
-            # Narrow candidates by token intersection when possible, otherwise union with caps
-            token_sets = []
-            for t in tokens:
-                idxs = token_index.get(t, [])
-                # skip tokens that are too common (e.g., 'de', 'da')
-                if len(idxs) > 5000:
-                    continue
-                token_sets.append(set(idxs))
-
-            candidate_idxs = set()
-            if token_sets:
-                if len(token_sets) > 1:
-                    candidate_idxs = set.intersection(*token_sets)
-                else:
-                    candidate_idxs = token_sets[0]
-            else:
-                # fallback: union tokens but accumulate from least-common tokens to cap size
-                sorted_tokens = sorted(tokens, key=lambda x: len(token_index.get(x, [])))
-                for t in sorted_tokens:
-                    candidate_idxs.update(token_index.get(t, []))
-                    if len(candidate_idxs) > 2000:
-                        break
-
-            # cap total search size
-            if candidate_idxs:
-                if len(candidate_idxs) > 2000:
-                    candidate_list = list(candidate_idxs)[:2000]
-                else:
-                    candidate_list = list(candidate_idxs)
-
-                choices = [fifa_norms[i] for i in candidate_list]
-                res = process.extractOne(n, choices, scorer=fuzz.token_sort_ratio)
-                if res:
-                    best_match, sscore, local_idx = res
-                    # convert local_idx relative to choices -> global idx
-                    global_idx = candidate_list[local_idx] if isinstance(local_idx, int) and 0 <= local_idx < len(candidate_list) else None
-                    if global_idx is None:
-                        # fallback to scanning candidate_idxs
-                        for i in candidate_idxs:
-                            if fifa_norms[i] == best_match:
-                                global_idx = i
-                                break
-                    if global_idx is not None and fifa_lookup is not None:
-                        row = fifa_lookup.iloc[global_idx]
-                        fifa2 = row.get('fifa_id') if 'fifa_id' in row.index else None
-                        cand_name2 = row.get('short_name')
-                        if sscore >= 85:
-                            status = 'accepted_fuzzy'
-                            accepted.append({'player_id_sb': sbid, 'player_name_sb': sbname, 'fifa_id': fifa2, 'score': int(sscore), 'method': 'fuzzy'})
-                        elif sscore >= 75:
-                            status = 'review'
-                            sofifa = fifa2
-                            cand_name = cand_name2
-                            score = int(sscore)
-            # end fuzzy
+        elif i in best:
+            hit = best[i]
+            sscore = hit.token_sort_ratio
+            if sscore >= quick_accept:
+                status = 'accepted_fuzzy'
+                accepted.append({'player_id_sb': sbid, 'player_name_sb': sbname, 'fifa_id': hit.fifa_id, 'score': int(sscore), 'method': 'fuzzy'})
+            elif sscore >= quick_review:
+                status = 'review'
+                sofifa = hit.fifa_id
+                cand_name = hit.candidate_name
+                score = int(sscore)
         review_rows.append({
             'player_id_sb': sbid,
             'player_name_sb': sbname,
@@ -325,16 +232,67 @@ def main():
             'method': method,
             'status': status
         })
+    return typed(pd.DataFrame(review_rows), REVIEW_COLUMNS), typed(pd.DataFrame(accepted), ACCEPTED_COLUMNS), candidates
+
 
-    review_df = pd.DataFrame(review_rows)
-    review_path = MAPDIR / 'player_map_review.csv'
-    review_df.to_csv(review_path, index=False)
-    print('Wrote review CSV:', review_path)
+def parse_args():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('--incremental', action='store_true', help='only re-parse new or changed lineup files')
+    ap.add_argument('--workers', type=int, default=0, help='lineup decoder processes (0 = all cores, 1 = no pool)')
+    return ap.parse_args()
+
+
+def load_match_ids():
+    # load matches (parquet or csv fallback)
+    if MATCHES_PARQ.exists():
+        matches = pd.read_parquet(MATCHES_PARQ)
+    else:
+        csvp = MATCHES_PARQ.with_suffix('.csv')
+        if csvp.exists():
+            matches = pd.read_csv(csvp)
+        else:
+            raise FileNotFoundError('matches cache not found. Run scripts/ingest_statsbomb.py first')
+    print(f"Loaded {len(matches)} matches")
+    return matches['match_id'].dropna().astype(int).unique().tolist()
+
+
+def unique_sb_players(players: pd.DataFrame) -> pd.DataFrame:
+    # player_id_sb is the mapping key: keep the first name seen for each player
+    return players[['player_id_sb', 'player_name_sb']].drop_duplicates('player_id_sb').reset_index(drop=True)
+
+
+def main():
+    args = parse_args()
+    match_ids = load_match_ids()
+    out_players = OUT / 'matches_starting_players.parquet'
+    workers = args.workers or os.cpu_count() or 1
+    players_table, manifest_entries = starting_players_table(match_ids, out_players, incremental=args.incremental, workers=workers)
+    players_df = players_table.to_pandas()
+    try:
+        pq.write_table(players_table, out_players)
+        save_manifest(out_players, manifest_entries)
+        print('Wrote starting players:', out_players)
+    except Exception as e:
+        out_csv = OUT / 'matches_starting_players.csv'
+        players_df.to_csv(out_csv, index=False)
+        print('Parquet write failed (fallback to CSV). Wrote starting players to', out_csv)
+        print('Error was:', e)
+
+    # build unique sb players
+    if players_df.empty:
+        print('No starting players found, exiting')
+        return
+    unique_players = unique_sb_players(players_df)
+    fifa_index = load_index()
+    print_diagnostics(unique_players, fifa_index)
 
-    accepted_df = pd.DataFrame(accepted)
-    map_path = MAPDIR / 'player_map.csv'
-    accepted_df.to_csv(map_path, index=False)
-    print('Wrote accepted mappings:', map_path)
+    review_df, accepted_df, candidates = initial_mapping(unique_players, fifa_index)
+    review_df, accepted_df = keep_manual(review_df, accepted_df)
+    write_candidates(candidates, candidates['player_id_sb'].unique(), replace=True)
+    save_review(review_df)
+    print('Wrote review table:', REVIEW_P)
+    save_accepted(accepted_df)
+    print('Wrote accepted mappings:', ACCEPT_P)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""Country-aware pass to promote review candidates using nationality alignment.
+
+Rules:
+- Considers review rows with status in ['review','unmatched'] and their top-k
+  candidate lists from `data/mappings/candidates.parquet` (no new fuzzy sweep)
+- StatsBomb `player_country` (from the starting players table) and FIFA
+  `nationality` (from the per-player FIFA table) are mapped to one canonical
+  key through the alias table in countries.py
+- A player is promoted to the best candidate with the same country and
+  score >= 75 (configurable), provided no other same-country candidate scores
+  within MARGIN of it
+
+- Upserts the promoted rows into the accepted and review tables (mapping_store.py)
+
+Everything is a join over the long candidate table; there is no per-row loop.
+
+Usage: uv run scripts/match_players_country_pass.py
+"""
+# /// script
+# dependencies = ["pandas", "pyarrow"]
+# ///
+from pathlib import Path
+import pandas as pd
+
+from candidates_store import load_candidates
+from countries import country_keys
+from fifa_player_info import load_player_info
+from mapping_store import OPEN_STATUSES, load_review, promote, upsert_accepted, upsert_review
+
+ROOT = Path('data')
+SP_P = ROOT / 'cache' / 'matches_starting_players.parquet'
+
+MIN_SCORE = 75
+MARGIN = 5  # a second same-country candidate this close makes the player ambiguous
+
+
+def sb_player_countries(sp: pd.DataFrame) -> pd.Series:
+    """player_id_sb -> canonical country key (first non-null country seen)."""
+    first = sp.groupby('player_id_sb', sort=False)['player_country'].first()
+    return country_keys(first)
+
+
+def fifa_countries(fifa: pd.DataFrame) -> pd.Series:
+    """fifa_id -> canonical country key of the FIFA nationality."""
+    return pd.Series(country_keys(fifa['nationality']).to_numpy(), index=fifa['fifa_id'].to_numpy())
+
+
+def country_winners(cands: pd.DataFrame, sb_country: pd.Series, fifa_country: pd.Series, min_score: float = MIN_SCORE, margin: float = MARGIN) -> pd.DataFrame:
+    """Return one row per promotable player: player_id_sb, fifa_id, candidate_name, score."""
+    c = cands[['player_id_sb', 'rank', 'fifa_id', 'candidate_name', 'score']].copy()
+    c['sb_country'] = sb_country.reindex(c['player_id_sb'].to_numpy()).astype(object).fillna('').to_numpy()
+    c['fifa_country'] = fifa_country.reindex(c['fifa_id'].to_numpy()).astype(object).fillna('').to_numpy()
+    ok = c[(c['sb_country'] != '') & (c['sb_country'] == c['fifa_country']) & (c['score'] >= min_score)]
+    ok = ok.sort_values(['player_id_sb', 'score', 'rank'], ascending=[True, False, True])
+    best = ok.drop_duplicates('player_id_sb')
+    best_score = ok['player_id_sb'].map(best.set_index('player_id_sb')['score'])
+    close = ok[ok['score'] >= best_score - margin].groupby('player_id_sb')['fifa_id'].nunique()
+    return best[best['player_id_sb'].map(close).to_numpy() == 1][['player_id_sb', 'fifa_id', 'candidate_name', 'score']]
+
+
+def promote_by_country(review: pd.DataFrame, candidates: pd.DataFrame, sp: pd.DataFrame, fifa: pd.DataFrame, min_score: float = MIN_SCORE, margin: float = MARGIN):
+    """Return the (review_delta, accepted_delta) of the country-aware promotion."""
+    open_ids = review.loc[review['status'].isin(OPEN_STATUSES), 'player_id_sb']
+    cands = candidates[candidates['player_id_sb'].isin(open_ids)]
+    print(f'Considering {cands["player_id_sb"].nunique()} review players with candidates.')
+    winners = country_winners(cands, sb_player_countries(sp), fifa_countries(fifa), min_score, margin)
+    return promote(review, winners.set_index('player_id_sb'), 'accepted_fuzzy_country', 'country_fuzzy')
+
+
+def run_pass():
+    review = load_review(columns=['player_id_sb', 'player_name_sb', 'status'])
+    candidates = load_candidates(columns=['player_id_sb', 'rank', 'fifa_id', 'candidate_name', 'score'])
+    sp = pd.read_parquet(SP_P, columns=['player_id_sb', 'player_country'])
+    fifa = load_player_info(columns=['fifa_id', 'nationality'])
+    review_delta, accepted_delta = promote_by_country(review, candidates, sp, fifa)
+    upsert_accepted(accepted_delta)
+    upsert_review(review_delta)
+    print(f'Promoted {len(accepted_delta)} mappings (country-aware).')
+
+
+if __name__ == '__main__':
+    run_pass()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""Team-context pass: resolve ambiguous review candidates from their teammates' clubs.
+
+A player's teammates in the same (match_id, team_id) who are already accepted
+in the accepted mapping table point at a club through their FIFA snapshot
+current at the match date (fifa_asof.py). A review candidate whose own
+snapshot on that date is at the same club is far more likely to be the right
+player than a namesake elsewhere. Clubs are compared per match, so a player
+who changed clubs is checked against the club of that match, not against a
+mix of every club of the career.
+
+All appearances are handled at once with packed integer keys instead of
+per-match groupbys:
+- every accepted appearance gets the club of its as-of snapshot (one bulk
+  searchsorted over the snapshot keys); counting (team slot, club) pairs
+  gives the accepted teammates at each club per lineup
+- every candidate is expanded over the appearances of its StatsBomb player
+  and gets its own as-of club per match date
+- team_consistency(p, f) = teammates at f's club / accepted teammates with
+  a known club, summed over the matches where f has a snapshot (a player is
+  never counted as their own teammate)
+
+Rules:
+- Considers review rows with status in ['review','unmatched'] and their top-k
+  candidates from `data/mappings/candidates.parquet`
+- context score = fuzzy score + CONTEXT_BONUS * team_consistency
+- Promote the best candidate when score >= MIN_SCORE, team_consistency >=
+  MIN_CONSISTENCY and it leads the next candidate's context score by MARGIN
+
+- Upserts the promoted rows into the accepted and review tables (mapping_store.py)
+
+Usage: uv run scripts/match_players_team_context.py
+"""
+# /// script
+# dependencies = ["pandas", "pyarrow", "numpy"]
+# ///
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+from candidates_store import load_candidates
+from fifa_asof import DAY_BITS, MATCHES_P, SnapshotIndex, asof_offsets, to_days
+from mapping_store import ACCEPTED_COLUMNS, OPEN_STATUSES, REVIEW_COLUMNS, empty, load_accepted, load_review, promote, upsert_accepted, upsert_review
+
+ROOT = Path('data')
+SP_P = ROOT / 'cache' / 'matches_starting_players.parquet'
+
+MIN_SCORE = 70
+MIN_CONSISTENCY = 0.75  # true matches sit near 1 once clubs are compared as of the match date
+CONTEXT_BONUS = 20
+MARGIN = 5
+
+
+def load_snapshot_clubs(index: SnapshotIndex = None) -> pd.DataFrame:
+    """(key, club) of every FIFA snapshot in as-of key order (fifa_asof.py); club is categorical.
+
+    Empty club names are missing (code -1), so two clubless snapshots never count as the same club.
+    """
+    table = (index or SnapshotIndex()).table
+    clubs = table.column('club').to_pandas().astype(object) if 'club' in table.column_names else pd.Series(None, index=range(table.num_rows), dtype=object)
+    clubs = clubs.where(clubs.notna() & (clubs.astype(str).str.strip() != ''))
+    return pd.DataFrame({'key': table.column('key').to_numpy(), 'club': clubs.astype('category')})
+
+
+def club_asof(snaps: pd.DataFrame, fifa_ids, days) -> np.ndarray:
+    """Club code (index into snaps['club'] categories) of each player's snapshot current at each day, -1 if none."""
+    keys = snaps['key'].to_numpy()
+    off = asof_offsets(keys, keys >> DAY_BITS, fifa_ids, days)
+    codes = snaps['club'].cat.codes.to_numpy()
+    return np.where(off >= 0, codes[np.maximum(off, 0)], -1).astype(np.int64) if len(keys) else np.full(len(off), -1, dtype=np.int64)
+
+
+def team_consistency(cands: pd.DataFrame, sp: pd.DataFrame, matches: pd.DataFrame, accepted: pd.DataFrame, snaps: pd.DataFrame) -> np.ndarray:
+    """Team consistency in [0, 1] for every (player_id_sb, fifa_id) row of `cands`.
+
+    `matches` maps match_id to match_date; `snaps` comes from load_snapshot_clubs().
+    """
+    app = sp[['match_id', 'team_id', 'player_id_sb']].assign(slot=sp.groupby(['match_id', 'team_id'], sort=False).ngroup().to_numpy())
+    app = app.drop_duplicates(['slot', 'player_id_sb'])  # a player listed twice in one slot still counts once
+    slot = app['slot'].to_numpy(dtype=np.int64)
+    days = to_days(app['match_id'].map(matches.drop_duplicates('match_id').set_index('match_id')['match_date']).to_numpy())
+    acc = accepted.drop_duplicates('player_id_sb').set_index('player_id_sb')['fifa_id']
+    own = club_asof(snaps, app['player_id_sb'].map(acc).to_numpy(), days)
+    n_clubs = max(len(snaps['club'].cat.categories), 1)
+
+    # accepted teammates per (slot, club) and per slot, counting only those with a club on the match date
+    known = own >= 0
+    pair_keys, pair_counts = np.unique(slot[known] * n_clubs + own[known], return_counts=True)
+    n_known = np.bincount(slot[known], minlength=int(slot.max()) + 1 if len(slot) else 0)
+
+    # every candidate row expanded over its player's appearances
+    pids = app['player_id_sb'].to_numpy(dtype=np.int64)
+    order = np.argsort(pids, kind='stable')
+    cand_pids = cands['player_id_sb'].to_numpy(dtype=np.int64)
+    lo = np.searchsorted(pids, cand_pids, side='left', sorter=order)
+    counts = np.searchsorted(pids, cand_pids, side='right', sorter=order) - lo
+    row = np.repeat(np.arange(len(cands)), counts)
+    ai = order[np.repeat(lo, counts) + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)]
+    club = club_asof(snaps, cands['fifa_id'].to_numpy()[row], days[ai])
+
+    s = slot[ai]
+    q = s * n_clubs + np.maximum(club, 0)
+    hit = np.minimum(np.searchsorted(pair_keys, q), max(len(pair_keys) - 1, 0))
+    same = np.where((club >= 0) & (pair_keys[hit] == q), pair_counts[hit], 0) if len(pair_keys) else np.zeros(len(q))
+    # the player's own accepted appearance never vouches for itself
+    same = same - ((own[ai] == club) & (club >= 0))
+    teammates = np.where(club >= 0, n_known[s] - known[ai], 0)
+    num = np.bincount(row, weights=same, minlength=len(cands))
+    den = np.bincount(row, weights=teammates, minlength=len(cands))
+    return np.divide(num, den, out=np.zeros(len(cands)), where=den > 0).clip(0, 1)
+
+
+def context_winners(cands: pd.DataFrame, min_score: float = MIN_SCORE, min_consistency: float = MIN_CONSISTENCY, context_bonus: float = CONTEXT_BONUS, margin: float = MARGIN) -> pd.DataFrame:
+    """One row per promotable player from candidates carrying `team_consistency`."""
+    c = cands.assign(context_score=cands['score'] + context_bonus * cands['team_consistency'])
+    c = c.sort_values(['player_id_sb', 'context_score', 'rank'], ascending=[True, False, True])
+    first = ~c['player_id_sb'].duplicated()
+    second_score = c[~first].drop_duplicates('player_id_sb').set_index('player_id_sb')['context_score']
+    best = c[first].copy()
+    runner_up = best['player_id_sb'].map(second_score).fillna(-np.inf)
+    ok = (best['score'] >= min_score) & (best['team_consistency'] >= min_consistency) & (best['context_score'] - runner_up >= margin)
+    return best[ok][['player_id_sb', 'fifa_id', 'candidate_name', 'score', 'team_consistency']]
+
+
+def promote_by_context(review: pd.DataFrame, accepted: pd.DataFrame, candidates: pd.DataFrame, sp: pd.DataFrame, matches: pd.DataFrame, snaps: pd.DataFrame, min_score: float = MIN_SCORE, min_consistency: float = MIN_CONSISTENCY, context_bonus: float = CONTEXT_BONUS, margin: float = MARGIN):
+    """Return the (review_delta, accepted_delta) of the team-context promotion.
+
+    `sp` is the starting players table, `matches` the (match_id, match_date)
+    columns of matches.parquet and `snaps` the as-of club table from
+    load_snapshot_clubs().
+    """
+    open_ids = review.loc[review['status'].isin(OPEN_STATUSES), 'player_id_sb']
+    cands = candidates[candidates['player_id_sb'].isin(open_ids)].reset_index(drop=True)
+    if cands.empty:
+        print('No review candidates to score.')
+        return empty(REVIEW_COLUMNS), empty(ACCEPTED_COLUMNS)
+    print(f'Scoring team context for {len(cands)} candidates over {sp.groupby(["match_id", "team_id"]).ngroups} team lineups...')
+    cands['team_consistency'] = team_consistency(cands, sp, matches, accepted, snaps)
+    winners = context_winners(cands, min_score, min_consistency, context_bonus, margin)
+    return promote(review, winners.set_index('player_id_sb'), 'accepted_fuzzy_context', 'team_context')
+
+
+def run_pass():
+    review = load_review(columns=['player_id_sb', 'player_name_sb', 'status'])
+    accepted = load_accepted(columns=['player_id_sb', 'fifa_id'])
+    candidates = load_candidates(columns=['player_id_sb', 'rank', 'fifa_id', 'candidate_name', 'score'])
+    sp = pd.read_parquet(SP_P, columns=['match_id', 'team_id', 'player_id_sb'])
+    matches = pd.read_parquet(MATCHES_P, columns=['match_id', 'match_date'])
+    review_delta, accepted_delta = promote_by_context(review, accepted, candidates, sp, matches, load_snapshot_clubs())
+    upsert_accepted(accepted_delta)
+    upsert_review(review_delta)
+    print(f'Promoted {len(accepted_delta)} mappings (team context).')
+
+
+if __name__ == '__main__':
+    run_pass()
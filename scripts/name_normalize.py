@@ -0,0 +1,48 @@
+"""Player-name normalization shared by the mapping scripts.
+
+Normalization lower-cases, applies NFKD, drops combining marks, removes
+apostrophes, double quotes and dots, and collapses whitespace:
+"N'Golo Kanté" -> "ngolo kante".
+
+- normalize_name(s)       scalar API, LRU-cached (StatsBomb names repeat across matches)
+- normalize_names(values) bulk API over Arrow/NumPy/pandas/list string arrays,
+                          vectorized with pyarrow.compute (nulls become "")
+"""
+from functools import lru_cache
+import unicodedata
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+_STRIP_CHARS = str.maketrans('', '', '\'".')
+
+
+@lru_cache(maxsize=1 << 16)
+def _normalize_str(s: str) -> str:
+    s = unicodedata.normalize('NFKD', s.lower())
+    s = ''.join([c for c in s if not unicodedata.combining(c)])
+    return ' '.join(s.translate(_STRIP_CHARS).split())
+
+
+def normalize_name(s: str) -> str:
+    if not isinstance(s, str):
+        return ''
+    return _normalize_str(s)
+
+
+def normalize_names(values) -> pa.Array:
+    """Normalize a whole column of names at once; returns an Arrow string array."""
+    if isinstance(values, pa.ChunkedArray):
+        values = values.combine_chunks()
+    elif not isinstance(values, pa.Array):
+        values = pa.array(np.asarray(values, dtype=object), type=pa.string(), from_pandas=True)
+    arr = pc.utf8_lower(pc.fill_null(values.cast(pa.string()), ''))
+    # fast path: ASCII names are unchanged by NFKD, so only decompose the rest
+    non_ascii = pc.invert(pc.string_is_ascii(arr))
+    if pc.any(non_ascii).as_py():
+        decomposed = pc.utf8_normalize(arr.filter(non_ascii), form='NFKD')
+        decomposed = pc.replace_substring_regex(decomposed, pattern=r'\p{Mn}', replacement='')
+        arr = pc.replace_with_mask(arr, non_ascii, decomposed)
+    for ch in _STRIP_CHARS:
+        arr = pc.replace_substring(arr, pattern=chr(ch), replacement='')
+    return pc.binary_join(pc.utf8_split_whitespace(pc.utf8_trim_whitespace(arr)), ' ')
@@ -0,0 +1,63 @@
+"""Position groups (GK/DEF/MID/FWD/UNK) for StatsBomb and FIFA positions.
+
+The scalar rules are cheap but were applied once per review row; the column
+helpers below evaluate them once per distinct value (StatsBomb has ~25
+position ids, FIFA a few hundred `player_positions` strings) and return
+categorical columns that compare directly against each other.
+"""
+import pandas as pd
+
+POS_GROUPS = ['GK', 'DEF', 'MID', 'FWD', 'UNK']
+POS_GROUP_DTYPE = pd.CategoricalDtype(POS_GROUPS)
+
+
+def pos_group_from_sb(pos: str) -> str:
+    if not isinstance(pos, str):
+        return 'UNK'
+    p = pos.lower()
+    if 'goal' in p or 'keeper' in p or p.startswith('g'):  # GK
+        return 'GK'
+    if any(k in p for k in ['back', 'defend', 'centre back', 'left back', 'right back', 'cb', 'rb', 'lb', 'lwb', 'rwb']):
+        return 'DEF'
+    if any(k in p for k in ['mid', 'centre', 'cm', 'dm', 'am', 'lm', 'rm']):
+        return 'MID'
+    if any(k in p for k in ['forward', 'att', 'st', 'cf', 'lw', 'rw', 'wing', 'fw']):
+        return 'FWD'
+    return 'UNK'
+
+
+def pos_group_from_fifa(fifa_pos_str: str) -> str:
+    if not isinstance(fifa_pos_str, str) or fifa_pos_str.strip() == '':
+        return 'UNK'
+    toks = [t.strip().lower() for t in fifa_pos_str.split(',')]
+    for t in toks:
+        if t in ['gk', 'goalkeeper']:
+            return 'GK'
+    for t in toks:
+        if any(k in t for k in ['cb', 'rb', 'lb', 'lwb', 'rwb', 'back', 'def']):
+            return 'DEF'
+    for t in toks:
+        if any(k in t for k in ['cm', 'cdm', 'cam', 'mid', 'central']):
+            return 'MID'
+    for t in toks:
+        if any(k in t for k in ['st', 'cf', 'lw', 'rw', 'lf', 'rf', 'fw', 'att']):
+            return 'FWD'
+    return 'UNK'
+
+
+def _group_column(values: pd.Series, rule) -> pd.Series:
+    codes, uniques = pd.factorize(values, use_na_sentinel=True)
+    groups = pd.Categorical([rule(u) for u in uniques] + ['UNK'], dtype=POS_GROUP_DTYPE)
+    # sentinel -1 (missing) picks the trailing 'UNK'
+    return pd.Series(groups.take(codes), index=values.index, dtype=POS_GROUP_DTYPE)
+
+
+def fifa_position_groups(player_positions: pd.Series) -> pd.Series:
+    """Categorical position group for every FIFA `player_positions` value."""
+    return _group_column(player_positions.astype(object), pos_group_from_fifa)
+
+
+def sb_position_groups(positions: pd.DataFrame) -> pd.Series:
+    """Position group per StatsBomb `position_id`, from (position_id, position) rows."""
+    pairs = positions[['position_id', 'position']].dropna().drop_duplicates('position_id')
+    return pd.Series(pd.Categorical([pos_group_from_sb(p) for p in pairs['position']], dtype=POS_GROUP_DTYPE), index=pairs['position_id'].to_numpy())
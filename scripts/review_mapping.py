@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+# /// script
+# requires-python = ">=3.12"
+# dependencies = ["pandas", "pyarrow", "numpy"]
+# ///
+"""Single-reviewer CLI to accept or reject the open rows of the review table page by page.
+
+Each row shows the StatsBomb player (team, position, country) and its stored
+top-k FIFA candidates (`data/mappings/candidates.parquet`) with positions,
+club and nationality. Lookups never scan `fifa_players.parquet`:
+
+- FIFA details come from the per-player table sorted by fifa_id
+  (fifa_player_info.PlayerInfoIndex: binary search to a row offset, then take)
+- candidates are sorted by player_id_sb once, so a player's candidates are a slice
+- the next page is rendered on a background thread while the current one is reviewed
+
+Decisions are appended to `data/mappings/review_decisions.jsonl` (one fsynced
+JSON line per decision) instead of rewriting the mapping tables. On exit, or
+with `--compact`, the log is folded into the mapping store as upsert deltas
+(accepted rows get method 'manual', review rows status 'accepted_manual' or
+'rejected', which the promotion passes leave alone and full rebuilds keep,
+see mapping_store.keep_manual) and truncated. Decisions
+still in the log are skipped when the tool is restarted, so an interrupted
+session loses nothing.
+
+Keys per row: 1-9 accept that candidate, r reject, s or Enter skip, q quit.
+
+Usage:
+  uv run scripts/review_mapping.py [--page-size 10] [--unmatched]
+  uv run scripts/review_mapping.py --compact
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+import argparse
+import json
+import os
+import numpy as np
+import pandas as pd
+
+from candidates_store import load_candidates
+from fifa_player_info import PlayerInfoIndex
+from mapping_store import ACCEPTED_COLUMNS, ACCEPTED_MANUAL, MAPDIR, REJECTED, REVIEW_COLUMNS, load_review, subset, typed, upsert_accepted, upsert_review
+
+ROOT = Path('data')
+SP_P = ROOT / 'cache' / 'matches_starting_players.parquet'
+WAL_P = MAPDIR / 'review_decisions.jsonl'
+
+PAGE_SIZE = 10
+METHOD = 'manual'
+FIFA_COLUMNS = ['fifa_id', 'short_name', 'player_positions', 'club', 'nationality']
+CAND_COLUMNS = ['player_id_sb', 'rank', 'fifa_id', 'candidate_name', 'score']
+
+
+# ---- write-ahead log ----
+
+def read_log(path: Path = WAL_P) -> list:
+    if not path.exists():
+        return []
+    out = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                try:
+                    out.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # a torn last line from a crash mid-write is dropped
+                    pass
+    return out
+
+
+def append_log(decision: dict, path: Path = WAL_P):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(decision) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def decision_deltas(decisions: list):
+    """(accept_review, reject_review, accepted) deltas for logged decisions; the last one per player wins.
+
+    Accepts set the chosen candidate and status on the review row and add an
+    accepted row; rejects only change the review status.
+    """
+    d = pd.DataFrame(decisions, columns=['player_id_sb', 'player_name_sb', 'action', 'fifa_id', 'candidate_name', 'score'])
+    d = d.drop_duplicates('player_id_sb', keep='last')
+    accept = d[d['action'] == 'accept']
+    accept_review = pd.DataFrame({
+        'player_id_sb': accept['player_id_sb'].to_numpy(),
+        'candidate_fifa_id': accept['fifa_id'].to_numpy(),
+        'candidate_name': accept['candidate_name'].to_numpy(),
+        'score': accept['score'].to_numpy(),
+        'status': ACCEPTED_MANUAL,
+    })
+    reject_review = pd.DataFrame({'player_id_sb': d.loc[d['action'] == 'reject', 'player_id_sb'].to_numpy(), 'status': REJECTED})
+    accepted = accept.assign(method=METHOD)
+    return (typed(accept_review, subset(REVIEW_COLUMNS, accept_review.columns)),
+            typed(reject_review, subset(REVIEW_COLUMNS, reject_review.columns)),
+            typed(accepted, ACCEPTED_COLUMNS))
+
+
+def compact(path: Path = WAL_P) -> int:
+    """Fold the log into the mapping store and truncate it; return the number of decisions."""
+    decisions = read_log(path)
+    if not decisions:
+        return 0
+    accept_review, reject_review, accepted = decision_deltas(decisions)
+    upsert_accepted(accepted)
+    upsert_review(accept_review)
+    upsert_review(reject_review)
+    # replaying the log is idempotent, so a crash before this point only repeats the upserts
+    tmp = path.with_suffix('.jsonl.tmp')
+    tmp.write_text('', encoding='utf-8')
+    os.replace(tmp, path)
+    return len(decisions)
+
+
+# ---- lookups and rendering ----
+
+class CandidateIndex:
+    """player_id_sb -> its candidate rows, from one sort of the candidate table."""
+
+    def __init__(self, candidates: pd.DataFrame):
+        self.frame = candidates.sort_values(['player_id_sb', 'rank'], kind='stable').reset_index(drop=True)
+        self.ids = self.frame['player_id_sb'].to_numpy()
+
+    def get(self, player_id: int) -> pd.DataFrame:
+        lo, hi = np.searchsorted(self.ids, player_id, side='left'), np.searchsorted(self.ids, player_id, side='right')
+        return self.frame.iloc[lo:hi]
+
+
+def sb_context(sp: pd.DataFrame) -> pd.DataFrame:
+    """player_id_sb -> team_name, position, player_country of the first appearance, plus starts."""
+    by = sp.groupby('player_id_sb', sort=False)
+    ctx = by[['team_name', 'position', 'player_country']].first()
+    ctx['starts'] = by.size()
+    return ctx
+
+
+def render_page(rows: pd.DataFrame, cands: CandidateIndex, fifa: PlayerInfoIndex, ctx: pd.DataFrame) -> list:
+    """One entry per review row: the row, its SB context and its candidates joined with FIFA details."""
+    per_row = [cands.get(pid) for pid in rows['player_id_sb']]
+    all_ids = np.concatenate([c['fifa_id'].to_numpy(dtype=np.int64) for c in per_row]) if per_row else np.empty(0, dtype=np.int64)
+    details = fifa.lookup(all_ids)[FIFA_COLUMNS[1:]]
+    entries, start = [], 0
+    for (_, row), c in zip(rows.iterrows(), per_row):
+        info = details.iloc[start:start + len(c)].reset_index(drop=True)
+        start += len(c)
+        entries.append({
+            'row': row,
+            'context': ctx.loc[row['player_id_sb']] if row['player_id_sb'] in ctx.index else None,
+            'candidates': pd.concat([c.reset_index(drop=True), info], axis=1),
+        })
+    return entries
+
+
+def format_entry(entry: dict, n: int, total: int) -> str:
+    row, ctx = entry['row'], entry['context']
+    lines = [f"[{n}/{total}] {row['player_name_sb']} (sb {row['player_id_sb']})"]
+    if ctx is not None:
+        lines.append(f"    {ctx['team_name']} | {ctx['position']} | {ctx['player_country']} | {ctx['starts']} starts")
+    cands = entry['candidates']
+    if cands.empty:
+        lines.append('    no stored candidates')
+    for i, c in enumerate(cands.head(9).itertuples(), start=1):
+        lines.append(f"  {i}. {c.candidate_name} (fifa {c.fifa_id}) score {c.score:.0f} | {c.player_positions} | {c.club} | {c.nationality}")
+    return '\n'.join(lines)
+
+
+def review_queue(review: pd.DataFrame, decided: set, statuses) -> pd.DataFrame:
+    todo = review[review['status'].isin(statuses) & ~review['player_id_sb'].isin(decided)]
+    return todo.sort_values(['score', 'player_id_sb'], ascending=[False, True], na_position='last').reset_index(drop=True)
+
+
+def decide(entry: dict, answer: str):
+    """Decision dict for an answer, None to skip; raises StopIteration on quit."""
+    answer = answer.strip().lower()
+    row = entry['row']
+    base = {'player_id_sb': int(row['player_id_sb']), 'player_name_sb': row['player_name_sb'], 'ts': datetime.now(timezone.utc).isoformat()}
+    if answer == 'q':
+        raise StopIteration
+    if answer == 'r':
+        return {**base, 'action': 'reject'}
+    if answer.isdigit() and 1 <= int(answer) <= min(len(entry['candidates']), 9):
+        c = entry['candidates'].iloc[int(answer) - 1]
+        return {**base, 'action': 'accept', 'fifa_id': int(c['fifa_id']), 'candidate_name': c['candidate_name'], 'score': float(c['score'])}
+    return None
+
+
+def run_session(queue: pd.DataFrame, cands: CandidateIndex, fifa: PlayerInfoIndex, ctx: pd.DataFrame, page_size: int = PAGE_SIZE, wal: Path = WAL_P) -> int:
+    """Interactive loop; returns the number of decisions logged."""
+    pages = [queue.iloc[i:i + page_size] for i in range(0, len(queue), page_size)]
+    logged = 0
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        ahead = pool.submit(render_page, pages[0], cands, fifa, ctx) if pages else None
+        for p in range(len(pages)):
+            entries = ahead.result()
+            # render the next page while this one is being reviewed
+            ahead = pool.submit(render_page, pages[p + 1], cands, fifa, ctx) if p + 1 < len(pages) else None
+            print(f'\n=== page {p + 1}/{len(pages)} ===')
+            for i, entry in enumerate(entries):
+                print(format_entry(entry, p * page_size + i + 1, len(queue)))
+                try:
+                    decision = decide(entry, input('  [1-9 accept / r reject / s skip / q quit] > '))
+                except (StopIteration, EOFError):
+                    return logged
+                if decision is not None:
+                    append_log(decision, wal)
+                    logged += 1
+    return logged
+
+
+def parse_args():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('--page-size', type=int, default=PAGE_SIZE)
+    ap.add_argument('--unmatched', action='store_true', help="also review rows with status 'unmatched'")
+    ap.add_argument('--compact', action='store_true', help='only fold the decision log into the mapping tables')
+    return ap.parse_args()
+
+
+def main():
+    args = parse_args()
+    if not args.compact:
+        decided = {d['player_id_sb'] for d in read_log()}
+        review = load_review(columns=['player_id_sb', 'player_name_sb', 'score', 'status'])
+        queue = review_queue(review, decided, ['review', 'unmatched'] if args.unmatched else ['review'])
+        print(f'{len(queue)} rows to review ({len(decided)} decisions pending in {WAL_P})')
+        cands = CandidateIndex(load_candidates(columns=CAND_COLUMNS))
+        ctx = sb_context(pd.read_parquet(SP_P, columns=['player_id_sb', 'team_name', 'position', 'player_country']))
+        logged = run_session(queue, cands, PlayerInfoIndex(columns=FIFA_COLUMNS), ctx, args.page_size)
+        print(f'\nLogged {logged} decisions.')
+    n = compact()
+    print(f'Compacted {n} decisions into the mapping tables.')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,37 +1,115 @@
 #!/usr/bin/env python3
-"""Simulate match-level coverage when promoting review candidates at various score thresholds."""
+"""Simulate match-level coverage when promoting review candidates at various score thresholds.
+
+A match is fully matched at threshold t when every starting player of both
+teams is accepted or has a review candidate scoring >= t. So each match has
+one break-even score: the lowest, over its starting players, of the best
+candidate score of the player (accepted players count as +inf). It is
+computed once with two groupbys. Coverage for any set of thresholds is then a
+sorted array plus searchsorted (a cumulative histogram of break-even scores),
+so a full 0-100 sweep costs about the same as a single threshold.
+
+Usage:
+  uv run scripts/simulate_threshold_coverage.py                # default thresholds
+  uv run scripts/simulate_threshold_coverage.py --sweep        # every threshold 0..100
+  uv run scripts/simulate_threshold_coverage.py --by season_name --sweep
+"""
 # /// script
-# dependencies = ["pandas", "pyarrow"]
+# dependencies = ["pandas", "pyarrow", "numpy"]
 # ///
+import argparse
+import numpy as np
 import pandas as pd
 
-sp = pd.read_parquet('data/cache/matches_starting_players.parquet')
-accepted = pd.read_csv('data/mappings/player_map.csv', dtype={'player_id_sb': int, 'fifa_id': object})
-review = pd.read_csv('data/mappings/player_map_review.csv', dtype={'player_id_sb': int, 'candidate_fifa_id': object, 'score': float})
-
-# build accepted mapping set
-accepted_map = dict(zip(accepted['player_id_sb'].astype(int), accepted['fifa_id']))
-
-thresholds = [90,85,80,75,70,65,60]
-results = []
-for t in thresholds:
-    # start with accepted
-    mapping = accepted_map.copy()
-    # take review rows with score >= t and candidate_fifa_id non-null
-    cand = review.loc[review['score'].fillna(0) >= t]
-    for _, r in cand.iterrows():
-        if pd.notna(r['candidate_fifa_id']):
-            mapping[int(r['player_id_sb'])] = r['candidate_fifa_id']
-    # map onto starting players
-    sp2 = sp.copy()
-    sp2['fifa_id'] = sp2['player_id_sb'].map(mapping)
-    # per team in match, check all players mapped
-    team_ok = sp2.groupby(['match_id','team_id'])['fifa_id'].apply(lambda s: s.notna().all()).reset_index(name='all_mapped')
-    both_teams = team_ok.groupby('match_id')['all_mapped'].all()
-    count_both = both_teams.sum()
-    pct = count_both / sp['match_id'].nunique() * 100
-    results.append({'threshold': t, 'fully_matched_matches': int(count_both), 'pct': pct, 'added_mappings': len(set(cand['player_id_sb']) - set(accepted['player_id_sb']))})
-
-print('Threshold, FullyMatched, Percent, NewMappingsAdded')
-for r in results:
-    print(f"{r['threshold']}, {r['fully_matched_matches']}, {r['pct']:.2f}%, {r['added_mappings']}")
+from mapping_store import load_accepted, load_review
+
+SP_P = 'data/cache/matches_starting_players.parquet'
+MATCHES_P = 'data/cache/matches.parquet'
+THRESHOLDS = [90, 85, 80, 75, 70, 65, 60]
+SWEEP = list(range(0, 101))
+
+
+def _scores(df: pd.DataFrame) -> pd.Series:
+    return pd.to_numeric(df['score'], errors='coerce').astype(float).fillna(0)
+
+
+def player_break_even(accepted: pd.DataFrame, review: pd.DataFrame) -> pd.Series:
+    """player_id_sb -> highest threshold at which the player is mapped (inf when accepted)."""
+    cand = review.loc[review['candidate_fifa_id'].notna(), ['player_id_sb', 'score']]
+    best = _scores(cand).groupby(cand['player_id_sb'].to_numpy()).max()
+    # a review candidate overrides the accepted row, so accepted ids only count when they carry a fifa_id
+    mapped = accepted.loc[accepted['fifa_id'].notna(), 'player_id_sb'].to_numpy()
+    best = best.reindex(best.index.union(pd.Index(mapped)))
+    best.loc[mapped] = np.inf
+    return best
+
+
+def match_break_even(sp: pd.DataFrame, accepted: pd.DataFrame, review: pd.DataFrame) -> pd.Series:
+    """match_id -> highest threshold at which all starting players are mapped (-inf if none)."""
+    best = player_break_even(accepted, review)
+    per_player = best.reindex(sp['player_id_sb'].to_numpy()).fillna(-np.inf).to_numpy()
+    return pd.Series(per_player).groupby(sp['match_id'].to_numpy()).min()
+
+
+def count_at_least(values: np.ndarray, thresholds) -> np.ndarray:
+    """Number of `values` >= each threshold, from one sort."""
+    ordered = np.sort(np.asarray(values, dtype=float))
+    return len(ordered) - np.searchsorted(ordered, np.asarray(thresholds, dtype=float), side='left')
+
+
+def added_mappings(accepted: pd.DataFrame, review: pd.DataFrame, thresholds) -> np.ndarray:
+    """Players outside the accepted table with a review row scoring >= each threshold."""
+    rest = review[~review['player_id_sb'].isin(accepted['player_id_sb'])]
+    return count_at_least(_scores(rest).groupby(rest['player_id_sb'].to_numpy()).max().to_numpy(), thresholds)
+
+
+def simulate_coverage(sp: pd.DataFrame, accepted: pd.DataFrame, review: pd.DataFrame, thresholds=THRESHOLDS, groups: pd.Series = None) -> pd.DataFrame:
+    """Fully matched matches per threshold: threshold, fully_matched_matches, pct, added_mappings.
+
+    With `groups` (match_id -> label, e.g. season_name) there is one curve per
+    label, with a leading `group` column; added_mappings stays global.
+    """
+    thresholds = list(thresholds)
+    break_even = match_break_even(sp, accepted, review)
+    added = added_mappings(accepted, review, thresholds)
+    if groups is None:
+        parts = [(None, break_even)]
+    else:
+        labels = groups.reindex(break_even.index).fillna('unknown').to_numpy()
+        parts = list(break_even.groupby(labels))
+    frames = []
+    for label, be in parts:
+        full = count_at_least(be.to_numpy(), thresholds)
+        frame = pd.DataFrame({'threshold': thresholds, 'fully_matched_matches': full, 'pct': full / len(be) * 100, 'added_mappings': added})
+        frames.append(frame if groups is None else frame.assign(group=label)[['group', *frame.columns]])
+    return pd.concat(frames, ignore_index=True)
+
+
+def print_coverage(results: pd.DataFrame):
+    grouped = 'group' in results.columns
+    print(('Group, ' if grouped else '') + 'Threshold, FullyMatched, Percent, NewMappingsAdded')
+    for r in results.to_dict('records'):
+        print((f"{r['group']}, " if grouped else '') + f"{r['threshold']}, {r['fully_matched_matches']}, {r['pct']:.2f}%, {r['added_mappings']}")
+
+
+def parse_args():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('--sweep', action='store_true', help='every integer threshold from 0 to 100')
+    ap.add_argument('--by', metavar='COLUMN', help='one curve per value of a matches.parquet column (e.g. season_name)')
+    return ap.parse_args()
+
+
+def main():
+    args = parse_args()
+    sp = pd.read_parquet(SP_P, columns=['match_id', 'player_id_sb'])
+    groups = None
+    if args.by:
+        matches = pd.read_parquet(MATCHES_P, columns=['match_id', args.by])
+        groups = matches.drop_duplicates('match_id').set_index('match_id')[args.by]
+    review = load_review(columns=['player_id_sb', 'candidate_fifa_id', 'score'])
+    accepted = load_accepted(columns=['player_id_sb', 'fifa_id'])
+    print_coverage(simulate_coverage(sp, accepted, review, SWEEP if args.sweep else THRESHOLDS, groups))
+
+
+if __name__ == '__main__':
+    main()
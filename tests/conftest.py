@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# the scripts import each other as top-level modules (they run standalone with uv)
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'scripts'))